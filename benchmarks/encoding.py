@@ -0,0 +1,82 @@
+"""Compare encode time and output size of each encoding profile and image format.
+
+The source is decoded and oriented once; only the encoders are timed. The
+``previous`` row is the fixed ``quality=90, method=6`` WebP setting used
+before encoding profiles existed.
+
+Usage:
+    uv run python -m benchmarks.encoding [--width 4032] [--height 3024] [--runs 3] [--graphic]
+"""
+
+import argparse
+import time
+from dataclasses import replace
+from io import BytesIO
+
+from PIL import Image
+
+from benchmarks.pipeline import make_photo
+from fotacos.services.encoding import ENCODING_PROFILES, SIBLING_FORMATS, available_sibling_formats
+from fotacos.services.images import encode_image
+
+PREVIOUS_PROFILE = replace(
+    ENCODING_PROFILES["archival"], name="previous", quality=90, method=6, lossless_graphics=False
+)
+
+
+def make_graphic(width: int, height: int) -> bytes:
+    """Create a PNG screenshot-like image of flat coloured panels."""
+    img = Image.new("RGB", (width, height), "white")
+    for index, colour in enumerate(("navy", "orange", "teal", "crimson")):
+        left = index * width // 4
+        img.paste(colour, (left + 20, 20, left + width // 4 - 20, height // 3))
+    buffer = BytesIO()
+    img.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def measure(image: Image.Image, image_format: str, profile, lossless: bool, runs: int) -> tuple[float, int]:
+    """Encode an image `runs` times and return the mean seconds and the output size."""
+    size = 0
+    start = time.perf_counter()
+    for _ in range(runs):
+        output = BytesIO()
+        encode_image(image, output, image_format, profile, lossless=lossless)
+        size = output.tell()
+    return (time.perf_counter() - start) / runs, size
+
+
+def main() -> None:
+    """Run the benchmark and print a table of encode time against bytes."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--graphic", action="store_true", help="Encode a flat-colour PNG instead of a photo")
+    args = parser.parse_args()
+
+    source = make_graphic(args.width, args.height) if args.graphic else make_photo(args.width, args.height)
+    with Image.open(BytesIO(source)) as opened:
+        image = opened.convert("RGB")
+    kind = "PNG graphic" if args.graphic else "JPEG photo"
+    print(f"Source: {args.width}x{args.height} {kind}, {len(source) / 1024:.0f} KiB, {args.runs} runs per encode")
+
+    formats = [("webp", "WEBP")] + [
+        (name, SIBLING_FORMATS[name].pillow_format) for name in sorted(available_sibling_formats())
+    ]
+    print(f"{'profile':<10}{'format':<8}{'encode s':>10}{'KiB':>10}{'bits/px':>10}")
+    for profile in (PREVIOUS_PROFILE, *ENCODING_PROFILES.values()):
+        resized = image
+        if profile.max_dimension is not None and max(image.size) > profile.max_dimension:
+            resized = image.copy()
+            resized.thumbnail((profile.max_dimension, profile.max_dimension), Image.Resampling.LANCZOS)
+        lossless = args.graphic and profile.lossless_graphics
+        # The previous setting only ever produced WebP
+        for name, image_format in formats if profile is not PREVIOUS_PROFILE else formats[:1]:
+            seconds, size = measure(resized, image_format, profile, lossless, args.runs)
+            bits_per_pixel = size * 8 / (resized.width * resized.height)
+            print(f"{profile.name:<10}{name:<8}{seconds:>10.3f}{size / 1024:>10.0f}{bits_per_pixel:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
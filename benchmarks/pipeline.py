@@ -0,0 +1,87 @@
+"""Compare the two-decode upload path with the single-decode ``process_image`` pipeline.
+
+Each variant runs in a fresh process so CPU time and peak RSS are not skewed
+by allocations left behind by the other one.
+
+Usage:
+    uv run python -m benchmarks.pipeline [--width 4032] [--height 3024] [--runs 3]
+"""
+
+import argparse
+import multiprocessing
+import resource
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from fotacos.services.images import convert_to_webp, generate_thumbnail, process_image
+
+
+def make_photo(width: int, height: int) -> bytes:
+    """Create a phone-sized JPEG with enough texture to be expensive to encode."""
+    gradient = Image.linear_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 64)
+    img = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    buffer = BytesIO()
+    img.save(buffer, "JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def two_decode(source: bytes) -> None:
+    """Previous upload path: convert, then decode the WebP again for the thumbnail."""
+    webp_stream = convert_to_webp(BytesIO(source))
+    generate_thumbnail(webp_stream)
+
+
+def single_decode(source: bytes) -> None:
+    """Decode once and derive the full image and thumbnail from the same pixels."""
+    process_image(BytesIO(source))
+
+
+VARIANTS = {"two_decode": two_decode, "single_decode": single_decode}
+
+
+def _measure(name: str, source: bytes, runs: int, results: "multiprocessing.Queue") -> None:
+    """Run a variant and report wall time, CPU time and peak RSS of this process."""
+    func = VARIANTS[name]
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    for _ in range(runs):
+        func(source)
+    results.put({
+        "variant": name,
+        "wall_seconds": (time.perf_counter() - wall_start) / runs,
+        "cpu_seconds": (time.process_time() - cpu_start) / runs,
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    })
+
+
+def main() -> None:
+    """Run the benchmark and print a comparison table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    source = make_photo(args.width, args.height)
+    print(f"Source: {args.width}x{args.height} JPEG, {len(source) / 1024:.0f} KiB, {args.runs} runs per variant")
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    rows = []
+    for name in VARIANTS:
+        process = context.Process(target=_measure, args=(name, source, args.runs, results))
+        process.start()
+        rows.append(results.get())
+        process.join()
+
+    print(f"{'variant':<15}{'wall s':>10}{'cpu s':>10}{'peak RSS MB':>14}")
+    for row in rows:
+        print(f"{row['variant']:<15}{row['wall_seconds']:>10.3f}{row['cpu_seconds']:>10.3f}{row['peak_rss_mb']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,436 @@
+"""Benchmark image processing and the photo API, and compare runs to catch regressions.
+
+Image cases time ``convert_to_webp``, ``generate_thumbnail`` and
+``_fix_orientation`` on synthetic images of several sizes, modes and EXIF
+orientations. API cases load-test listing and uploading photos through the
+ASGI app against an in-memory SQLite database seeded with ``--rows`` photos.
+
+Every case runs in a fresh process so its peak RSS is its own. Sources are
+generated from a fixed seed, so two runs on the same machine process the same
+bytes. Results are written as JSON with p50/p95 latency, throughput and peak
+RSS per case; ``compare`` flags the cases that got slower or bigger than a
+baseline and exits with status 1 if any did.
+
+Usage:
+    uv run python -m benchmarks.suite run [--output results.json] [--sizes small,medium] [--filter thumbnail]
+    uv run python -m benchmarks.suite compare baseline.json results.json [--threshold 0.15]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from importlib.metadata import version
+from io import BytesIO
+from pathlib import Path
+from typing import Any
+
+from PIL import ExifTags, Image
+
+SEED = 20240601
+SIZES = {"small": (640, 480), "medium": (2016, 1512), "large": (4032, 3024)}
+IMAGE_OPERATIONS = ("convert_to_webp", "generate_thumbnail", "fix_orientation")
+API_ENDPOINTS = ("list", "list_cached", "upload")
+LIST_PAGE_SIZE = 50
+UPLOAD_SIZE = (640, 480)
+# Metrics compared between runs, and whether a larger value is the better one
+METRICS = {"p50_ms": False, "p95_ms": False, "throughput_per_s": True, "peak_rss_mb": False}
+TIMING_METRICS = {"p50_ms", "p95_ms", "throughput_per_s"}
+
+
+@dataclass(frozen=True)
+class SyntheticImage:
+    """Kind of source image the image cases are run on."""
+
+    name: str
+    mode: str
+    image_format: str
+    orientation: int
+
+
+IMAGES = (
+    SyntheticImage("photo", "RGB", "JPEG", 1),
+    SyntheticImage("photo-rotated", "RGB", "JPEG", 6),
+    SyntheticImage("grayscale-rotated", "L", "JPEG", 8),
+    SyntheticImage("graphic", "RGBA", "PNG", 1),
+)
+
+
+@dataclass(frozen=True)
+class Case:
+    """A benchmark case: a function timing `iterations` runs of one operation."""
+
+    name: str
+    run: Callable[..., tuple[list[float], float]]
+    args: tuple
+
+
+@dataclass(frozen=True)
+class Regression:
+    """A metric of a case that got worse than the baseline by more than the threshold."""
+
+    case: str
+    metric: str
+    baseline: float
+    current: float
+
+    @property
+    def change(self) -> float:
+        """Relative change from the baseline, positive when the value grew."""
+        return self.current / self.baseline - 1 if self.baseline else 0.0
+
+
+def make_source(image: SyntheticImage, width: int, height: int, seed: int = SEED) -> bytes:
+    """Create a deterministic source image with the EXIF orientation of `image`."""
+    rng = random.Random(seed)  # noqa: S311
+    noise = Image.frombytes("L", (width, height), rng.randbytes(width * height))
+    if image.image_format == "PNG":
+        # Flat panels over a faint texture, like a screenshot with a transparent margin
+        img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+        for index, colour in enumerate(("navy", "orange", "teal", "crimson")):
+            left = index * width // 4
+            img.paste(colour, (left + 20, 20, left + width // 4 - 20, height - 20))
+        img.putalpha(Image.eval(noise, lambda value: 255 if value > 8 else 0))
+    else:
+        gradient = Image.linear_gradient("L").resize((width, height))
+        img = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+        img = img.convert(image.mode)
+
+    exif = Image.Exif()
+    if image.orientation != 1:
+        exif[ExifTags.Base.Orientation] = image.orientation
+    buffer = BytesIO()
+    options = {"quality": 92} if image.image_format == "JPEG" else {}
+    img.save(buffer, image.image_format, exif=exif, **options)
+    return buffer.getvalue()
+
+
+def percentile(samples: list[float], percent: float) -> float:
+    """Linearly interpolated percentile of a non-empty list of samples."""
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(samples: list[float], elapsed: float, peak_rss_mb: float) -> dict[str, float]:
+    """Reduce the per-iteration seconds of a case to the reported metrics."""
+    return {
+        "iterations": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "mean_ms": sum(samples) / len(samples) * 1000,
+        "throughput_per_s": len(samples) / elapsed if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb,
+    }
+
+
+def compare(
+    baseline: dict[str, Any], current: dict[str, Any], threshold: float, min_ms: float = 1.0
+) -> list[Regression]:
+    """
+    Find the metrics that got worse than the baseline by more than a relative threshold.
+
+    Only cases present and successful in both runs are compared. Timings of
+    cases whose baseline p50 is below `min_ms` are mostly timer noise and only
+    their memory is compared.
+
+    Args:
+        baseline: Results of the reference run
+        current: Results of the run being checked
+        threshold: Allowed relative change, 0.15 for 15%
+        min_ms: Baseline p50 below which timings are not compared
+
+    Returns:
+        The regressions, in case order
+    """
+    regressions = []
+    for name, result in current["cases"].items():
+        reference = baseline["cases"].get(name)
+        if reference is None or "error" in reference or "error" in result:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            if metric in TIMING_METRICS and reference["p50_ms"] < min_ms:
+                continue
+            before, after = reference[metric], result[metric]
+            worse = after < before * (1 - threshold) if higher_is_better else after > before * (1 + threshold)
+            if worse:
+                regressions.append(Regression(name, metric, before, after))
+    return regressions
+
+
+def _time_calls(func: Callable[[], object], iterations: int) -> tuple[list[float], float]:
+    """Call a function after one untimed warm-up call and return the seconds of each call and in total."""
+    func()
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        call_start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - call_start)
+    return samples, time.perf_counter() - start
+
+
+def image_case(operation: str, image: SyntheticImage, size: tuple[int, int], iterations: int) -> tuple:
+    """Time an image processing function on a synthetic source."""
+    from fotacos.services.images import _fix_orientation, convert_to_webp, generate_thumbnail
+
+    source = make_source(image, *size)
+    if operation == "convert_to_webp":
+        return _time_calls(lambda: convert_to_webp(BytesIO(source)), iterations)
+    if operation == "generate_thumbnail":
+        return _time_calls(lambda: generate_thumbnail(BytesIO(source)), iterations)
+    # Decoding is not part of the rotation, so decode once up front
+    decoded = Image.open(BytesIO(source))
+    decoded.load()
+    return _time_calls(lambda: _fix_orientation(decoded), iterations)
+
+
+def api_case(endpoint: str, rows: int, iterations: int, concurrency: int) -> tuple:
+    """Load-test an API endpoint through the ASGI app with concurrent requests."""
+    return asyncio.run(_load_test(endpoint, rows, iterations, concurrency))
+
+
+async def _load_test(endpoint: str, rows: int, iterations: int, concurrency: int) -> tuple[list[float], float]:
+    """Start the app, seed the database and time `iterations` requests, `concurrency` at a time."""
+    import httpx
+    from loguru import logger
+
+    from fotacos.api import app
+    from fotacos.api.cache import photo_list_cache
+
+    # Per-request INFO lines would dominate the listing and flood the terminal
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    async with app.router.lifespan_context(app):
+        await _seed_photos(rows)
+        uploads = [_upload_source(index) for index in range(iterations + 1)]
+        cursors: list[str | None] = [None]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+
+            async def request(index: int) -> float:
+                async with semaphore:
+                    if endpoint == "list":
+                        # Measure the database query rather than the response cache
+                        photo_list_cache.invalidate()
+                    start = time.perf_counter()
+                    if endpoint == "upload":
+                        files = {"file": (f"upload_{index}.jpg", uploads[index], "image/jpeg")}
+                        response = await client.post("/api/photos", files=files)
+                    else:
+                        params = {"limit": LIST_PAGE_SIZE}
+                        cursor = cursors[index % len(cursors)] if endpoint == "list" else None
+                        if cursor is not None:
+                            params["cursor"] = cursor
+                        response = await client.get("/api/photos", params=params)
+                    seconds = time.perf_counter() - start
+                response.raise_for_status()
+                if endpoint == "list" and (next_cursor := response.json()["next_cursor"]) is not None:
+                    # Walk deeper pages as the test goes on
+                    cursors.append(next_cursor)
+                return seconds
+
+            await request(iterations)
+            start = time.perf_counter()
+            samples = await asyncio.gather(*(request(index) for index in range(iterations)))
+            return list(samples), time.perf_counter() - start
+
+
+async def _seed_photos(rows: int) -> None:
+    """Insert `rows` ready photos spread over the past few years."""
+    from fotacos.models import Photo, PhotoOrientation, PhotoStatus
+
+    rng = random.Random(SEED)  # noqa: S311
+    now = datetime.now(timezone.utc)
+    photos = []
+    for index in range(rows):
+        filename = f"photo_{index:08d}.webp"
+        width, height = rng.choice(((4032, 3024), (3024, 4032), (2048, 2048)))
+        photos.append(
+            Photo(
+                filename=filename,
+                original_url=f"/public/picts/{filename}",
+                thumbnail_url=f"/public/picts/thumbnails/{filename}",
+                file_size=rng.randint(200_000, 4_000_000),
+                status=PhotoStatus.READY,
+                width=width,
+                height=height,
+                orientation=PhotoOrientation.of(width, height),
+                taken_at=now - timedelta(minutes=rng.randint(0, 3 * 365 * 24 * 60)),
+                camera=rng.choice((None, "Pixel 8", "iPhone 15")),
+            )
+        )
+    await Photo.bulk_create(photos, batch_size=1000)
+
+
+def _upload_source(index: int) -> bytes:
+    """A small JPEG unique to `index`, so uploads are not deduplicated by content."""
+    return make_source(IMAGES[0], *UPLOAD_SIZE, seed=SEED + index)
+
+
+def build_cases(sizes: list[str], iterations: int, requests: int, rows: int, concurrency: int) -> list[Case]:
+    """List every benchmark case with its arguments."""
+    cases = [
+        Case(f"image.{operation}.{image.name}.{size}", image_case, (operation, image, SIZES[size], iterations))
+        for operation in IMAGE_OPERATIONS
+        for image in IMAGES
+        for size in sizes
+    ]
+    cases += [Case(f"api.{endpoint}", api_case, (endpoint, rows, requests, concurrency)) for endpoint in API_ENDPOINTS]
+    return cases
+
+
+def _measure(case: Case, results: "multiprocessing.Queue") -> None:
+    """Run a case and report its timings and the peak RSS of this process."""
+    try:
+        samples, elapsed = case.run(*case.args)
+    except Exception as e:
+        results.put({"error": f"{type(e).__name__}: {e}"})
+        return
+    # ru_maxrss is reported in kilobytes on Linux
+    results.put(summarize(samples, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def run(args: argparse.Namespace) -> int:
+    """Run the selected cases and write their results."""
+    cases = build_cases(args.sizes, args.iterations, args.requests, args.rows, args.concurrency)
+    if args.filter:
+        cases = [case for case in cases if any(pattern in case.name for pattern in args.filter)]
+
+    results: dict[str, Any] = {"meta": _machine(args), "cases": {}}
+    with tempfile.TemporaryDirectory(prefix="fotacos-bench-") as scratch:
+        # Workers import fotacos after this, so their settings point at scratch storage and a fresh database
+        os.environ.update({
+            "DATABASE_URL": "sqlite://:memory:",
+            "UPLOAD_DIR": str(Path(scratch) / "picts"),
+            "STAGING_DIR": str(Path(scratch) / "staging"),
+            "VARIANT_CACHE_DIR": str(Path(scratch) / "variants"),
+            "STORAGE_BACKEND": "local",
+            "IMPORT_WATCH": "false",
+            "GC_INTERVAL": "0",
+        })
+        context = multiprocessing.get_context("spawn")
+        queue = context.Queue()
+        print(f"{'case':<52}{'p50 ms':>10}{'p95 ms':>10}{'per s':>10}{'RSS MB':>10}")
+        for case in cases:
+            process = context.Process(target=_measure, args=(case, queue))
+            process.start()
+            result = queue.get()
+            process.join()
+            results["cases"][case.name] = result
+            if "error" in result:
+                print(f"{case.name:<52}  failed: {result['error']}")
+            else:
+                print(
+                    f"{case.name:<52}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+                    f"{result['throughput_per_s']:>10.1f}{result['peak_rss_mb']:>10.1f}"
+                )
+
+    args.output.write_text(json.dumps(results, indent=2) + "\n")
+    print(f"Results written to {args.output}")
+    return 1 if any("error" in result for result in results["cases"].values()) else 0
+
+
+def _machine(args: argparse.Namespace) -> dict[str, Any]:
+    """Describe the machine, library versions and options of a run."""
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "pillow": version("pillow"),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "seed": SEED,
+        "sizes": args.sizes,
+        "iterations": args.iterations,
+        "requests": args.requests,
+        "rows": args.rows,
+        "concurrency": args.concurrency,
+    }
+
+
+def compare_command(args: argparse.Namespace) -> int:
+    """Print the change of every case against a baseline and fail on regressions."""
+    baseline = json.loads(args.baseline.read_text())
+    current = json.loads(args.current.read_text())
+    for key in ("platform", "cpu_count", "pillow"):
+        if baseline["meta"].get(key) != current["meta"].get(key):
+            print(f"Note: {key} differs ({baseline['meta'].get(key)} -> {current['meta'].get(key)})")
+
+    print(f"{'case':<52}{'base p50':>10}{'p50':>10}{'change':>9}")
+    for name, result in current["cases"].items():
+        reference = baseline["cases"].get(name)
+        if reference is None or "error" in reference or "error" in result:
+            status = "new" if reference is None else "failed"
+            print(f"{name:<52}{'':>20}{status:>9}")
+            continue
+        change = result["p50_ms"] / reference["p50_ms"] - 1 if reference["p50_ms"] else 0.0
+        print(f"{name:<52}{reference['p50_ms']:>10.2f}{result['p50_ms']:>10.2f}{change:>+9.1%}")
+
+    regressions = compare(baseline, current, args.threshold, args.min_ms)
+    if not regressions:
+        print(f"No regressions beyond {args.threshold:.0%}")
+        return 0
+    print(f"{len(regressions)} regressions beyond {args.threshold:.0%}:")
+    for regression in regressions:
+        print(
+            f"  {regression.case} {regression.metric}: "
+            f"{regression.baseline:.2f} -> {regression.current:.2f} ({regression.change:+.1%})"
+        )
+    return 1
+
+
+def main() -> None:
+    """Parse the command line and run or compare benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmark cases and write their results as JSON")
+    run_parser.add_argument("--output", type=Path, default=Path("benchmark-results.json"))
+    run_parser.add_argument(
+        "--sizes",
+        type=lambda value: value.split(","),
+        default=["small", "medium"],
+        help=f"Comma-separated image sizes out of {', '.join(SIZES)}",
+    )
+    run_parser.add_argument("--iterations", type=int, default=10, help="Timed calls per image case")
+    run_parser.add_argument("--requests", type=int, default=200, help="Requests per API case")
+    run_parser.add_argument("--rows", type=int, default=10_000, help="Photos in the database of the API cases")
+    run_parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight in the API cases")
+    run_parser.add_argument("--filter", action="append", help="Only run cases whose name contains this, repeatable")
+
+    compare_parser = commands.add_parser("compare", help="Compare results with a baseline and fail on regressions")
+    compare_parser.add_argument("baseline", type=Path)
+    compare_parser.add_argument("current", type=Path)
+    compare_parser.add_argument(
+        "--threshold", type=float, default=0.15, help="Relative change flagged as a regression, 0.15 for 15%%"
+    )
+    compare_parser.add_argument(
+        "--min-ms", type=float, default=1.0, help="Only compare timings of cases whose baseline p50 is at least this"
+    )
+
+    args = parser.parse_args()
+    if args.command == "run":
+        unknown = [size for size in args.sizes if size not in SIZES]
+        if unknown:
+            parser.error(f"unknown sizes: {', '.join(unknown)}")
+        sys.exit(run(args))
+    sys.exit(compare_command(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 """FastAPI application configuration and setup."""
 
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
 
 from fastapi import FastAPI
@@ -8,16 +9,38 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from loguru import logger
 
-from fotacos.api.routes import photos
+from fotacos.api.cache import photo_list_cache
+from fotacos.api.media import MediaFiles
+from fotacos.api.middleware import REQUEST_ID_HEADER, MetricsMiddleware, RequestIdMiddleware
+from fotacos.api.routes import jobs, metrics, photos
 from fotacos.database import close_db, init_db
 from fotacos.env import get_settings
 from fotacos.logging_config import setup_logging
+from fotacos.metrics import write_snapshot
+from fotacos.services import (
+    FileLock,
+    check_storage,
+    collect_expired_uploads,
+    enqueue_stale_derivatives,
+    get_image_worker,
+    get_job_runner,
+    get_photo_feed,
+    get_sprite_cache,
+    get_storage,
+    get_variant_cache,
+    migrate_storage_layout,
+)
+from fotacos.services.importer import PhotoImporter, get_import_state, import_roots, watch_directories
 
 setup_logging()
 settings = get_settings()
 
 PROJECT_ROOT = Path(__file__).parent.parent.parent.parent
 WEB_DIST_DIR = PROJECT_ROOT / "src" / "web" / "dist"
+LEADER_LOCK_NAME = "leader.lock"
+LEADER_RETRY_SECONDS = 5.0
+# How stale the metrics of the other web workers may be on a scrape
+METRICS_SNAPSHOT_SECONDS = 5.0
 
 
 @asynccontextmanager
@@ -26,14 +49,122 @@ async def lifespan(app: FastAPI):
     logger.info("Starting Fotacos API application")
     settings.ensure_directories()
     logger.debug("Ensured upload directories exist")
+    await asyncio.to_thread(get_variant_cache().load)
+    await asyncio.to_thread(get_sprite_cache().load)
+    # With several web workers the supervisor migrates storage, recovers jobs and queues stale derivatives
+    single_process = settings.web_workers == 1
+    if single_process:
+        await asyncio.to_thread(migrate_storage_layout)
     await init_db()
+    photo_list_cache.invalidate()
     logger.info("Database initialized successfully")
+    job_runner = get_job_runner()
+    job_runner.on_photo_change = photos.photos_changed
+    if single_process:
+        stale = await enqueue_stale_derivatives()
+        if stale:
+            logger.info("Queued {} photos for derivative regeneration after a settings change", stale)
+    job_runner.start(recover=single_process)
+    logger.info("Background job runner started")
+    leader_task = asyncio.create_task(_lead(FileLock(settings.staging_dir / LEADER_LOCK_NAME)))
+    share_metrics = settings.metrics_enabled and settings.web_workers > 1
+    snapshot_task = asyncio.create_task(_share_metrics()) if share_metrics else None
     yield
     logger.info("Shutting down Fotacos API application")
+    for task in (leader_task, snapshot_task):
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    await job_runner.stop()
+    await get_photo_feed().stop()
+    image_worker = get_image_worker()
+    image_worker.shutdown()
+    stats = image_worker.stats
+    logger.info(
+        "Image worker stopped: {} jobs completed, {} failed, {} rejected, {:.2f}s total processing time",
+        stats.completed,
+        stats.failed,
+        stats.rejected,
+        stats.run_seconds,
+    )
+    await get_storage().aclose()
     await close_db()
     logger.info("Database connection closed")
 
 
+async def _lead(lock: FileLock) -> None:
+    """
+    Run the background tasks only one web worker may run, once this worker holds the leader lock.
+
+    Workers that do not get the lock keep trying, so another one takes over
+    when the leader exits.
+    """
+    while not lock.acquire(blocking=False):
+        await asyncio.sleep(LEADER_RETRY_SECONDS)
+    tasks = []
+    try:
+        if settings.import_watch:
+            tasks.append(asyncio.create_task(_watch_imports()))
+        if settings.gc_interval:
+            tasks.append(asyncio.create_task(_collect_garbage()))
+        if tasks and settings.web_workers > 1:
+            logger.info("This worker watches imports and collects garbage")
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        lock.release()
+
+
+async def _share_metrics() -> None:
+    """Periodically write the metrics of this worker for whichever worker answers the next scrape."""
+    try:
+        while True:
+            try:
+                await asyncio.to_thread(write_snapshot, settings.metrics_dir)
+            except OSError:
+                logger.exception("Could not share the metrics of this worker")
+            await asyncio.sleep(METRICS_SNAPSHOT_SECONDS)
+    finally:
+        # The last counts of this worker keep counting towards the totals once it exits
+        write_snapshot(settings.metrics_dir)
+
+
+async def _watch_imports() -> None:
+    """Import files that appear in the import directories while the server runs."""
+    paths = import_roots([])
+    importer = PhotoImporter(
+        get_import_state(),
+        batch_size=settings.import_batch_size,
+        concurrency=settings.image_workers,
+        on_batch=photos.photos_changed,
+    )
+    logger.info("Watching {} for new photos", ", ".join(str(path) for path in paths))
+    try:
+        async for stats in watch_directories(importer, paths, settings.import_poll_interval):
+            logger.info("Imported new files: {}", stats.describe())
+    except Exception:
+        logger.exception("Import watcher stopped")
+
+
+async def _collect_garbage() -> None:
+    """Periodically reclaim files left behind by crashes and expired uploads, and queue missing derivatives."""
+    while True:
+        try:
+            report = await check_storage()
+            await collect_expired_uploads()
+        except Exception:
+            logger.exception("Storage garbage collection failed")
+        else:
+            if report.requeued:
+                get_job_runner().notify()
+        await asyncio.sleep(settings.gc_interval)
+
+
 app = FastAPI(
     title="Fotacos API",
     description="Photo album API for managing and serving photos",
@@ -48,13 +179,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Resumable uploads tell clients where to resume in headers
+    expose_headers=[REQUEST_ID_HEADER, "Location", "Upload-Offset", "Upload-Length", "Upload-Expires"],
 )
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)  # type: ignore[arg-type]
+# Outermost, so everything logged while handling a request carries its ID
+app.add_middleware(RequestIdMiddleware)  # type: ignore[arg-type]
 
 # Include API routes
 app.include_router(photos.router, prefix="/api")
+app.include_router(jobs.router, prefix="/api")
+if settings.metrics_enabled:
+    app.include_router(metrics.router)
 
-# Mount public directory for photos and thumbnails
-app.mount("/public", StaticFiles(directory=settings.upload_dir.parent), name="public")
+# Serve photos and thumbnails from storage under the URLs stored with each photo
+app.mount(
+    "/public/picts",
+    MediaFiles(storage=get_storage(), redirect_max_age=settings.storage_url_expires // 2),
+    name="public",
+)
 
 # Mount the built web app (production)
 if WEB_DIST_DIR.exists():
@@ -0,0 +1,109 @@
+"""In-process cache of serialized API responses."""
+
+import hashlib
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import dataclass
+
+from fotacos.env import get_settings
+
+settings = get_settings()
+# Seconds between checks whether other processes changed the data behind cached responses
+SOURCE_SYNC_SECONDS = 1.0
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """Serialized response body with its strong ETag."""
+
+    body: bytes
+    etag: str
+
+
+def make_etag(body: bytes) -> str:
+    """Build a strong ETag from the response body."""
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Check an If-None-Match header against an ETag using weak comparison."""
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+class ResponseCache:
+    """Versioned LRU cache of serialized responses, dropped wholesale on invalidation."""
+
+    def __init__(self, max_entries: int, sync_interval: float = SOURCE_SYNC_SECONDS) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of responses kept before the least recently used is evicted
+            sync_interval: Seconds between checks of the version of the data source
+        """
+        self.max_entries = max_entries
+        self.sync_interval = sync_interval
+        self.version = 0
+        self._source_version: int | None = None
+        self._synced_at: float | None = None
+        self._entries: OrderedDict[Hashable, CachedResponse] = OrderedDict()
+
+    def get(self, key: Hashable) -> CachedResponse | None:
+        """Get a cached response, marking it as recently used."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Hashable, body: bytes, version: int) -> CachedResponse:
+        """
+        Store a serialized response.
+
+        Args:
+            key: Cache key, typically the request parameters
+            body: Serialized response body
+            version: Cache version read before the data was loaded; stale results are not stored
+
+        Returns:
+            The cached response with its ETag
+        """
+        entry = CachedResponse(body=body, etag=make_etag(body))
+        if version != self.version:
+            return entry
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self) -> None:
+        """Drop every cached response after the underlying data changed."""
+        self.version += 1
+        self._entries.clear()
+
+    def sync_due(self) -> bool:
+        """
+        Whether the version of the data source should be read again, at most once per sync interval.
+
+        Changes made by this process invalidate the cache directly, so only
+        changes made elsewhere wait for the next check.
+        """
+        now = time.monotonic()
+        if self._synced_at is not None and now - self._synced_at < self.sync_interval:
+            return False
+        self._synced_at = now
+        return True
+
+    def sync(self, source_version: int) -> None:
+        """Drop every cached response if the data changed elsewhere, as told by a version read from its source."""
+        if source_version != self._source_version:
+            if self._source_version is not None:
+                self.invalidate()
+            self._source_version = source_version
+
+
+photo_list_cache = ResponseCache(max_entries=settings.list_cache_entries)
@@ -0,0 +1,166 @@
+"""Static serving of stored photos with long-lived caching and format negotiation."""
+
+import hashlib
+import os
+import stat
+from pathlib import PurePosixPath
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, RedirectResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from fotacos.services.storage import InvalidStorageKeyError, Storage
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MEDIA_CHUNK_SIZE = 256 * 1024
+
+# Sibling formats tried in order of preference, each only for clients that list it in Accept
+NEGOTIATED_FORMATS = (
+    (".avif", "image/avif"),
+    (".jxl", "image/jxl"),
+    (".webp", "image/webp"),
+)
+NEGOTIABLE_SUFFIXES = {suffix for suffix, _ in NEGOTIATED_FORMATS}
+
+
+class MediaFileResponse(FileResponse):
+    """File response streamed in larger chunks when the server cannot send the file itself."""
+
+    chunk_size = MEDIA_CHUNK_SIZE
+
+
+def strong_etag(path: str, stat_result: os.stat_result) -> str:
+    """Build a strong ETag that differs between the representations negotiated for one URL."""
+    base = f"{os.path.basename(path)}:{stat_result.st_mtime_ns}:{stat_result.st_size}"
+    return f'"{hashlib.blake2b(base.encode(), digest_size=16).hexdigest()}"'
+
+
+def accepted_types(accept: str | None) -> set[str]:
+    """Media types a client explicitly accepts, ignoring wildcards and types refused with q=0."""
+    types = set()
+    for media_range in (accept or "").split(","):
+        media_type, *params = (part.strip() for part in media_range.split(";"))
+        if not media_type or "*" in media_type:
+            continue
+        if _quality(params) > 0:
+            types.add(media_type.lower())
+    return types
+
+
+def _quality(params: list[str]) -> float:
+    """Read the q parameter of a media range, defaulting to 1."""
+    for param in params:
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "q":
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+class MediaFiles(StaticFiles):
+    """
+    Serve stored photos, which never change once written under their unique filename.
+
+    Responses carry an immutable Cache-Control and a strong ETag, and support
+    range requests. Starlette sends the file through the server's
+    ``http.response.pathsend`` extension when it offers one, so the bytes never
+    pass through Python. Requests for an image pick the preferred sibling
+    format the client accepts, AVIF, then JPEG XL, then WebP, falling back
+    to the requested file. No JPEG is stored, so clients that accept none of
+    these get the WebP file.
+
+    Given a storage backend instead of a directory, paths are storage keys.
+    Backends that hand out their own URLs get clients redirected there.
+    """
+
+    def __init__(
+        self,
+        *,
+        storage: Storage | None = None,
+        cache_control: str = IMMUTABLE_CACHE_CONTROL,
+        redirect_max_age: int = 0,
+        **kwargs,
+    ) -> None:
+        """
+        Initialize the media files app.
+
+        Args:
+            storage: Storage backend to serve keys from, instead of a directory
+            cache_control: Cache-Control header sent with every file
+            redirect_max_age: Seconds clients may cache a redirect to the storage backend
+            **kwargs: Passed on to StaticFiles
+        """
+        super().__init__(**kwargs)
+        self.storage = storage
+        self.cache_control = cache_control
+        self.redirect_max_age = redirect_max_age
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        """Serve the best representation of an image the client accepts, or the requested file."""
+        if self.storage is not None and scope["method"] in ("GET", "HEAD"):
+            try:
+                url = self.storage.url(PurePosixPath(path).as_posix())
+            except InvalidStorageKeyError:
+                raise HTTPException(status_code=404) from None
+            if url is not None:
+                # Presigned URLs expire, so the redirect must not be cached for longer than they live
+                headers = {"cache-control": f"private, max-age={self.redirect_max_age}"}
+                return RedirectResponse(url, status_code=307, headers=headers)
+
+        suffix = PurePosixPath(path).suffix.lower()
+        if scope["method"] not in ("GET", "HEAD") or suffix not in NEGOTIABLE_SUFFIXES:
+            return await super().get_response(path, scope)
+
+        accepted = accepted_types(Headers(scope=scope).get("accept"))
+        full_path, stat_result = await anyio.to_thread.run_sync(self._negotiate, path, accepted)
+        if stat_result is None:
+            return await super().get_response(path, scope)
+        return self.file_response(full_path, stat_result, scope)
+
+    def lookup_path(self, path: str) -> tuple[str, os.stat_result | None]:
+        """Find a file in the served directory, or the local file of a storage key."""
+        if self.storage is None:
+            return super().lookup_path(path)
+        try:
+            full_path = self.storage.local_path(PurePosixPath(path).as_posix())
+        except InvalidStorageKeyError:
+            return "", None
+        if full_path is None:
+            return "", None
+        try:
+            return str(full_path), os.stat(full_path)
+        except (FileNotFoundError, NotADirectoryError):
+            return "", None
+
+    def _negotiate(self, path: str, accepted: set[str]) -> tuple[str, os.stat_result | None]:
+        """Find the most preferred existing sibling of an image the client can display."""
+        stem = path[: -len(PurePosixPath(path).suffix)]
+        for suffix, media_type in NEGOTIATED_FORMATS:
+            if media_type not in accepted:
+                continue
+            full_path, stat_result = self.lookup_path(stem + suffix)
+            if stat_result is not None and stat.S_ISREG(stat_result.st_mode):
+                return full_path, stat_result
+        return "", None
+
+    def file_response(
+        self,
+        full_path: str | os.PathLike[str],
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        """Build the file response with caching headers, or a 304 if the client copy is current."""
+        headers = {"cache-control": self.cache_control, "etag": strong_etag(str(full_path), stat_result)}
+        if PurePosixPath(scope["path"]).suffix.lower() in NEGOTIABLE_SUFFIXES:
+            # The same URL may be answered with another format, so shared caches must key on Accept
+            headers["vary"] = "Accept"
+        response = MediaFileResponse(full_path, status_code=status_code, headers=headers, stat_result=stat_result)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
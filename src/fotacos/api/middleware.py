@@ -0,0 +1,95 @@
+"""ASGI middleware tagging requests with an ID and measuring them."""
+
+import re
+import time
+import uuid
+
+from loguru import logger
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from fotacos.metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS, HTTP_REQUESTS_IN_FLIGHT
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# IDs from clients are reused so logs can be correlated across services, as long as they are harmless
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+
+def route_label(scope: Scope, root_path: str) -> str:
+    """
+    Name the route that handled a request, after routing filled in the scope.
+
+    Path templates keep the number of label values small: ``/api/photos/{photo_id}``
+    rather than one value per photo.
+
+    Args:
+        scope: Scope of the request once the app has handled it
+        root_path: Root path of the scope before routing
+
+    Returns:
+        The path template of the route, the prefix of the mount, or "other"
+    """
+    route = scope.get("route")
+    path_format = getattr(route, "path_format", None)
+    if path_format is not None:
+        return path_format
+    # Mounts extend the root path with their own prefix
+    mount = scope.get("root_path", "")[len(root_path) :]
+    return f"{mount}/{{path}}" if mount else "other"
+
+
+class RequestIdMiddleware:
+    """Gives every request an ID, attached to the log records it produces and returned in a header."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        """Wrap an ASGI app."""
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Handle a request with its ID in the logging context."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        incoming = Headers(scope=scope).get(REQUEST_ID_HEADER)
+        request_id = incoming if incoming and REQUEST_ID_PATTERN.fullmatch(incoming) else uuid.uuid4().hex
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(REQUEST_ID_HEADER, request_id)
+            await send(message)
+
+        with logger.contextualize(request_id=request_id):
+            await self.app(scope, receive, send_with_id)
+
+
+class MetricsMiddleware:
+    """Counts requests by route and status and observes how long they take, until the body is sent."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        """Wrap an ASGI app."""
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Handle a request while measuring it."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        root_path = scope.get("root_path", "")
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            seconds = time.perf_counter() - start
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = route_label(scope, root_path)
+            HTTP_REQUEST_DURATION.observe(seconds, method=scope["method"], route=route)
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=str(status))
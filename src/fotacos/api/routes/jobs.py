@@ -0,0 +1,80 @@
+"""Background job API routes."""
+
+from fastapi import APIRouter, HTTPException
+from loguru import logger
+from pydantic import BaseModel
+
+from fotacos.models import Job, JobStatus, Photo, PhotoStatus
+from fotacos.services import enqueue_derivatives, enqueue_stale_derivatives, get_job_runner
+
+router = APIRouter(tags=["jobs"])
+
+
+class JobResponse(BaseModel):
+    """Response model for a background job."""
+
+    id: int
+    kind: str
+    photo_id: int
+    status: str
+    attempts: int
+    last_error: str | None
+    run_after: str
+    created_at: str
+    updated_at: str
+
+
+class JobSummaryResponse(BaseModel):
+    """Response model for the job queue summary."""
+
+    counts: dict[str, int]
+
+
+class EnqueueResponse(BaseModel):
+    """Response model for re-enqueued derivative jobs."""
+
+    queued: int
+
+
+@router.get("/jobs", response_model=JobSummaryResponse)
+async def job_summary() -> JobSummaryResponse:
+    """Count jobs by status."""
+    counts = {status.value: await Job.filter(status=status).count() for status in JobStatus}
+    return JobSummaryResponse(counts=counts)
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: int) -> JobResponse:
+    """Get the status of a background job."""
+    job = await Job.get_or_none(id=job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return JobResponse(
+        id=job.id,
+        kind=job.kind,
+        photo_id=job.photo_id,
+        status=job.status,
+        attempts=job.attempts,
+        last_error=job.last_error,
+        run_after=job.run_after.isoformat(),
+        created_at=job.created_at.isoformat(),
+        updated_at=job.updated_at.isoformat(),
+    )
+
+
+@router.post("/jobs/derivatives", response_model=EnqueueResponse)
+async def rebuild_derivatives(force: bool = False) -> EnqueueResponse:
+    """
+    Re-enqueue derivative generation.
+
+    By default only photos generated with different thumbnail settings are
+    queued; with `force` every ready photo is regenerated.
+    """
+    if force:
+        queued = await enqueue_derivatives(await Photo.filter(status=PhotoStatus.READY).only("id"))
+    else:
+        queued = await enqueue_stale_derivatives()
+    get_job_runner().notify()
+    logger.info("Queued {} derivative jobs (force={})", queued, force)
+    return EnqueueResponse(queued=queued)
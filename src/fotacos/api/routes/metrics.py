@@ -0,0 +1,20 @@
+"""Prometheus metrics endpoint."""
+
+import asyncio
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from fotacos.env import get_settings
+from fotacos.metrics import CONTENT_TYPE, REGISTRY, render_shared
+
+router = APIRouter(tags=["metrics"])
+settings = get_settings()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """Current metrics in the Prometheus text exposition format, summed over every web worker."""
+    if settings.web_workers > 1:
+        return Response(await asyncio.to_thread(render_shared, settings.metrics_dir), media_type=CONTENT_TYPE)
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
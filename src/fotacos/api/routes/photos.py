@@ -1,24 +1,119 @@
 """Photo management API routes."""
 
-import uuid
+import asyncio
+import base64
+import binascii
+import json
+import os
+from collections.abc import AsyncIterator, Iterator
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from email.utils import format_datetime
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, Any, BinaryIO, Literal
 
-from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import FileResponse, StreamingResponse
 from loguru import logger
 from pydantic import BaseModel
-
+from starlette.requests import ClientDisconnect
+from tortoise import timezone
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import Q
+from tortoise.queryset import QuerySet
+
+from fotacos.api.cache import etag_matches, photo_list_cache
+from fotacos.database import data_version
 from fotacos.env import get_settings
-from fotacos.models import Photo
-from fotacos.services import convert_to_webp, generate_thumbnail
+from fotacos.models import (
+    Job,
+    JobKind,
+    JobStatus,
+    Photo,
+    PhotoEventKind,
+    PhotoOrientation,
+    PhotoStatus,
+    UploadSession,
+)
+from fotacos.services import (
+    ChangesExpiredError,
+    IngestedFile,
+    PhotoChange,
+    SpritePhoto,
+    UnavailableFormatError,
+    UnsupportedImageError,
+    UploadBusyError,
+    UploadIncompleteError,
+    UploadOffsetError,
+    UploadTooLargeError,
+    VariantSpec,
+    append_chunk,
+    create_upload,
+    derivatives_signature,
+    discard_upload,
+    finish_upload,
+    get_encoding_profile,
+    get_job_runner,
+    get_photo_feed,
+    get_sprite_cache,
+    get_variant_cache,
+    image_fields,
+    new_photo_filename,
+    pending_original_path,
+    photo_keys,
+    photo_urls,
+    record_photo_events,
+    resolve_sibling_formats,
+    spool_upload,
+    store_derivatives,
+    unit_of_work,
+)
+from fotacos.services.encoding import EncodingProfileName, SiblingFormat
+from fotacos.services.storage import STORAGE_CHUNK_SIZE
 
 settings = get_settings()
 
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp"}
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+VARIANT_CACHE_CONTROL = "public, max-age=86400"
+# Sprite sheets are named after their content, so a URL never serves another image
+SPRITE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+SPRITE_URL_PREFIX = "/api/photos/sprites/"
+PHOTO_LIST_FIELDS = (
+    "id",
+    "filename",
+    "original_url",
+    "thumbnail_url",
+    "file_size",
+    "status",
+    "width",
+    "height",
+    "orientation",
+    "blurhash",
+    "dominant_color",
+    "taken_at",
+    "camera",
+    "latitude",
+    "longitude",
+    "created_at",
+)
+PhotoSort = Literal["taken_at", "created_at"]
+# Milliseconds browsers wait before reconnecting to the change feed
+EVENT_RETRY_MS = 3000
+# Content type of the chunks of a resumable upload, as in the tus protocol
+CHUNK_CONTENT_TYPE = "application/offset+octet-stream"
 
 router = APIRouter(tags=["photos"])
 
 
+def photos_changed() -> None:
+    """Drop cached listings and wake change feed subscribers once photo changes have committed."""
+    photo_list_cache.invalidate()
+    get_photo_feed().notify()
+
+
 class PhotoResponse(BaseModel):
     """Response model for a photo."""
 
@@ -27,145 +122,870 @@ class PhotoResponse(BaseModel):
     original_url: str
     thumbnail_url: str
     file_size: int
+    status: str
+    width: int | None = None
+    height: int | None = None
+    orientation: str | None = None
+    blurhash: str | None = None
+    dominant_color: str | None = None
+    taken_at: str
+    camera: str | None = None
+    latitude: float | None = None
+    longitude: float | None = None
     created_at: str
 
 
+def _to_response(photo: Photo) -> PhotoResponse:
+    """Build the API response for a photo record."""
+    return PhotoResponse(
+        id=photo.id,
+        filename=photo.filename,
+        original_url=photo.original_url,
+        thumbnail_url=photo.thumbnail_url,
+        file_size=photo.file_size,
+        status=photo.status,
+        width=photo.width,
+        height=photo.height,
+        orientation=photo.orientation,
+        blurhash=photo.blurhash,
+        dominant_color=photo.dominant_color,
+        taken_at=photo.taken_at.isoformat(),
+        camera=photo.camera,
+        latitude=photo.latitude,
+        longitude=photo.longitude,
+        created_at=photo.created_at.isoformat(),
+    )
+
+
 class PhotoListResponse(BaseModel):
     """Response model for listing photos."""
 
     photos: list[PhotoResponse]
     total: int
+    next_cursor: str | None = None
+
+
+class SpriteTileResponse(BaseModel):
+    """Response model for the cell of a photo in a sprite sheet."""
+
+    id: int
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+class SpriteSheetResponse(BaseModel):
+    """Response model for the sprite sheet of a listing page."""
+
+    sheet_url: str | None = None
+    width: int = 0
+    height: int = 0
+    tile_size: int
+    tiles: list[SpriteTileResponse] = []
+    next_cursor: str | None = None
+
+
+def _encode_cursor(sort: PhotoSort, sorted_at: datetime, photo_id: int) -> str:
+    """Encode the sort key of the last photo in a page as an opaque cursor."""
+    raw = json.dumps([sort, sorted_at.isoformat(), photo_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort: PhotoSort) -> tuple[datetime, int]:
+    """Decode a cursor produced by `_encode_cursor` for the same sort order."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, sorted_at, photo_id = json.loads(raw)
+        decoded = datetime.fromisoformat(sorted_at), int(photo_id)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+    if cursor_sort != sort:
+        raise HTTPException(status_code=400, detail="Cursor belongs to another sort order")
+    return decoded
+
+
+def _as_utc(value: datetime | None) -> datetime | None:
+    """Read datetimes given without a UTC offset in the database timezone, UTC."""
+    if value is None or timezone.is_aware(value):
+        return value
+    return timezone.make_aware(value)
+
+
+@dataclass(frozen=True)
+class PhotoFilters:
+    """Conditions a photo listing is restricted to."""
+
+    taken_after: datetime | None = None
+    taken_before: datetime | None = None
+    camera: str | None = None
+    orientation: PhotoOrientation | None = None
+
+    def apply(self, query: QuerySet[Photo]) -> QuerySet[Photo]:
+        """Restrict a photo query to the matching photos."""
+        if self.taken_after is not None:
+            query = query.filter(taken_at__gte=self.taken_after)
+        if self.taken_before is not None:
+            query = query.filter(taken_at__lt=self.taken_before)
+        if self.camera is not None:
+            query = query.filter(camera=self.camera)
+        if self.orientation is not None:
+            query = query.filter(orientation=self.orientation)
+        return query
+
+
+def _listing_filters(
+    taken_after: Annotated[datetime | None, Query(description="Only photos taken at or after this time")] = None,
+    taken_before: Annotated[datetime | None, Query(description="Only photos taken before this time")] = None,
+    camera: Annotated[str | None, Query(max_length=128, description="Only photos taken with this camera")] = None,
+    orientation: Annotated[PhotoOrientation | None, Query(description="Only photos of this shape")] = None,
+) -> PhotoFilters:
+    """Read the filters of a photo listing from the query string."""
+    return PhotoFilters(_as_utc(taken_after), _as_utc(taken_before), camera, orientation)
 
 
 @router.get("/photos", response_model=PhotoListResponse)
-async def list_photos() -> PhotoListResponse:
-    """List all photos from the database."""
-    logger.info("Fetching all photos from database")
-    photos = await Photo.all().order_by("-created_at")
-
-    photo_responses = [
-        PhotoResponse(
-            id=photo.id,
-            filename=photo.filename,
-            original_url=photo.original_url,
-            thumbnail_url=photo.thumbnail_url,
-            file_size=photo.file_size,
-            created_at=photo.created_at.isoformat(),
-        )
-        for photo in photos
+async def list_photos(
+    filters: Annotated[PhotoFilters, Depends(_listing_filters)],
+    limit: Annotated[
+        int, Query(ge=1, le=MAX_PAGE_SIZE, description="Maximum number of photos to return")
+    ] = DEFAULT_PAGE_SIZE,
+    cursor: Annotated[str | None, Query(description="Cursor returned as next_cursor by the previous page")] = None,
+    sort: Annotated[PhotoSort, Query(description="Order photos by capture or upload time")] = "taken_at",
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> Response:
+    """
+    List photos newest first, one keyset-paginated page at a time.
+
+    Photos are sorted by capture time, which falls back to the upload time for
+    photos that do not record one, or by upload time. Filters are combined.
+    Times without a UTC offset are read as UTC.
+    """
+    cache_key = (limit, cursor, sort, filters)
+    # Photos added or removed by other processes, such as further web workers or an import, go unnoticed otherwise;
+    # checked at most once per interval, so cached pages and 304s usually need no query
+    if photo_list_cache.sync_due():
+        photo_list_cache.sync(await data_version())
+    cached = photo_list_cache.get(cache_key)
+    if cached is None:
+        logger.info("Fetching photos page (limit={}, cursor={}, sort={}, filters={})", limit, cursor, sort, filters)
+        version = photo_list_cache.version
+        cached = photo_list_cache.put(cache_key, await _render_photo_page(limit, cursor, sort, filters), version)
+
+    if etag_matches(if_none_match, cached.etag):
+        logger.debug("Photos page not modified (limit={}, cursor={})", limit, cursor)
+        return Response(status_code=304, headers={"ETag": cached.etag})
+    return Response(content=cached.body, media_type="application/json", headers={"ETag": cached.etag})
+
+
+async def _render_photo_page(limit: int, cursor: str | None, sort: PhotoSort, filters: PhotoFilters) -> bytes:
+    """Query one page of photos and serialize it to JSON."""
+    rows, next_cursor = await _query_page(limit, cursor, sort, filters, PHOTO_LIST_FIELDS)
+    total = await filters.apply(Photo.all()).count()
+
+    for row in rows:
+        _serialize_times(row)
+
+    logger.debug("Retrieved {} of {} photos", len(rows), total)
+    payload = {"photos": rows, "total": total, "next_cursor": next_cursor}
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+async def _query_page(
+    limit: int, cursor: str | None, sort: PhotoSort, filters: PhotoFilters, fields: tuple[str, ...]
+) -> tuple[list[dict[str, Any]], str | None]:
+    """
+    Query the rows of one page of photos.
+
+    Args:
+        limit: Maximum number of photos in the page
+        cursor: Cursor of the page, None for the first one
+        sort: Sort order of the listing
+        filters: Conditions the listing is restricted to
+        fields: Columns to fetch, including the sort column and the ID
+
+    Returns:
+        The rows of the page and the cursor of the next page, None for the last one
+    """
+    query = filters.apply(Photo.all())
+    if cursor is not None:
+        sorted_at, photo_id = _decode_cursor(cursor, sort)
+        query = query.filter(Q(**{f"{sort}__lt": sorted_at}) | Q(**{sort: sorted_at, "id__lt": photo_id}))
+
+    # Fetch one extra row to know whether another page follows, and skip model instantiation
+    rows = await query.order_by(f"-{sort}", "-id").limit(limit + 1).values(*fields)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(sort, rows[-1][sort], rows[-1]["id"])
+    return rows, next_cursor
+
+
+def _serialize_times(row: dict[str, Any]) -> dict[str, Any]:
+    """Turn the datetimes of a listed photo row into ISO strings, in place."""
+    row["taken_at"] = row["taken_at"].isoformat()
+    row["created_at"] = row["created_at"].isoformat()
+    return row
+
+
+@router.get("/photos/events")
+async def photo_events(
+    last_event_id: Annotated[int | None, Header(ge=0)] = None,
+    after: Annotated[int | None, Query(ge=0, description="Sequence number of the last change already seen")] = None,
+) -> StreamingResponse:
+    """
+    Stream photo changes as server-sent events.
+
+    Events are named after what happened to a photo (`added`, `updated` or
+    `removed`); their ID is the sequence number of the change and their data
+    the photo as listed, or only its ID once removed. Reconnecting with the
+    `Last-Event-ID` header, as browsers do, or `after` resumes after that
+    change; without either the stream starts with the next change. A `reset`
+    event means the changes since were pruned: reload the listing, the stream
+    continues from there.
+    """
+    start = last_event_id if last_event_id is not None else after
+    return StreamingResponse(
+        _event_stream(start),
+        media_type="text/event-stream",
+        # Proxies must pass events on as they come rather than buffer the response
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _event_stream(after: int | None) -> AsyncIterator[bytes]:
+    """Follow the change feed, rendering each change as a server-sent event."""
+    feed = get_photo_feed()
+    yield f"retry: {EVENT_RETRY_MS}\n\n".encode()
+    while True:
+        try:
+            async for changes in feed.subscribe(after, settings.event_heartbeat):
+                if not changes:
+                    yield b": keep-alive\n\n"
+                    continue
+                after = changes[-1].sequence
+                yield b"".join(await _render_changes(changes))
+        except ChangesExpiredError as e:
+            logger.info("Change feed client resuming from {} must reload, feed is at {}", e.sequence, e.latest)
+            after = e.latest
+            yield _sse("reset", after, {"sequence": after})
+
+
+async def _render_changes(changes: list[PhotoChange]) -> list[bytes]:
+    """Render changes as server-sent events, with the current listing of the photos they touch."""
+    touched = {change.photo_id for change in changes if change.kind != PhotoEventKind.REMOVED}
+    rows = await Photo.filter(id__in=touched).values(*PHOTO_LIST_FIELDS) if touched else []
+    photos = {row["id"]: _serialize_times(row) for row in rows}
+    events = []
+    for change in changes:
+        if change.kind == PhotoEventKind.REMOVED:
+            events.append(_sse(change.kind, change.sequence, {"id": change.photo_id}))
+        elif change.photo_id in photos:
+            events.append(_sse(change.kind, change.sequence, photos[change.photo_id]))
+        # Otherwise the photo is gone already and its removal follows
+    return events
+
+
+def _sse(event: str, sequence: int, data: dict[str, Any]) -> bytes:
+    """Format one server-sent event."""
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return f"id: {sequence}\nevent: {event}\ndata: {payload}\n\n".encode()
+
+
+@router.get("/photos/sprites", response_model=SpriteSheetResponse)
+async def get_photo_sprites(
+    filters: Annotated[PhotoFilters, Depends(_listing_filters)],
+    limit: Annotated[
+        int, Query(ge=1, le=MAX_PAGE_SIZE, description="Maximum number of photos in the page")
+    ] = DEFAULT_PAGE_SIZE,
+    cursor: Annotated[str | None, Query(description="Cursor returned as next_cursor by the previous page")] = None,
+    sort: Annotated[PhotoSort, Query(description="Order photos by capture or upload time")] = "taken_at",
+) -> SpriteSheetResponse:
+    """
+    Get the thumbnails of a listing page packed into one sprite sheet, and where each photo is in it.
+
+    Takes the parameters of `GET /api/photos` and covers the same page, so a
+    grid loads one image instead of a thumbnail per photo. Thumbnails are
+    cropped to square cells; photos still being processed are left out. The
+    sheet is built on first request and again once the page changes, copying
+    the cells of photos that stay on the page from its previous sheet.
+    """
+    fields = ("id", sort, "filename", "status", "derivatives_version")
+    rows, next_cursor = await _query_page(limit, cursor, sort, filters, fields)
+    photos = [
+        SpritePhoto(row["id"], row["filename"], row["derivatives_version"])
+        for row in rows
+        if row["status"] == PhotoStatus.READY
     ]
+    sprites = get_sprite_cache()
+    try:
+        sheet = await sprites.get((limit, cursor, sort, filters), photos)
+    except FileNotFoundError as e:
+        logger.error("Thumbnail missing while building a sprite sheet: {}", e)
+        raise HTTPException(status_code=404, detail="Photo thumbnail not found") from e
+
+    if sheet is None:
+        return SpriteSheetResponse(tile_size=sprites.tile_size, next_cursor=next_cursor)
+    return SpriteSheetResponse(
+        sheet_url=f"{SPRITE_URL_PREFIX}{sheet.name}",
+        width=sheet.width,
+        height=sheet.height,
+        tile_size=sheet.tile_size,
+        tiles=[
+            SpriteTileResponse(id=tile.photo_id, x=tile.x, y=tile.y, width=tile.size, height=tile.size)
+            for tile in sheet.tiles()
+        ],
+        next_cursor=next_cursor,
+    )
+
 
-    logger.debug(f"Retrieved {len(photo_responses)} photos")
-    return PhotoListResponse(photos=photo_responses, total=len(photo_responses))
+@router.get("/photos/sprites/{name}")
+async def get_sprite_sheet(name: str) -> FileResponse:
+    """Get a sprite sheet image; a sheet evicted since is rebuilt by requesting its page again."""
+    path = get_sprite_cache().path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Sprite sheet not found")
+    return FileResponse(path, media_type="image/webp", headers={"Cache-Control": SPRITE_CACHE_CONTROL})
 
 
-@router.post("/photos", response_model=PhotoResponse)
-async def upload_photo(file: Annotated[UploadFile, File(description="Photo file to upload")]) -> PhotoResponse:
-    """Upload a new photo, generate thumbnail, and save to database."""
-    logger.info(f"Received photo upload request: {file.filename}")
+@router.get("/photos/{photo_id}", response_model=PhotoResponse)
+async def get_photo(photo_id: int) -> PhotoResponse:
+    """Get a single photo, including the processing status of its derivatives."""
+    photo = await Photo.get_or_none(id=photo_id)
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    return _to_response(photo)
+
+
+@router.get("/photos/{photo_id}/image")
+async def get_photo_image(
+    photo_id: int,
+    w: Annotated[int | None, Query(ge=1, le=settings.variant_max_dimension)] = None,
+    h: Annotated[int | None, Query(ge=1, le=settings.variant_max_dimension)] = None,
+    fmt: Literal["webp", "jpeg", "png"] = "webp",
+) -> StreamingResponse:
+    """
+    Get a photo resized to fit within `w` x `h` pixels, rendering it on first request.
+
+    A missing dimension is unbounded up to the maximum variant size. Photos are
+    never upscaled. Rendered variants are kept in a size-bounded disk cache.
+    """
+    photo = await Photo.get_or_none(id=photo_id)
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    if photo.status != PhotoStatus.READY:
+        raise HTTPException(status_code=409, detail="Photo is still being processed")
 
-    if not file.filename:
+    spec = VariantSpec(
+        width=w or settings.variant_max_dimension,
+        height=h or settings.variant_max_dimension,
+        fmt=fmt,
+    )
+    try:
+        variant = await get_variant_cache().open(photo.filename, spec)
+    except FileNotFoundError as e:
+        logger.error("Image file of photo {} is missing: {}", photo_id, e)
+        raise HTTPException(status_code=404, detail="Photo image not found") from e
+    # Streamed from the open file, which another web worker's eviction cannot pull away mid-response
+    headers = {"Cache-Control": VARIANT_CACHE_CONTROL, "Content-Length": str(os.fstat(variant.fileno()).st_size)}
+    return StreamingResponse(_read_file(variant), media_type=spec.media_type, headers=headers)
+
+
+def _read_file(file: BinaryIO) -> Iterator[bytes]:
+    """Read an open file in chunks, closing it once read."""
+    with file:
+        while chunk := file.read(STORAGE_CHUNK_SIZE):
+            yield chunk
+
+
+def _encoding_options(profile: EncodingProfileName | None, formats: list[SiblingFormat] | None) -> dict[str, Any]:
+    """Validate the encoding choices of an upload, in the form derivative jobs store them."""
+    options: dict[str, Any] = {}
+    if profile is not None:
+        options["profile"] = profile
+    if formats is not None:
+        try:
+            options["formats"] = resolve_sibling_formats(list(formats))
+        except UnavailableFormatError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+    return options
+
+
+@router.post("/photos", response_model=PhotoResponse, status_code=202)
+async def upload_photo(
+    file: Annotated[UploadFile, File(description="Photo file to upload")],
+    response: Response,
+    profile: Annotated[EncodingProfileName | None, Query(description="Encoding profile, default from settings")] = None,
+    formats: Annotated[
+        list[SiblingFormat] | None, Query(description="Formats stored next to the WebP files, default from settings")
+    ] = None,
+) -> PhotoResponse:
+    """
+    Upload a new photo and queue generation of its WebP image and thumbnail.
+
+    Responds 202 with a pending photo once the original is stored; poll
+    `GET /api/photos/{id}` until its status is `ready`. Uploads of content that
+    is already stored respond 200 with the existing photo. Requesting a format
+    the server cannot encode responds 400.
+    """
+    logger.info("Received photo upload request: {}", file.filename)
+    options = _encoding_options(profile, formats)
+
+    async with _spool_validated(file) as ingested:
+        photo, created = await _store_ingested(ingested, file.filename or "", options)
+    if not created:
+        response.status_code = 200
+    return _to_response(photo)
+
+
+@router.post("/photos/batch")
+async def upload_photos_batch(
+    files: Annotated[list[UploadFile], File(description="Photo files to upload")],
+    profile: Annotated[EncodingProfileName | None, Query(description="Encoding profile, default from settings")] = None,
+    formats: Annotated[
+        list[SiblingFormat] | None, Query(description="Formats stored next to the WebP files, default from settings")
+    ] = None,
+) -> StreamingResponse:
+    """
+    Upload many photos at once, streaming one NDJSON result line per file.
+
+    Every file is spooled before the response starts, then converted in
+    parallel on the image worker. Lines report each file as it finishes
+    (`error`, `duplicate` or `processed`), then `created` once all rows are
+    inserted in a single transaction, followed by a `done` summary.
+    """
+    logger.info("Received batch upload of {} files", len(files))
+    options = _encoding_options(profile, formats)
+    stack = AsyncExitStack()
+    ingested: list[tuple[int, str, IngestedFile]] = []
+    errors: list[dict] = []
+    try:
+        for index, file in enumerate(files):
+            try:
+                item = await stack.enter_async_context(_spool_validated(file))
+            except HTTPException as e:
+                errors.append(_batch_line(index, file.filename, "error", detail=e.detail))
+            else:
+                ingested.append((index, file.filename or "", item))
+    except BaseException:
+        await stack.aclose()
+        raise
+
+    return StreamingResponse(_process_batch(stack, ingested, errors, options), media_type="application/x-ndjson")
+
+
+class UploadSessionResponse(BaseModel):
+    """Response model for a resumable upload."""
+
+    id: str
+    filename: str
+    length: int
+    offset: int
+    expires_at: str
+
+
+def _to_upload_response(session: UploadSession) -> UploadSessionResponse:
+    """Build the API response for a resumable upload."""
+    return UploadSessionResponse(
+        id=session.id,
+        filename=session.filename,
+        length=session.length,
+        offset=session.offset,
+        expires_at=session.expires_at.isoformat(),
+    )
+
+
+def _upload_headers(session: UploadSession) -> dict[str, str]:
+    """Headers telling the client how far a resumable upload got, as in the tus protocol."""
+    return {
+        "Upload-Offset": str(session.offset),
+        "Upload-Length": str(session.length),
+        "Upload-Expires": format_datetime(session.expires_at.astimezone(UTC), usegmt=True),
+        "Cache-Control": "no-store",
+    }
+
+
+@router.post("/photos/uploads", response_model=UploadSessionResponse, status_code=201)
+async def create_photo_upload(
+    upload_length: Annotated[int, Header(ge=1, description="Size of the whole file in bytes")],
+    filename: Annotated[str, Query(max_length=255, description="Name of the file, whose extension must be allowed")],
+    response: Response,
+    profile: Annotated[EncodingProfileName | None, Query(description="Encoding profile, default from settings")] = None,
+    formats: Annotated[
+        list[SiblingFormat] | None, Query(description="Formats stored next to the WebP files, default from settings")
+    ] = None,
+) -> UploadSessionResponse:
+    """
+    Start a resumable upload, for large files over connections that may drop.
+
+    Send the file in chunks with `PATCH` to the `Location` returned, each
+    starting at the `Upload-Offset` received so far; after a dropped
+    connection, `HEAD` tells where to resume. Once every byte arrived, `POST`
+    to its `/finish` to store the photo. Uploads that receive nothing for a
+    while expire, at the time given by `Upload-Expires`.
+    """
+    _validate_filename(filename)
+    options = _encoding_options(profile, formats)
+    try:
+        session = await create_upload(filename, upload_length, options or None)
+    except UploadTooLargeError as e:
+        logger.warning("Upload {} too large: {} bytes", filename, upload_length)
+        raise HTTPException(status_code=413, detail=str(e)) from e
+    response.headers.update(_upload_headers(session))
+    response.headers["Location"] = f"/api/photos/uploads/{session.id}"
+    return _to_upload_response(session)
+
+
+async def _get_upload(upload_id: str) -> UploadSession:
+    """Get a resumable upload that has not expired, removing it if it has."""
+    session = await UploadSession.get_or_none(id=upload_id)
+    if session is not None and session.expires_at <= timezone.now():
+        await discard_upload(session)
+        session = None
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+
+@router.head("/photos/uploads/{upload_id}")
+async def get_photo_upload_offset(upload_id: str) -> Response:
+    """Get how many bytes of a resumable upload were received, in the `Upload-Offset` header."""
+    session = await _get_upload(upload_id)
+    return Response(status_code=204, headers=_upload_headers(session))
+
+
+@router.patch("/photos/uploads/{upload_id}", status_code=204)
+async def append_photo_upload(
+    upload_id: str,
+    request: Request,
+    upload_offset: Annotated[int, Header(ge=0, description="Position of the chunk, the bytes received so far")],
+    content_type: Annotated[str | None, Header()] = None,
+) -> Response:
+    """
+    Append a chunk to a resumable upload, written to the staging area as it arrives.
+
+    The body is the raw bytes of the chunk, sent as
+    `application/offset+octet-stream`. A chunk that does not start at the bytes
+    received so far is rejected with 409. Bytes that arrived before a connection
+    dropped are kept.
+    """
+    if content_type != CHUNK_CONTENT_TYPE:
+        raise HTTPException(status_code=415, detail=f"Chunks must be sent as {CHUNK_CONTENT_TYPE}")
+    session = await _get_upload(upload_id)
+    try:
+        await append_chunk(session, upload_offset, request.stream())
+    except UploadBusyError as e:
+        raise HTTPException(status_code=423, detail="Upload is receiving another chunk") from e
+    except UploadOffsetError as e:
+        raise HTTPException(status_code=409, detail=str(e), headers=_upload_headers(session)) from e
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e), headers=_upload_headers(session)) from e
+    except UnsupportedImageError as e:
+        logger.warning("Upload {} is not a supported image", session.filename)
+        await discard_upload(session)
+        raise HTTPException(status_code=400, detail="Uploaded file is not an image") from e
+    except ClientDisconnect:
+        logger.info("Upload {} interrupted at {} of {} bytes", upload_id, session.offset, session.length)
+    return Response(status_code=204, headers=_upload_headers(session))
+
+
+@router.post("/photos/uploads/{upload_id}/finish", response_model=PhotoResponse, status_code=202)
+async def finish_photo_upload(upload_id: str, response: Response) -> PhotoResponse:
+    """
+    Store a resumable upload whose bytes all arrived, like a single-request upload.
+
+    Responds as `POST /api/photos` does. Finishing before every byte arrived
+    responds 409; when the processing queue is full, the upload is kept and
+    finishing can be retried.
+    """
+    session = await _get_upload(upload_id)
+    try:
+        async with finish_upload(session) as ingested:
+            photo, created = await _store_ingested(ingested, session.filename, session.options)
+    except UploadBusyError as e:
+        raise HTTPException(status_code=423, detail="Upload is receiving another chunk") from e
+    except UploadIncompleteError as e:
+        raise HTTPException(status_code=409, detail=str(e), headers=_upload_headers(session)) from e
+    except UnsupportedImageError as e:
+        logger.warning("Upload {} is not a supported image", session.filename)
+        await discard_upload(session)
+        raise HTTPException(status_code=400, detail="Uploaded file is not an image") from e
+    if not created:
+        response.status_code = 200
+    return _to_response(photo)
+
+
+@router.delete("/photos/uploads/{upload_id}", status_code=204)
+async def cancel_photo_upload(upload_id: str) -> Response:
+    """Cancel a resumable upload, removing the bytes received so far."""
+    session = await _get_upload(upload_id)
+    await discard_upload(session)
+    return Response(status_code=204)
+
+
+def _validate_filename(filename: str | None) -> None:
+    """Reject uploads without a name or whose extension is not allowed."""
+    if not filename:
         logger.warning("Upload attempt with no filename")
         raise HTTPException(status_code=400, detail="No filename provided")
 
     # Validate extension
-    ext = Path(file.filename).suffix.lower()
+    ext = Path(filename).suffix.lower()
     if ext not in ALLOWED_EXTENSIONS:
-        logger.warning(f"Invalid file extension attempted: {ext} for file {file.filename}")
+        logger.warning("Invalid file extension attempted: {} for file {}", ext, filename)
         raise HTTPException(
             status_code=400,
             detail=f"File type not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}",
         )
 
+
+def _validate_upload(file: UploadFile) -> None:
+    """Reject uploads whose name, MIME type or declared size is not acceptable."""
+    _validate_filename(file.filename)
+
     # Validate MIME type
     if not file.content_type or not file.content_type.startswith("image/"):
-        logger.warning(f"Invalid MIME type: {file.content_type} for file {file.filename}")
+        logger.warning("Invalid MIME type: {} for file {}", file.content_type, file.filename)
         raise HTTPException(status_code=400, detail="Uploaded file is not an image")
 
-    unique_id = uuid.uuid4()
-    webp_filename = f"photo_{unique_id}.webp"
-    logger.debug(f"Generated unique filename: {webp_filename}")
+    if file.size is not None and file.size > settings.max_upload_size:
+        logger.warning("Upload {} too large: {} bytes", file.filename, file.size)
+        raise HTTPException(
+            status_code=413, detail=f"File exceeds the maximum size of {settings.max_upload_size} bytes"
+        )
 
-    full_photo_path = settings.upload_dir / webp_filename
-    thumbnail_photo_path = settings.upload_dir / "thumbnails" / webp_filename
 
-    # Ensure directories exist
-    full_photo_path.parent.mkdir(parents=True, exist_ok=True)
-    thumbnail_photo_path.parent.mkdir(parents=True, exist_ok=True)
+@asynccontextmanager
+async def _spool_validated(file: UploadFile) -> AsyncIterator[IngestedFile]:
+    """Validate an upload and spool it to the staging area, mapping ingest errors to HTTP errors."""
+    _validate_upload(file)
+    try:
+        async with spool_upload(file, settings.staging_dir, settings.max_upload_size) as ingested:
+            yield ingested
+    except UploadTooLargeError as e:
+        logger.warning("Upload {} too large: {}", file.filename, e)
+        raise HTTPException(status_code=413, detail=str(e)) from e
+    except UnsupportedImageError as e:
+        logger.warning("Upload {} is not a supported image", file.filename)
+        raise HTTPException(status_code=400, detail="Uploaded file is not an image") from e
+
+
+async def _store_ingested(
+    ingested: IngestedFile, source_name: str, options: dict[str, Any] | None = None
+) -> tuple[Photo, bool]:
+    """
+    Keep an ingested upload as a pending photo and queue its derivative job.
+
+    Args:
+        ingested: Spooled upload to store
+        source_name: Original filename, for logging
+        options: Encoding choices passed on to the derivative job
+
+    Returns:
+        The photo and whether it was created, False when the content was already stored
+    """
+    duplicate = await Photo.get_or_none(content_hash=ingested.content_hash)
+    if duplicate:
+        logger.info("Upload {} duplicates photo {}, skipping processing", source_name, duplicate.id)
+        return duplicate, False
+
+    backlog = await Job.filter(status__in=[JobStatus.PENDING, JobStatus.RUNNING]).count()
+    if backlog >= settings.job_backlog_limit:
+        logger.warning("Rejecting upload {}: {} jobs pending", source_name, backlog)
+        raise HTTPException(
+            status_code=503,
+            detail="Image processing queue is full, try again later",
+            headers={"Retry-After": "30"},
+        )
 
+    webp_filename = new_photo_filename()
+    try:
+        async with unit_of_work() as files:
+            files.move(ingested.path, pending_original_path(webp_filename))
+            photo = await Photo.create(
+                **photo_urls(webp_filename),
+                file_size=ingested.size,
+                content_hash=ingested.content_hash,
+                status=PhotoStatus.PENDING,
+            )
+            await Job.create(kind=JobKind.DERIVATIVES, photo=photo, run_after=timezone.now(), options=options or None)
+            await record_photo_events(PhotoEventKind.ADDED, [photo.id])
+    except IntegrityError:
+        # A concurrent upload of the same content won the race; keep its record
+        duplicate = await Photo.get_or_none(content_hash=ingested.content_hash)
+        if duplicate is None:
+            raise
+        logger.info("Upload {} duplicates photo {} created concurrently", source_name, duplicate.id)
+        return duplicate, False
+
+    photos_changed()
+    get_job_runner().notify()
+    logger.info("Stored upload {} as pending photo {} ({})", source_name, photo.id, webp_filename)
+    return photo, True
+
+
+async def _convert_ingested(ingested: IngestedFile, source_name: str, options: dict[str, Any]) -> Photo:
+    """
+    Convert an ingested upload on the image worker and build its unsaved Photo record.
+
+    Waits for a free worker slot rather than failing when the worker queue is full.
+
+    Args:
+        ingested: Spooled upload to convert
+        source_name: Original filename, for logging
+        options: Encoding choices of the upload
+
+    Returns:
+        Photo instance describing the written files, not yet saved to the database
+    """
+    webp_filename = new_photo_filename()
     try:
-        logger.debug("Converting image to WebP format")
-        # Convert original to WebP
-        webp_stream = convert_to_webp(file.file)
-
-        # Save converted WebP to disk
-        with open(full_photo_path, "wb") as f:
-            f.write(webp_stream.read())
-        logger.debug(f"Saved original WebP image to {full_photo_path}")
-
-        # Generate WebP thumbnail from the webp_stream
-        webp_stream.seek(0)  # Reset stream for thumbnail generation
-        logger.debug("Generating thumbnail")
-        thumbnail_stream = generate_thumbnail(webp_stream)
-
-        # Save thumbnail to disk
-        with open(thumbnail_photo_path, "wb") as f:
-            f.write(thumbnail_stream.read())
-        logger.debug(f"Saved thumbnail to {thumbnail_photo_path}")
-
-        # Get the actual file size of the WebP image
-        file_size = full_photo_path.stat().st_size
-        logger.info(f"Successfully processed image: {webp_filename} (size: {file_size} bytes)")
+        logger.debug("Converting image to WebP and generating thumbnail in image worker")
+        saved = await store_derivatives(
+            ingested.path,
+            webp_filename,
+            profile=get_encoding_profile(options.get("profile")),
+            formats=options.get("formats"),
+        )
+        logger.info("Successfully processed image: {} (size: {} bytes)", webp_filename, saved.file_size)
     except Exception as e:
-        logger.error(f"Failed to process image {file.filename}: {e}", exc_info=True)
-        # If conversion fails, delete all created files and raise error
-        full_photo_path.unlink(missing_ok=True)
-        thumbnail_photo_path.unlink(missing_ok=True)
-        raise HTTPException(status_code=500, detail=f"Failed to process image: {e}") from e
-
-    # Generate URLs for the mounted static directories
-    original_url = f"/public/picts/{webp_filename}"
-    thumbnail_url = f"/public/picts/thumbnails/{webp_filename}"
-
-    photo = await Photo.create(
-        filename=webp_filename,
-        original_url=original_url,
-        thumbnail_url=thumbnail_url,
-        file_size=file_size,
+        logger.error("Failed to process image {}: {}", source_name, e, exc_info=True)
+        raise
+
+    return Photo(
+        **photo_urls(webp_filename),
+        **image_fields(saved),
+        content_hash=ingested.content_hash,
+        derivatives_version=derivatives_signature(),
     )
 
-    return PhotoResponse(
-        id=photo.id,
-        filename=photo.filename,
-        original_url=photo.original_url,
-        thumbnail_url=photo.thumbnail_url,
-        file_size=photo.file_size,
-        created_at=photo.created_at.isoformat(),
-    )
+
+def _batch_line(index: int, filename: str | None, status: str, **fields: Any) -> dict:
+    """Build one result line of a batch upload."""
+    return {"index": index, "filename": filename, "status": status, **fields}
+
+
+def _ndjson(line: dict) -> bytes:
+    """Serialize a batch result line as newline-delimited JSON."""
+    return json.dumps(line, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+
+
+async def _process_batch(
+    stack: AsyncExitStack,
+    ingested: list[tuple[int, str, IngestedFile]],
+    errors: list[dict],
+    options: dict[str, Any],
+) -> AsyncIterator[bytes]:
+    """Convert spooled batch files in parallel and insert the results, yielding NDJSON progress lines."""
+    async with stack:
+        for line in errors:
+            yield _ndjson(line)
+
+        hashes = [item.content_hash for _, _, item in ingested]
+        existing = dict(await Photo.filter(content_hash__in=hashes).values_list("content_hash", "id"))
+        first_in_batch: dict[str, int] = {}
+        duplicates = 0
+        tasks = []
+        for index, name, item in ingested:
+            if item.content_hash in existing:
+                duplicates += 1
+                yield _ndjson(_batch_line(index, name, "duplicate", photo_id=existing[item.content_hash]))
+            elif item.content_hash in first_in_batch:
+                duplicates += 1
+                yield _ndjson(_batch_line(index, name, "duplicate", duplicate_of=first_in_batch[item.content_hash]))
+            else:
+                first_in_batch[item.content_hash] = index
+                tasks.append(asyncio.create_task(_convert_batch_item(index, name, item, options)))
+
+        converted: dict[int, tuple[str, Photo]] = {}
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, name, result = await next_done
+                if isinstance(result, Photo):
+                    converted[index] = (name, result)
+                    yield _ndjson(_batch_line(index, name, "processed"))
+                else:
+                    yield _ndjson(_batch_line(index, name, "error", detail=result))
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        created = await _insert_batch([photo for _, photo in converted.values()])
+        for index, (name, photo) in sorted(converted.items()):
+            if photo.content_hash in created:
+                yield _ndjson(
+                    _batch_line(index, name, "created", photo=_to_response(created[photo.content_hash]).model_dump())
+                )
+            else:
+                duplicates += 1
+                yield _ndjson(_batch_line(index, name, "duplicate"))
+
+        failed = len(errors) + len(tasks) - len(converted)
+        logger.info("Batch upload finished: {} created, {} duplicates, {} failed", len(created), duplicates, failed)
+        yield _ndjson({"status": "done", "created": len(created), "duplicates": duplicates, "failed": failed})
+
+
+async def _convert_batch_item(
+    index: int, name: str, item: IngestedFile, options: dict[str, Any]
+) -> tuple[int, str, Photo | str]:
+    """Convert one batch file, returning the error message instead of raising."""
+    try:
+        return index, name, await _convert_ingested(item, name, options)
+    except Exception as e:
+        return index, name, f"Failed to process image: {e}"
+
+
+async def _insert_batch(photos: list[Photo]) -> dict[str, Photo]:
+    """
+    Insert converted batch photos in one transaction.
+
+    Photos whose content was stored concurrently by another upload are skipped
+    rather than failing the rest, and their files are deleted once the
+    transaction commits.
+
+    Returns:
+        The inserted photos keyed by content hash
+    """
+    if not photos:
+        return {}
+
+    filenames = [photo.filename for photo in photos]
+    async with unit_of_work() as files:
+        for photo in photos:
+            files.adopt(*photo_keys(photo.filename))
+        await Photo.bulk_create(photos, ignore_conflicts=True)
+        inserted = await Photo.filter(filename__in=filenames)
+        skipped = set(filenames) - {photo.filename for photo in inserted}
+        for filename in skipped:
+            files.delete(*photo_keys(filename))
+        await record_photo_events(PhotoEventKind.ADDED, [photo.id for photo in inserted])
+    if skipped:
+        logger.warning("Skipped {} batch photos stored concurrently by another upload", len(skipped))
+    photos_changed()
+    return {photo.content_hash: photo for photo in inserted}
 
 
 @router.delete("/photos/{photo_id}")
 async def delete_photo(photo_id: int) -> dict[str, str]:
     """Delete a photo, its thumbnail, and database record."""
-    logger.info(f"Received delete request for photo ID: {photo_id}")
+    logger.info("Received delete request for photo ID: {}", photo_id)
     photo = await Photo.get_or_none(id=photo_id)
 
     if not photo:
-        logger.warning(f"Photo not found for deletion: ID {photo_id}")
+        logger.warning("Photo not found for deletion: ID {}", photo_id)
         raise HTTPException(status_code=404, detail="Photo not found")
 
-    full_photo_path = settings.upload_dir / photo.filename
-    thumbnail_photo_path = settings.upload_dir / "thumbnails" / photo.filename
-
-    if full_photo_path.exists():
-        full_photo_path.unlink()
-        logger.debug(f"Deleted original photo file: {full_photo_path}")
-
-    if thumbnail_photo_path.exists():
-        thumbnail_photo_path.unlink()
-        logger.debug(f"Deleted thumbnail file: {thumbnail_photo_path}")
-
-    await photo.delete()
-    logger.info(f"Successfully deleted photo: {photo.filename} (ID: {photo_id})")
+    # Files are only removed once the row is gone, so a failed delete leaves the photo intact
+    async with unit_of_work() as files:
+        await photo.delete()
+        await record_photo_events(PhotoEventKind.REMOVED, [photo_id])
+        files.delete(*photo_keys(photo.filename))
+        files.discard(pending_original_path(photo.filename))
+    await get_variant_cache().discard(photo.filename)
+    get_sprite_cache().discard(photo.filename)
+
+    photos_changed()
+    logger.info("Successfully deleted photo: {} (ID: {})", photo.filename, photo_id)
 
     return {"message": f"Photo {photo.filename} deleted successfully"}
@@ -1,20 +1,153 @@
 """Server startup for FastAPI application."""
 
+import asyncio
+import os
+import shutil
+import signal
+import time
+from contextlib import suppress
+from socket import socket
+
 import uvicorn
+from loguru import logger
 
+from fotacos.database import close_db, init_db
+from fotacos.env import get_settings
 from fotacos.logging_config import setup_logging
+from fotacos.services import enqueue_stale_derivatives, migrate_storage_layout, recover_interrupted_jobs
+
+APP = "fotacos.api:app"
+# Exit status uvicorn uses when the application fails to start
+STARTUP_FAILURE = 3
+RESTART_DELAY = 1.0
+
 
+def run_web(host: str = "127.0.0.1", port: int = 8000, reload: bool = False, workers: int = 1) -> None:
+    """
+    Run the FastAPI web server.
 
-def run_web(host: str = "127.0.0.1", port: int = 8000, reload: bool = False) -> None:
-    """Run the FastAPI web server."""
+    Args:
+        host: Address to bind to
+        port: Port to bind to
+        reload: Restart the server when the code changes, for development
+        workers: Number of server processes, each handling requests and running image jobs
+    """
     # Setup logging before starting the server
     setup_logging()
 
+    if workers > 1:
+        if not reload:
+            _run_preforked(host, port, workers)
+            return
+        logger.warning("Auto-reload runs a single server process, ignoring the number of workers")
+        # The reloaded server runs in a new process, which reads its settings from the environment
+        os.environ["WEB_WORKERS"] = "1"
+        get_settings().web_workers = 1
+
     uvicorn.run(
-        "fotacos.api:app",
+        APP,
         host=host,
         port=port,
         reload=reload,
         log_config=None,  # Disable uvicorn's logging config
         log_level=None,  # Prevent uvicorn from resetting log level
+        # Change feed streams never end by themselves, so stopping would otherwise wait for every client
+        timeout_graceful_shutdown=get_settings().web_shutdown_timeout,
+    )
+
+
+def _run_preforked(host: str, port: int, workers: int) -> None:
+    """
+    Serve from several forked processes sharing one listening socket.
+
+    The database and storage are migrated and interrupted jobs are re-queued
+    once, before forking. The application is imported before forking too, so
+    the workers share its memory pages, and its log files are written by this
+    process from the queue the workers send their records to, and their
+    metrics are summed from the snapshots they share in a directory. Workers that exit
+    unexpectedly are replaced; the jobs they were running are taken over by
+    the other workers once their lease expires.
+    """
+    settings = get_settings()
+    settings.web_workers = workers
+    settings.ensure_directories()
+    # Metrics start from zero with every server, like those of a single process
+    shutil.rmtree(settings.metrics_dir, ignore_errors=True)
+    settings.metrics_dir.mkdir()
+    asyncio.run(_prepare_database())
+
+    config = uvicorn.Config(
+        APP,
+        host=host,
+        port=port,
+        log_config=None,
+        log_level=None,
+        timeout_graceful_shutdown=settings.web_shutdown_timeout,
     )
+    config.load()
+    sock = config.bind_socket()
+    logger.info("Starting {} web workers on {}:{}", workers, host, port)
+
+    children: set[int] = set()
+    stopping = False
+
+    def stop(signum: int, _frame: object) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            with suppress(ProcessLookupError):
+                os.kill(pid, signum)
+
+    previous = {signum: signal.signal(signum, stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        for _ in range(workers):
+            children.add(_fork_worker(config, sock, previous))
+        while children:
+            pid, status = os.wait()
+            children.discard(pid)
+            code = os.waitstatus_to_exitcode(status)
+            if stopping:
+                continue
+            if code == STARTUP_FAILURE:
+                logger.error("Web worker {} failed to start, stopping the server", pid)
+                stop(signal.SIGTERM, None)
+                continue
+            logger.warning("Web worker {} exited with status {}, starting a new one", pid, code)
+            time.sleep(RESTART_DELAY)
+            children.add(_fork_worker(config, sock, previous))
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+        sock.close()
+    logger.info("All web workers stopped")
+
+
+def _fork_worker(config: uvicorn.Config, sock: socket, handlers: dict) -> int:
+    """Fork a process serving the application from the shared socket, returning its pid."""
+    pid = os.fork()
+    if pid:
+        return pid
+    # The child: uvicorn installs its own handlers for a graceful shutdown
+    for signum, handler in handlers.items():
+        signal.signal(signum, handler)
+    code = 1
+    try:
+        uvicorn.Server(config).run(sockets=[sock])
+        code = 0
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 1
+    finally:
+        os._exit(code)
+
+
+async def _prepare_database() -> None:
+    """Migrate the database and storage and re-queue work once for all workers, before any of them starts."""
+    await asyncio.to_thread(migrate_storage_layout)
+    await init_db()
+    try:
+        await recover_interrupted_jobs()
+        stale = await enqueue_stale_derivatives()
+        if stale:
+            logger.info("Queued {} photos for derivative regeneration after a settings change", stale)
+    finally:
+        await close_db()
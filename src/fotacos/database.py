@@ -1,21 +1,137 @@
 """Database configuration and initialization."""
 
-from tortoise import Tortoise
+from typing import Any
 
-from fotacos.env import get_settings
+from loguru import logger
+from tortoise import Tortoise, connections
+from tortoise.backends.base.client import NestedTransactionContext, TransactionContext
+from tortoise.backends.base.config_generator import expand_db_url
+from tortoise.backends.sqlite.client import SqliteClient, SqliteTransactionContext, SqliteTransactionWrapper
+from tortoise.exceptions import ConfigurationError
+
+from fotacos.env import Settings, get_settings
+from fotacos.metrics import DB_QUERY_DURATION
+from fotacos.migrations import migrate
+
+MODEL_MODULES = ["fotacos.models.photo", "fotacos.models.job", "fotacos.models.event", "fotacos.models.upload"]
+SQLITE_ENGINE = "tortoise.backends.sqlite"
+# Tortoise loads the client class of a connection from the `client_class` of its engine module
+INSTRUMENTED_SQLITE_ENGINE = __name__
+QUERY_OPERATIONS = frozenset({"select", "insert", "update", "delete", "pragma", "create", "alter", "drop"})
+
+
+def query_operation(query: str) -> str:
+    """Label a SQL statement by its leading keyword, keeping the set of labels small."""
+    keyword = query.lstrip().partition(" ")[0].lower()
+    return keyword if keyword in QUERY_OPERATIONS else "other"
+
+
+class _TimedQueries:
+    """Observes the duration of every query, including the wait for the connection, by operation."""
+
+    async def execute_insert(self, query: str, values: list) -> int:
+        """Run an INSERT and return the id of the new row."""
+        with DB_QUERY_DURATION.time(operation="insert"):
+            return await super().execute_insert(query, values)  # type: ignore[misc]
+
+    async def execute_many(self, query: str, values: list[list]) -> None:
+        """Run a statement once per set of values."""
+        with DB_QUERY_DURATION.time(operation=query_operation(query)):
+            await super().execute_many(query, values)  # type: ignore[misc]
+
+    async def execute_query(self, query: str, values: list | None = None) -> tuple[int, Any]:
+        """Run a query and return the number of affected rows and the rows."""
+        with DB_QUERY_DURATION.time(operation=query_operation(query)):
+            return await super().execute_query(query, values)  # type: ignore[misc]
+
+    async def execute_query_dict(self, query: str, values: list | None = None) -> list[dict]:
+        """Run a query and return its rows as dictionaries."""
+        with DB_QUERY_DURATION.time(operation=query_operation(query)):
+            return await super().execute_query_dict(query, values)  # type: ignore[misc]
+
+    async def execute_script(self, query: str) -> None:
+        """Run several statements."""
+        with DB_QUERY_DURATION.time(operation="script"):
+            await super().execute_script(query)  # type: ignore[misc]
+
+
+class InstrumentedSqliteClient(_TimedQueries, SqliteClient):
+    """SQLite client reporting query durations to the metrics endpoint."""
+
+    def _in_transaction(self) -> TransactionContext:
+        """Open a transaction whose queries are timed too."""
+        return SqliteTransactionContext(InstrumentedSqliteTransaction(self), self._lock)
+
+
+class InstrumentedSqliteTransaction(_TimedQueries, SqliteTransactionWrapper):
+    """Transaction of an instrumented SQLite client, whose queries are timed as well."""
+
+    def _in_transaction(self) -> TransactionContext:
+        """Open a nested transaction whose queries are timed too."""
+        return NestedTransactionContext(InstrumentedSqliteTransaction(self))
+
+
+client_class = InstrumentedSqliteClient
+
+
+def sqlite_pragmas(settings: Settings) -> dict[str, Any]:
+    """PRAGMA values applied to every SQLite connection, in the order they are set."""
+    return {
+        # First, so switching the journal mode waits for other processes instead of failing
+        "busy_timeout": settings.sqlite_busy_timeout,
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        # Negative values are KiB rather than pages
+        "cache_size": -settings.sqlite_cache_size_kib,
+        "mmap_size": settings.sqlite_mmap_size,
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+    }
+
+
+def build_tortoise_config(settings: Settings) -> dict[str, Any]:
+    """Build the Tortoise ORM configuration, tuning SQLite connections from settings."""
+    connection = expand_db_url(settings.database_url)
+    if connection["engine"] == SQLITE_ENGINE:
+        connection["engine"] = INSTRUMENTED_SQLITE_ENGINE
+        connection["credentials"].update(sqlite_pragmas(settings))
+    return {
+        "connections": {"default": connection},
+        "apps": {"models": {"models": MODEL_MODULES, "default_connection": "default"}},
+    }
 
 
 async def init_db() -> None:
-    """Initialize Tortoise ORM and generate schema."""
+    """Initialize Tortoise ORM and bring the schema up to date."""
     settings = get_settings()
 
-    await Tortoise.init(
-        db_url=settings.database_url,
-        modules={"models": ["fotacos.models.photo"]},
-    )
-    await Tortoise.generate_schemas()
+    await Tortoise.init(config=build_tortoise_config(settings))
+    version = await migrate()
+    logger.debug("Database schema at version {}", version)
+
+
+async def data_version() -> int:
+    """
+    Counter SQLite changes whenever another connection commits to the database.
+
+    Other processes, such as further web workers or the import command, write
+    through their own connection, so a change of this value means cached
+    query results may be stale. Other databases always report 0.
+    """
+    connection = connections.get("default")
+    if connection.capabilities.dialect != "sqlite":
+        return 0
+    _, rows = await connection.execute_query("PRAGMA data_version")
+    return rows[0][0]
 
 
 async def close_db() -> None:
     """Close database connections."""
+    try:
+        connection = connections.get("default")
+    except ConfigurationError:
+        return
+    if connection.capabilities.dialect == "sqlite":
+        # Let SQLite refresh the query planner statistics that changed during this session
+        await connection.execute_query("PRAGMA optimize")
     await Tortoise.close_connections()
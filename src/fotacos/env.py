@@ -2,8 +2,9 @@
 
 from functools import lru_cache
 from pathlib import Path
+from typing import Literal
 
-from pydantic import Field
+from pydantic import Field, SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -22,13 +23,99 @@ class Settings(BaseSettings):
         description="SQLite database URL",
     )
 
+    sqlite_journal_mode: Literal["WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY"] = Field(
+        default="WAL",
+        description="SQLite journal mode; WAL lets readers proceed while a write is in progress",
+    )
+    sqlite_synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = Field(
+        default="NORMAL",
+        description="SQLite fsync level; NORMAL is durable against crashes of the process in WAL mode",
+    )
+    sqlite_cache_size_kib: int = Field(
+        default=16 * 1024,
+        ge=0,
+        description="SQLite page cache size per connection in KiB",
+    )
+    sqlite_mmap_size: int = Field(
+        default=64 * 1024 * 1024,
+        ge=0,
+        description="Bytes of the SQLite database file read through memory mapping",
+    )
+    sqlite_busy_timeout: int = Field(
+        default=5000,
+        ge=0,
+        description="Milliseconds SQLite waits for a lock held by another process",
+    )
+
     upload_dir: Path = Field(
         default=Path("public/picts"),
         description="Directory for uploaded photos",
     )
 
+    storage_backend: Literal["local", "s3"] = Field(
+        default="local",
+        description="Where photos are stored: sharded under upload_dir, or in an S3-compatible bucket",
+    )
+    storage_url_expires: int = Field(
+        default=3600,
+        ge=1,
+        description="Seconds the presigned URLs clients are redirected to stay valid",
+    )
+    s3_endpoint_url: str = Field(
+        default="https://s3.amazonaws.com",
+        description="Base URL of the S3-compatible object store",
+    )
+    s3_bucket: str = Field(
+        default="",
+        description="Bucket photos are stored in",
+    )
+    s3_region: str = Field(
+        default="us-east-1",
+        description="Region of the bucket",
+    )
+    s3_access_key_id: str = Field(
+        default="",
+        description="Access key ID for the object store",
+    )
+    s3_secret_access_key: SecretStr = Field(
+        default=SecretStr(""),
+        description="Secret access key for the object store",
+    )
+    s3_prefix: str = Field(
+        default="",
+        description="Prefix of the object keys, to share a bucket",
+    )
+
+    staging_dir: Path = Field(
+        default=Path("staging"),
+        description="Scratch directory for uploads being ingested (same filesystem as upload_dir)",
+    )
+    max_upload_size: int = Field(
+        default=50 * 1024 * 1024,
+        ge=1,
+        description="Maximum accepted upload size in bytes",
+    )
+    upload_session_ttl: float = Field(
+        default=24 * 60 * 60,
+        gt=0,
+        description="Seconds a resumable upload is kept without receiving a chunk before it is collected",
+    )
+
     api_host: str = Field(default="127.0.0.1", description="API host address")
     api_port: int = Field(default=8000, description="API port")
+    web_workers: int = Field(
+        default=1,
+        ge=1,
+        description=(
+            "Web server processes sharing the port; IMAGE_WORKERS and the variant cache are per process, "
+            "metrics are summed over every process"
+        ),
+    )
+    web_shutdown_timeout: int = Field(
+        default=5,
+        ge=1,
+        description="Seconds open connections, such as change feed streams, get to finish when the server stops",
+    )
     cors_origins: list[str] = Field(
         default=["http://localhost:3000"],
         description="CORS allowed origins",
@@ -42,15 +129,171 @@ class Settings(BaseSettings):
         default=85,
         description="JPEG quality for thumbnails (1-100)",
     )
+    encoding_profile: Literal["fast", "balanced", "archival"] = Field(
+        default="balanced",
+        description="Encoding profile of uploaded photos: encoder effort, quality, size limit and metadata kept",
+    )
+    image_sibling_formats: list[Literal["avif", "jxl"]] = Field(
+        default=[],
+        description="Formats encoded next to each WebP file for clients that accept them, if Pillow supports them",
+    )
+
+    image_workers: int = Field(
+        default=2,
+        ge=1,
+        description="Number of worker processes used for image conversion",
+    )
+    image_queue_depth: int = Field(
+        default=8,
+        ge=1,
+        description="Maximum image jobs queued or running before uploads are rejected",
+    )
+
+    job_max_attempts: int = Field(
+        default=5,
+        ge=1,
+        description="Attempts before a background job is marked as failed",
+    )
+    job_retry_delay: float = Field(
+        default=10.0,
+        ge=0,
+        description="Base delay in seconds before retrying a failed job, doubled on each attempt",
+    )
+    job_poll_interval: float = Field(
+        default=5.0,
+        gt=0,
+        description="Seconds between checks for due background jobs",
+    )
+    job_lease_timeout: float = Field(
+        default=300.0,
+        gt=0,
+        description="Seconds without a heartbeat before a running job is taken over, e.g. after its worker crashed",
+    )
+    job_backlog_limit: int = Field(
+        default=1000,
+        ge=1,
+        description="Maximum pending background jobs before uploads are rejected",
+    )
+
+    list_cache_entries: int = Field(
+        default=64,
+        ge=1,
+        description="Number of serialized photo list pages kept in memory",
+    )
+
+    event_retention: int = Field(
+        default=10000,
+        ge=1,
+        description="Photo changes kept for clients resuming the change feed; older clients reload instead",
+    )
+    event_poll_interval: float = Field(
+        default=1.0,
+        gt=0,
+        description="Seconds between checks for photo changes made by other processes while clients listen",
+    )
+    event_heartbeat: float = Field(
+        default=15.0,
+        gt=0,
+        description="Seconds between keep-alive comments on an idle change feed stream",
+    )
+
+    variant_cache_dir: Path = Field(
+        default=Path("cache/variants"),
+        description="Directory for resized image variants rendered on demand",
+    )
+    variant_cache_max_bytes: int = Field(
+        default=512 * 1024 * 1024,
+        ge=1,
+        description="Total size of cached image variants before the least recently used are evicted",
+    )
+    variant_max_dimension: int = Field(
+        default=4096,
+        ge=1,
+        description="Largest width or height that can be requested for an image variant",
+    )
+
+    sprite_cache_dir: Path = Field(
+        default=Path("cache/sprites"),
+        description="Directory for sprite sheets packing the thumbnails of a listing page",
+    )
+    sprite_cache_max_bytes: int = Field(
+        default=64 * 1024 * 1024,
+        ge=1,
+        description="Total size of cached sprite sheets before the least recently used are evicted",
+    )
+    sprite_tile_size: int = Field(
+        default=128,
+        ge=16,
+        le=512,
+        description="Edge in pixels of the square cells thumbnails are cropped to in sprite sheets",
+    )
+
+    import_dirs: list[Path] = Field(
+        default=[],
+        description="Directories imported by `fotacos import`/`watch`, default the upload directory",
+    )
+    import_watch: bool = Field(
+        default=False,
+        description="Watch the import directories from the API server and import new files",
+    )
+    import_batch_size: int = Field(
+        default=50,
+        ge=1,
+        description="Imported photos inserted per database transaction",
+    )
+    import_poll_interval: float = Field(
+        default=30.0,
+        gt=0,
+        description="Seconds between rescans of watched directories without change notifications",
+    )
+
+    gc_interval: float = Field(
+        default=24 * 60 * 60,
+        ge=0,
+        description="Seconds between storage garbage collections run by the API server, 0 to disable",
+    )
+    gc_grace_period: float = Field(
+        default=60 * 60,
+        ge=0,
+        description="Seconds a stored file must be unmodified before garbage collection may reclaim it",
+    )
+
+    gui_preload_count: int = Field(
+        default=3,
+        ge=0,
+        description="Number of upcoming slideshow photos decoded ahead of time in the GUI",
+    )
+    gui_image_cache_bytes: int = Field(
+        default=256 * 1024 * 1024,
+        ge=1,
+        description="Memory the GUI may use for decoded slideshow photos",
+    )
+
+    metrics_enabled: bool = Field(
+        default=True,
+        description="Serve Prometheus metrics of requests, image processing, queries and storage at /metrics",
+    )
+    log_json: bool = Field(
+        default=False,
+        description="Write the log files as one JSON object per record instead of text lines",
+    )
 
     debug: bool = Field(
         default=False,
-        description="Debug mode for development",
+        description="Debug mode for development; also renders variable values in logged tracebacks",
     )
 
+    @property
+    def metrics_dir(self) -> Path:
+        """Directory the web workers share their metrics through."""
+        return self.staging_dir / "metrics"
+
     def ensure_directories(self) -> None:
-        """Create upload and thumbnail directories if they don't exist."""
+        """Create upload, thumbnail, staging, variant and sprite cache directories if they don't exist."""
         self.upload_dir.mkdir(parents=True, exist_ok=True)
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        self.variant_cache_dir.mkdir(parents=True, exist_ok=True)
+        self.sprite_cache_dir.mkdir(parents=True, exist_ok=True)
 
 
 @lru_cache
@@ -0,0 +1,325 @@
+"""Background decoding and caching of slideshow images."""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from loguru import logger
+from PySide6.QtCore import (
+    Property,
+    QBuffer,
+    QByteArray,
+    QIODevice,
+    QObject,
+    QRunnable,
+    QSize,
+    Qt,
+    QThreadPool,
+    Signal,
+    Slot,
+)
+from PySide6.QtGui import QImage, QImageIOHandler, QImageReader
+from PySide6.QtQuick import QQuickAsyncImageProvider, QQuickImageResponse, QQuickTextureFactory
+
+from fotacos.services.storage import Storage, full_image_key
+
+if TYPE_CHECKING:
+    from fotacos.gui.runner import PhotoGalleryModel
+
+PROVIDER_ID = "photos"
+
+ImageKey = tuple[str, int, int]
+
+
+def decode_image(source: Path | bytes, size: QSize) -> QImage:
+    """
+    Decode an image scaled to fit within a size, applying its EXIF orientation.
+
+    Scaling happens in the reader, which lets decoders skip detail the screen
+    cannot show instead of producing a full-resolution image first.
+
+    Args:
+        source: Image file to decode, or the content of one
+        size: Bounding box to fit the image in, or an empty size for full resolution
+
+    Returns:
+        The decoded image, null if the file could not be read
+    """
+    if isinstance(source, bytes):
+        buffer = QBuffer()
+        buffer.setData(QByteArray(source))
+        buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+        reader = QImageReader(buffer)
+    else:
+        reader = QImageReader(str(source))
+    reader.setAutoTransform(True)
+    source_size = reader.size()
+    if not size.isEmpty() and source_size.isValid():
+        box = QSize(size)
+        # The scaled size applies before the rotation from the EXIF orientation
+        if reader.transformation() & QImageIOHandler.Transformation.TransformationRotate90:
+            box.transpose()
+        scaled = source_size.scaled(box, Qt.AspectRatioMode.KeepAspectRatio)
+        if scaled.width() < source_size.width():
+            reader.setScaledSize(scaled)
+    return reader.read()
+
+
+@dataclass
+class DecodeStats:
+    """Counters of the image decoder."""
+
+    hits: int = 0
+    misses: int = 0
+    decoded: int = 0
+    failed: int = 0
+    last_decode_ms: float = 0.0
+    max_decode_ms: float = 0.0
+    total_decode_ms: float = 0.0
+
+    @property
+    def average_decode_ms(self) -> float:
+        """Mean time spent decoding one image."""
+        return self.total_decode_ms / self.decoded if self.decoded else 0.0
+
+    def record(self, decode_ms: float) -> None:
+        """Record the duration of a decode."""
+        self.decoded += 1
+        self.last_decode_ms = decode_ms
+        self.total_decode_ms += decode_ms
+        self.max_decode_ms = max(self.max_decode_ms, decode_ms)
+
+
+class ImageDecoder:
+    """
+    Decodes images on a thread pool into a memory-capped LRU cache.
+
+    Requests for an image that is already being decoded wait for that decode
+    instead of starting another. Callbacks run on a pool thread. Photos in a
+    remote storage backend are downloaded through the event loop first.
+    """
+
+    def __init__(
+        self,
+        storage: Storage,
+        max_bytes: int,
+        threads: int = 1,
+        loop: asyncio.AbstractEventLoop | None = None,
+    ) -> None:
+        """
+        Initialize the image decoder.
+
+        Args:
+            storage: Storage the requested photos are read from
+            max_bytes: Memory the decoded images may use before the least recently used are dropped
+            threads: Number of decoding threads
+            loop: Event loop downloads from a remote storage backend run on
+        """
+        self.storage = storage
+        self.loop = loop
+        self.max_bytes = max_bytes
+        self.stats = DecodeStats()
+        self._images: OrderedDict[ImageKey, QImage] = OrderedDict()
+        self._bytes = 0
+        self._pending: dict[ImageKey, list[Callable[[QImage], None]]] = {}
+        self._lock = threading.Lock()
+        self._pool = QThreadPool()
+        self._pool.setMaxThreadCount(threads)
+
+    @property
+    def cached_bytes(self) -> int:
+        """Memory used by the decoded images."""
+        return self._bytes
+
+    @property
+    def cached_count(self) -> int:
+        """Number of decoded images kept."""
+        return len(self._images)
+
+    def request(self, filename: str, size: QSize, callback: Callable[[QImage], None] | None = None) -> None:
+        """
+        Get a decoded image, decoding it in the background if it is not cached.
+
+        Args:
+            filename: Stored filename of the photo
+            size: Bounding box the image is scaled to fit in
+            callback: Called with the image, which is null if decoding failed
+        """
+        key = (Path(filename).name, size.width(), size.height())
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.stats.hits += 1
+            elif key in self._pending:
+                if callback is not None:
+                    self._pending[key].append(callback)
+                return
+            else:
+                self.stats.misses += 1
+                self._pending[key] = [callback] if callback is not None else []
+        if image is not None:
+            if callback is not None:
+                # Never call back before the caller returned, an image response finishing early is lost
+                QThreadPool.globalInstance().start(QRunnable.create(lambda: callback(image)))
+            return
+        self._pool.start(QRunnable.create(lambda: self._decode(key)))
+
+    def wait(self) -> None:
+        """Block until every queued decode and callback has finished."""
+        self._pool.waitForDone()
+        QThreadPool.globalInstance().waitForDone()
+
+    def _decode(self, key: ImageKey) -> None:
+        """Decode an image on a pool thread, cache it and hand it to the waiting callbacks."""
+        filename, width, height = key
+        start = time.perf_counter()
+        image = decode_image(self._fetch(filename), QSize(width, height))
+        decode_ms = (time.perf_counter() - start) * 1000
+
+        with self._lock:
+            if image.isNull():
+                self.stats.failed += 1
+            else:
+                self.stats.record(decode_ms)
+                self._store(key, image)
+            callbacks = self._pending.pop(key, [])
+        for callback in callbacks:
+            callback(image)
+
+    def _fetch(self, filename: str) -> Path | bytes:
+        """Locate a photo on disk, or download it from a remote storage backend."""
+        key = full_image_key(filename)
+        path = self.storage.local_path(key)
+        if path is not None:
+            return path
+        if self.loop is None:
+            logger.warning("Cannot download {} from storage without an event loop", key)
+            return b""
+        try:
+            return asyncio.run_coroutine_threadsafe(self.storage.read_bytes(key), self.loop).result()
+        except Exception as e:
+            logger.warning("Could not download {} from storage: {}", key, e)
+            return b""
+
+    def _store(self, key: ImageKey, image: QImage) -> None:
+        """Cache an image as the most recently used, dropping old ones past the memory cap."""
+        self._images[key] = image
+        self._bytes += image.sizeInBytes()
+        while self._bytes > self.max_bytes and len(self._images) > 1:
+            _, dropped = self._images.popitem(last=False)
+            self._bytes -= dropped.sizeInBytes()
+
+
+class _DecodedImageResponse(QQuickImageResponse):
+    """Image response completed when the decoder delivers the image."""
+
+    def __init__(self) -> None:
+        """Initialize an empty response."""
+        super().__init__()
+        self._image = QImage()
+
+    def deliver(self, image: QImage) -> None:
+        """Complete the response; safe to call from any thread."""
+        self._image = image
+        self.finished.emit()
+
+    def textureFactory(self) -> QQuickTextureFactory:
+        """Wrap the decoded image for the scene graph."""
+        return QQuickTextureFactory.textureFactoryForImage(self._image)
+
+    def errorString(self) -> str:
+        """Describe why the image could not be delivered."""
+        return "" if not self._image.isNull() else "Failed to decode photo"
+
+
+class PhotoImageProvider(QQuickAsyncImageProvider):
+    """Serves ``image://photos/<filename>`` from the decoder, off the UI thread."""
+
+    def __init__(self, decoder: ImageDecoder) -> None:
+        """Initialize the provider with the decoder it serves from."""
+        super().__init__()
+        self.decoder = decoder
+
+    def requestImageResponse(self, image_id: str, requested_size: QSize) -> QQuickImageResponse:
+        """Start delivering an image scaled to the size QML asked for."""
+        response = _DecodedImageResponse()
+        self.decoder.request(image_id, requested_size, response.deliver)
+        return response
+
+
+class ImagePreloader(QObject):
+    """Decodes the photos after the current slide ahead of time and reports viewer statistics."""
+
+    statsChanged = Signal()
+
+    def __init__(self, decoder: ImageDecoder, model: "PhotoGalleryModel", count: int) -> None:
+        """
+        Initialize the preloader.
+
+        Args:
+            decoder: Decoder whose cache the photos are loaded into
+            model: Gallery model providing the filenames
+            count: Number of upcoming photos kept decoded
+        """
+        super().__init__()
+        self.decoder = decoder
+        self.model = model
+        self.count = count
+        self._frame_ms = 0.0
+        self._max_frame_ms = 0.0
+        self._last_frame: float | None = None
+
+    @Slot(int, int, int)
+    def preload(self, index: int, width: int, height: int) -> None:
+        """Decode the photos following `index` at the given screen size."""
+        size = QSize(width, height)
+        if size.isEmpty():
+            # Not laid out yet, preloading now would decode at the wrong size
+            return
+        filename_role = self.model.FilenameRole
+        for offset in range(1, self.count + 1):
+            row = index + offset
+            if row >= self.model.rowCount():
+                if self.model.canFetchMore(self.model.index(-1)):
+                    self.model.fetchMore(self.model.index(-1))
+                break
+            self.decoder.request(self.model.data(self.model.index(row), filename_role), size)
+        self.statsChanged.emit()
+
+    @Slot()
+    def frameSwapped(self) -> None:
+        """Measure the time between two presented frames."""
+        now = time.perf_counter()
+        if self._last_frame is not None:
+            self._frame_ms = (now - self._last_frame) * 1000
+            self._max_frame_ms = max(self._max_frame_ms, self._frame_ms)
+        self._last_frame = now
+
+    @Slot()
+    def updateStats(self) -> None:
+        """Notify QML that the statistics changed, polled while the overlay is shown."""
+        self.statsChanged.emit()
+
+    @Slot()
+    def resetFrameStats(self) -> None:
+        """Forget the slowest frame so the overlay shows recent behaviour."""
+        self._max_frame_ms = 0.0
+        self._last_frame = None
+        self.statsChanged.emit()
+
+    @Property(str, notify=statsChanged)
+    def summary(self) -> str:
+        """One-line statistics for the on-screen overlay."""
+        stats = self.decoder.stats
+        return (
+            f"frame {self._frame_ms:.1f} ms (max {self._max_frame_ms:.1f}) | "
+            f"decode {stats.last_decode_ms:.0f} ms (avg {stats.average_decode_ms:.0f}, max {stats.max_decode_ms:.0f}) | "
+            f"cache {self.decoder.cached_count} images, {self.decoder.cached_bytes / 1024 / 1024:.1f} MiB, "
+            f"{stats.hits} hits / {stats.misses} misses"
+        )
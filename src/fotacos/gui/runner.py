@@ -3,62 +3,281 @@
 import asyncio
 import signal
 import sys
+from bisect import bisect_left
+from collections.abc import Coroutine
+from contextlib import suppress
+from datetime import datetime
 from pathlib import Path
+from typing import Any, NamedTuple
 
-from PySide6.QtCore import Property, QObject, Signal, Slot
+from PySide6.QtCore import (
+    Property,
+    QAbstractListModel,
+    QByteArray,
+    QModelIndex,
+    QPersistentModelIndex,
+    Qt,
+    QUrl,
+    Signal,
+    Slot,
+)
 from qasync import QEventLoop
+from tortoise.expressions import Q
+from tortoise.queryset import QuerySet
 
 from fotacos.database import close_db, init_db
 from fotacos.env import get_settings
-from fotacos.models.photo import Photo
+from fotacos.gui.images import PROVIDER_ID, ImageDecoder, ImagePreloader, PhotoImageProvider
+from fotacos.models.photo import Photo, PhotoStatus
+from fotacos.services.events import ChangesExpiredError, PhotoChange, PhotoFeed, get_photo_feed, latest_sequence
+from fotacos.services.storage import full_image_key, get_storage, migrate_storage_layout
 
+PAGE_SIZE = 60
 
-class PhotoGalleryModel(QObject):
-    """Model to expose photos to QML."""
 
-    photosChanged = Signal()
+class PhotoRow(NamedTuple):
+    """The columns of a photo the gallery keeps in memory."""
 
-    def __init__(self) -> None:
-        """Initialize the photo gallery model."""
+    id: int
+    filename: str
+    created_at: datetime
+    dominant_color: str | None
+
+
+class PhotoGalleryModel(QAbstractListModel):
+    """
+    List model exposing processed photos to QML, newest first.
+
+    Rows are fetched a page at a time as views scroll towards the end. While
+    following the photo change feed, added and removed photos are inserted
+    and removed one row at a time as they happen. `refresh()` reloads the
+    fetched window and emits row insertions and removals for what changed
+    instead of resetting the model.
+    """
+
+    IdRole = Qt.ItemDataRole.UserRole + 1
+    FilenameRole = Qt.ItemDataRole.UserRole + 2
+    PathRole = Qt.ItemDataRole.UserRole + 3
+    CreatedAtRole = Qt.ItemDataRole.UserRole + 4
+    DominantColorRole = Qt.ItemDataRole.UserRole + 5
+
+    totalCountChanged = Signal()
+
+    def __init__(self, page_size: int = PAGE_SIZE, feed: PhotoFeed | None = None) -> None:
+        """
+        Initialize the photo gallery model.
+
+        Args:
+            page_size: Number of photos fetched at a time
+            feed: Photo change feed to follow, default the shared one
+        """
         super().__init__()
-        self._photos: list[dict] = []
-        self._settings = get_settings()
+        self.page_size = page_size
+        self._feed = feed or get_photo_feed()
+        self._follower: asyncio.Task | None = None
+        self._rows: list[PhotoRow] = []
+        self._total_count = 0
+        self._exhausted = False
+        self._fetching = False
+        self._storage = get_storage()
         self._tasks: set = set()
 
-    @Property(list, notify=photosChanged)
-    def photos(self) -> list[dict]:
-        """Get the list of photos."""
-        return self._photos
+    @Property(int, notify=totalCountChanged)
+    def totalCount(self) -> int:
+        """Number of processed photos in the database, fetched or not."""
+        return self._total_count
+
+    def roleNames(self) -> dict[int, QByteArray]:
+        """Names under which the roles are available to QML delegates."""
+        return {
+            self.IdRole: QByteArray(b"photoId"),
+            self.FilenameRole: QByteArray(b"filename"),
+            self.PathRole: QByteArray(b"path"),
+            self.CreatedAtRole: QByteArray(b"createdAt"),
+            self.DominantColorRole: QByteArray(b"dominantColor"),
+        }
+
+    def rowCount(self, parent: QModelIndex | QPersistentModelIndex = QModelIndex()) -> int:  # noqa: B008
+        """Number of photos fetched so far."""
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index: QModelIndex | QPersistentModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        """Get a role of a fetched photo, building its URL on demand."""
+        if not index.isValid() or not 0 <= index.row() < len(self._rows):
+            return None
+        row = self._rows[index.row()]
+        if role in (self.PathRole, Qt.ItemDataRole.DisplayRole):
+            key = full_image_key(row.filename)
+            path = self._storage.local_path(key)
+            return QUrl.fromLocalFile(str(path.absolute())).toString() if path is not None else self._storage.url(key)
+        if role == self.IdRole:
+            return row.id
+        if role == self.FilenameRole:
+            return row.filename
+        if role == self.CreatedAtRole:
+            return row.created_at.isoformat()
+        if role == self.DominantColorRole:
+            return row.dominant_color
+        return None
+
+    def canFetchMore(self, parent: QModelIndex | QPersistentModelIndex) -> bool:
+        """Whether older photos remain to be fetched."""
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent: QModelIndex | QPersistentModelIndex) -> None:
+        """Fetch the next page of photos in the background."""
+        if not parent.isValid() and not self._fetching and not self._exhausted:
+            self._fetching = True
+            self._spawn(self.fetch_page())
+
+    async def fetch_page(self) -> None:
+        """Append the next page of photos after the last fetched one."""
+        self._fetching = True
+        try:
+            query = Photo.filter(status=PhotoStatus.READY)
+            if self._rows:
+                last = self._rows[-1]
+                query = query.filter(Q(created_at__lt=last.created_at) | Q(created_at=last.created_at, id__lt=last.id))
+            page = await self._fetch_rows(query.limit(self.page_size))
+            self._exhausted = len(page) < self.page_size
+            if page:
+                first = len(self._rows)
+                self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+                self._rows.extend(page)
+                self.endInsertRows()
+            await self._update_total_count()
+        finally:
+            self._fetching = False
 
     async def load_photos(self) -> None:
-        """Load photos from the database."""
-        # Fetch all photos ordered by newest first
-        photo_records = await Photo.all().order_by("-created_at")
-
-        # Convert to list of dicts with absolute file paths for QML
-        self._photos = []
-        for photo in photo_records:
-            # Convert database URL path to absolute filesystem path
-            # Database stores: "/public/picts/filename.webp"
-            # We need: "file:///absolute/path/to/public/picts/filename.webp"
-            relative_path = photo.original_url.lstrip("/")
-            absolute_path = (Path.cwd() / relative_path).resolve()
-
-            self._photos.append({
-                "id": photo.id,
-                "filename": photo.filename,
-                "path": f"file://{absolute_path}",
-                "createdAt": photo.created_at.isoformat() if photo.created_at else "",
-            })
-
-        self.photosChanged.emit()
+        """Reload the fetched window, inserting and removing only the rows that changed."""
+        if not self._rows:
+            await self.fetch_page()
+            return
+
+        # Everything down to the oldest fetched photo, so paging continues from the same point
+        oldest = self._rows[-1]
+        rows = await self._fetch_rows(
+            Photo.filter(
+                Q(created_at__gt=oldest.created_at) | Q(created_at=oldest.created_at, id__gte=oldest.id),
+                status=PhotoStatus.READY,
+            )
+        )
+        self._apply_diff(rows)
+        await self._update_total_count()
+
+    async def apply_changes(self, changes: list[PhotoChange]) -> None:
+        """Insert and remove the rows of the photos that changed, leaving the others alone."""
+        changed = {change.photo_id for change in changes}
+        ready = await self._fetch_rows(Photo.filter(id__in=changed, status=PhotoStatus.READY))
+        ready_ids = {row.id for row in ready}
+
+        for index in reversed(range(len(self._rows))):
+            if self._rows[index].id in changed and self._rows[index].id not in ready_ids:
+                self.beginRemoveRows(QModelIndex(), index, index)
+                del self._rows[index]
+                self.endRemoveRows()
+
+        fetched = {row.id for row in self._rows}
+        for row in ready:
+            if row.id in fetched:
+                continue
+            # Rows are newest first, so the ones newer than the new row are a prefix
+            newer_than = (row.created_at, row.id)
+            position = bisect_left(self._rows, True, key=lambda other: (other.created_at, other.id) < newer_than)
+            if position == len(self._rows) and not self._exhausted:
+                continue  # Older than the fetched window, paging gets to it
+            self.beginInsertRows(QModelIndex(), position, position)
+            self._rows.insert(position, row)
+            self.endInsertRows()
+        await self._update_total_count()
+
+    async def follow(self, after: int | None = None) -> None:
+        """
+        Apply photo changes as they happen, until cancelled.
+
+        Args:
+            after: Sequence number of the change the fetched rows already include, default the latest one
+        """
+        while True:
+            try:
+                async for changes in self._feed.subscribe(after):
+                    after = changes[-1].sequence
+                    await self.apply_changes(changes)
+            except ChangesExpiredError as e:
+                after = e.latest
+                await self.load_photos()
+
+    def start_following(self, after: int | None = None) -> None:
+        """Follow the photo change feed in the background."""
+        if self._follower is None:
+            self._follower = asyncio.create_task(self.follow(after))
+
+    async def stop_following(self) -> None:
+        """Stop following the photo change feed."""
+        if self._follower is not None:
+            self._follower.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._follower
+            self._follower = None
+        await self._feed.stop()
+
+    def _apply_diff(self, rows: list[PhotoRow]) -> None:
+        """Turn the fetched rows into `rows`, which are sorted the same way, with minimal row signals."""
+        keep = {row.id for row in rows}
+        # Remove runs of rows that are gone, from the end so indexes stay valid
+        end = len(self._rows)
+        while end > 0:
+            if self._rows[end - 1].id in keep:
+                end -= 1
+                continue
+            start = end - 1
+            while start > 0 and self._rows[start - 1].id not in keep:
+                start -= 1
+            self.beginRemoveRows(QModelIndex(), start, end - 1)
+            del self._rows[start:end]
+            self.endRemoveRows()
+            end = start
+
+        # What is left is a subsequence of `rows`, so insert the runs that are missing
+        position = 0
+        while position < len(rows):
+            if position < len(self._rows) and self._rows[position].id == rows[position].id:
+                position += 1
+                continue
+            existing = {row.id for row in self._rows[position:]}
+            run_end = position
+            while run_end < len(rows) and rows[run_end].id not in existing:
+                run_end += 1
+            self.beginInsertRows(QModelIndex(), position, run_end - 1)
+            self._rows[position:position] = rows[position:run_end]
+            self.endInsertRows()
+            position = run_end
+
+    async def _fetch_rows(self, query: QuerySet[Photo]) -> list[PhotoRow]:
+        """Fetch the in-memory columns of photos, newest first."""
+        values = await query.order_by("-created_at", "-id").values_list(
+            "id", "filename", "created_at", "dominant_color"
+        )
+        return [PhotoRow(*row) for row in values]
+
+    async def _update_total_count(self) -> None:
+        """Recount processed photos and notify QML if the count changed."""
+        total = await Photo.filter(status=PhotoStatus.READY).count()
+        if total != self._total_count:
+            self._total_count = total
+            self.totalCountChanged.emit()
+
+    def _spawn(self, coroutine: Coroutine[Any, Any, None]) -> None:
+        """Run a coroutine on the event loop, keeping a reference until it finishes."""
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
 
     @Slot()
     def refresh(self) -> None:
         """Refresh photos from database (callable from QML)."""
-        task = asyncio.create_task(self.load_photos())
-        self._tasks.add(task)
-        task.add_done_callback(self._tasks.discard)
+        self._spawn(self.load_photos())
 
 
 def run_gui() -> None:
@@ -80,20 +299,29 @@ def run_gui() -> None:
 
     QQuickStyle.setStyle("Material")
 
-    # Initialize database
+    # Initialize storage and database
+    migrate_storage_layout()
     loop.run_until_complete(init_db())
 
     # Create and setup the photo gallery model
+    settings = get_settings()
     gallery_model = PhotoGalleryModel()
+    decoder = ImageDecoder(get_storage(), settings.gui_image_cache_bytes, loop=loop)
+    preloader = ImagePreloader(decoder, gallery_model, settings.gui_preload_count)
 
-    # Load photos before starting the UI
-    loop.run_until_complete(gallery_model.load_photos())
+    # Load the first page of photos before starting the UI, noting where the change feed was first
+    # so changes made meanwhile are applied too
+    feed_position = loop.run_until_complete(latest_sequence())
+    loop.run_until_complete(gallery_model.fetch_page())
 
     engine = QQmlApplicationEngine()
     engine.quit.connect(app.quit)
+    # The engine takes ownership of the provider
+    engine.addImageProvider(PROVIDER_ID, PhotoImageProvider(decoder))
 
     # Make the model available to QML
     engine.rootContext().setContextProperty("galleryModel", gallery_model)
+    engine.rootContext().setContextProperty("imagePreloader", preloader)
 
     qml_file = Path(__file__).parent / "ui" / "main.qml"
     engine.load(qml_file)
@@ -101,10 +329,14 @@ def run_gui() -> None:
     if not engine.rootObjects():
         loop.run_until_complete(close_db())
         sys.exit(-1)
+    engine.rootObjects()[0].frameSwapped.connect(preloader.frameSwapped)
+    gallery_model.start_following(feed_position)
 
     try:
         exit_code = loop.run_forever()
     finally:
+        loop.run_until_complete(gallery_model.stop_following())
+        loop.run_until_complete(get_storage().aclose())
         loop.run_until_complete(close_db())
         loop.close()
 
@@ -19,7 +19,7 @@ Item {
         // Header bar
         GalleryHeader {
             id: galleryHeader
-            photoCount: gridView.count
+            photoCount: galleryModel.totalCount
 
             onBackClicked: root.backToSlideshow()
             onRefreshClicked: galleryModel.refresh()
@@ -38,13 +38,14 @@ Item {
             cellHeight: 350
             clip: true
 
-            model: galleryModel.photos
+            model: galleryModel
 
             delegate: PhotoGridItem {
                 width: gridView.cellWidth
                 height: gridView.cellHeight
-                photoPath: modelData.path
-                photoFilename: modelData.filename
+                photoPath: model.path
+                photoFilename: model.filename
+                placeholderColor: model.dominantColor || "#2a2a2a"
                 isSelected: index === root.selectedIndex
 
                 onClicked: root.photoSelected(index)
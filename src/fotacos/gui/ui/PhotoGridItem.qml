@@ -7,6 +7,8 @@ Item {
 
     property string photoPath: ""
     property string photoFilename: ""
+    // Shown while the photo loads, e.g. its dominant colour
+    property color placeholderColor: "#2a2a2a"
     property bool isSelected: false
 
     signal clicked()
@@ -24,6 +26,8 @@ Item {
             anchors.fill: parent
             anchors.margins: 5
             source: root.photoPath
+            sourceSize.width: root.width
+            sourceSize.height: root.height
             fillMode: Image.PreserveAspectFit
             asynchronous: true
             smooth: true
@@ -31,7 +35,7 @@ Item {
             // Loading indicator
             Rectangle {
                 anchors.fill: parent
-                color: "#2a2a2a"
+                color: root.placeholderColor
                 visible: photoImage.status === Image.Loading
 
                 BusyIndicator {
@@ -17,6 +17,8 @@ Item {
             id: fullscreenImage
             anchors.fill: parent
             source: root.photoPath
+            sourceSize.width: Math.floor(root.width)
+            sourceSize.height: Math.floor(root.height)
             fillMode: Image.PreserveAspectFit
             asynchronous: true
             smooth: true
@@ -9,7 +9,7 @@ Item {
     signal switchToGallery()
 
     property alias currentIndex: swipeView.currentIndex
-    property int photoCount: swipeView.count
+    property int photoCount: galleryModel.totalCount
 
     // Auto-advance timer (30 seconds)
     Timer {
@@ -27,19 +27,32 @@ Item {
         }
     }
 
-    // Current photo display with swipe support
-    SwipeView {
+    // Current photo display with swipe support; only slides near the current
+    // one are created, and more photos are fetched from the model as it advances
+    ListView {
         id: swipeView
         anchors.fill: parent
+        orientation: ListView.Horizontal
+        snapMode: ListView.SnapOneItem
+        highlightRangeMode: ListView.StrictlyEnforceRange
+        highlightMoveDuration: 250
+        boundsBehavior: Flickable.StopAtBounds
+        cacheBuffer: 0
+        clip: true
         interactive: true
 
-        Repeater {
-            model: galleryModel.photos
+        onCurrentIndexChanged: imagePreloader.preload(currentIndex, Math.floor(width), Math.floor(height))
 
-            PhotoSlide {
-                photoPath: modelData.path
-                onDoubleClicked: root.switchToGallery()
-            }
+        Component.onCompleted: Qt.callLater(() => imagePreloader.preload(currentIndex, Math.floor(width), Math.floor(height)))
+
+        model: galleryModel
+
+        delegate: PhotoSlide {
+            width: swipeView.width
+            height: swipeView.height
+            // Decoded off the UI thread at screen size, usually already preloaded
+            photoPath: "image://photos/" + model.filename
+            onDoubleClicked: root.switchToGallery()
         }
     }
 
@@ -84,7 +97,7 @@ Item {
         anchors.bottomMargin: 30
         visible: swipeView.count > 0
         currentPhoto: swipeView.currentIndex + 1
-        totalPhotos: swipeView.count
+        totalPhotos: galleryModel.totalCount
     }
 
     // Hint text for double tap
@@ -19,59 +19,75 @@ ApplicationWindow {
         anchors.fill: parent
         visible: !showGallery
 
-        // Current photo display
-        SwipeView {
+        // Current photo display; a ListView only creates the slides near the
+        // current one and fetches more photos from the model as it advances
+        ListView {
             id: swipeView
             anchors.fill: parent
+            orientation: ListView.Horizontal
+            snapMode: ListView.SnapOneItem
+            highlightRangeMode: ListView.StrictlyEnforceRange
+            highlightMoveDuration: 250
+            boundsBehavior: Flickable.StopAtBounds
+            cacheBuffer: 0
+            clip: true
             currentIndex: mainWindow.currentIndex
             interactive: true
 
             onCurrentIndexChanged: {
                 mainWindow.currentIndex = currentIndex
+                imagePreloader.preload(currentIndex, Math.floor(width), Math.floor(height))
             }
 
-            Repeater {
-                model: galleryModel.photos
+            Component.onCompleted: Qt.callLater(() => imagePreloader.preload(currentIndex, Math.floor(width), Math.floor(height)))
 
-                Item {
-                    Rectangle {
-                        anchors.fill: parent
-                        color: "#000000"
+            model: galleryModel
 
-                        Image {
-                            id: fullscreenImage
-                            anchors.fill: parent
-                            source: modelData.path
-                            fillMode: Image.PreserveAspectFit
-                            asynchronous: true
-                            smooth: true
+            delegate: Item {
+                width: swipeView.width
+                height: swipeView.height
 
-                            Rectangle {
-                                anchors.fill: parent
-                                color: "#000000"
-                                visible: fullscreenImage.status === Image.Loading
+                Rectangle {
+                    anchors.fill: parent
+                    color: "#000000"
 
-                                BusyIndicator {
-                                    anchors.centerIn: parent
-                                    running: parent.visible
-                                }
-                            }
+                    Image {
+                        id: fullscreenImage
+                        anchors.fill: parent
+                        // Decoded off the UI thread at screen size, usually already preloaded
+                        source: "image://photos/" + model.filename
+                        sourceSize.width: Math.floor(swipeView.width)
+                        sourceSize.height: Math.floor(swipeView.height)
+                        fillMode: Image.PreserveAspectFit
+                        asynchronous: true
+                        smooth: true
+
+                        // The dominant colour of the photo stands in until it is decoded
+                        Rectangle {
+                            anchors.fill: parent
+                            color: model.dominantColor || "#000000"
+                            visible: fullscreenImage.status === Image.Loading
 
-                            Text {
+                            BusyIndicator {
                                 anchors.centerIn: parent
-                                text: "Failed to load photo"
-                                color: "#ff5555"
-                                font.pixelSize: 24
-                                visible: fullscreenImage.status === Image.Error
+                                running: parent.visible
                             }
                         }
 
-                        // Double tap detector to switch to gallery
-                        MouseArea {
-                            anchors.fill: parent
-                            onDoubleClicked: {
-                                showGallery = true
-                            }
+                        Text {
+                            anchors.centerIn: parent
+                            text: "Failed to load photo"
+                            color: "#ff5555"
+                            font.pixelSize: 24
+                            visible: fullscreenImage.status === Image.Error
+                        }
+                    }
+
+                    // Double tap detector to switch to gallery
+                    MouseArea {
+                        anchors.fill: parent
+                        onDoubleClicked: {
+                            showGallery = true
                         }
                     }
                 }
@@ -157,7 +173,7 @@ ApplicationWindow {
             Text {
                 id: infoText
                 anchors.centerIn: parent
-                text: (swipeView.currentIndex + 1) + " / " + swipeView.count
+                text: (swipeView.currentIndex + 1) + " / " + galleryModel.totalCount
                 color: "#ffffff"
                 font.pixelSize: 20
                 font.bold: true
@@ -175,6 +191,36 @@ ApplicationWindow {
             opacity: 0.6
         }
 
+        // Frame and decode timings, toggled with S
+        Rectangle {
+            id: statsOverlay
+            anchors.top: parent.top
+            anchors.left: parent.left
+            anchors.margins: 10
+            width: statsText.width + 20
+            height: statsText.height + 12
+            color: "#000000"
+            opacity: 0.8
+            radius: 6
+            visible: false
+
+            Text {
+                id: statsText
+                anchors.centerIn: parent
+                text: imagePreloader.summary
+                color: "#4CAF50"
+                font.family: "monospace"
+                font.pixelSize: 14
+            }
+
+            Timer {
+                interval: 500
+                running: statsOverlay.visible
+                repeat: true
+                onTriggered: imagePreloader.updateStats()
+            }
+        }
+
         // Empty state
         Column {
             anchors.centerIn: parent
@@ -230,7 +276,7 @@ ApplicationWindow {
                     }
 
                     Label {
-                        text: "Fotacos Gallery - " + gridView.count + " photos"
+                        text: "Fotacos Gallery - " + galleryModel.totalCount + " photos"
                         color: "#ffffff"
                         font.pixelSize: 20
                         Layout.fillWidth: true
@@ -262,7 +308,7 @@ ApplicationWindow {
                 cellHeight: 350
                 clip: true
 
-                model: galleryModel.photos
+                model: galleryModel
 
                 delegate: Item {
                     width: gridView.cellWidth
@@ -280,14 +326,16 @@ ApplicationWindow {
                             id: photoImage
                             anchors.fill: parent
                             anchors.margins: 5
-                            source: modelData.path
+                            source: model.path
+                            sourceSize.width: gridView.cellWidth
+                            sourceSize.height: gridView.cellHeight
                             fillMode: Image.PreserveAspectFit
                             asynchronous: true
                             smooth: true
 
                             Rectangle {
                                 anchors.fill: parent
-                                color: "#2a2a2a"
+                                color: model.dominantColor || "#2a2a2a"
                                 visible: photoImage.status === Image.Loading
 
                                 BusyIndicator {
@@ -316,7 +364,7 @@ ApplicationWindow {
 
                             Text {
                                 anchors.centerIn: parent
-                                text: modelData.filename
+                                text: model.filename
                                 color: "#ffffff"
                                 font.pixelSize: 12
                                 elide: Text.ElideMiddle
@@ -400,6 +448,14 @@ ApplicationWindow {
         onActivated: Qt.quit()
     }
 
+    Shortcut {
+        sequence: "S"
+        onActivated: {
+            statsOverlay.visible = !statsOverlay.visible
+            imagePreloader.resetFrameStats()
+        }
+    }
+
     Shortcut {
         sequence: "F5"
         onActivated: galleryModel.refresh()
@@ -10,6 +10,10 @@ from fotacos.env import get_settings
 
 settings = get_settings()
 
+FILE_FORMAT = (
+    "{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {extra[request_id]} | {name}:{function}:{line} - {message}"
+)
+
 
 class InterceptHandler(logging.Handler):
     """Intercept standard logging and redirect to Loguru."""
@@ -35,27 +39,31 @@ def setup_logging() -> None:
     """Configure logging for the application."""
     # Remove default handler
     logger.remove()
+    # Records logged outside a request carry a placeholder request ID
+    logger.configure(extra={"request_id": "-"})
 
     # Configure Loguru
     log_dir = Path("logs")
     log_dir.mkdir(exist_ok=True)
 
     # Add file handler with rotation and compression
+    # Variable values in tracebacks help debugging but are slow to render and may expose secrets
     logger.add(
         log_dir / "application.log",
         rotation="500 MB",
         compression="zip",
         level="INFO",
         backtrace=True,
-        diagnose=True,
-        format="{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {name}:{function}:{line} - {message}",
+        diagnose=settings.debug,
+        format=FILE_FORMAT,
+        serialize=settings.log_json,  # One JSON object per record, with the request ID among its extra fields
         enqueue=True,  # Async logging for better performance
     )
 
     # Add console handler for development
     logger.add(
         sys.stderr,
-        format="<green>{time:HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
+        format="<green>{time:HH:mm:ss}</green> | <level>{level: <8}</level> | {extra[request_id]} | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
         level="DEBUG" if settings.debug else "INFO",
         colorize=True,
     )
@@ -68,8 +76,10 @@ def setup_logging() -> None:
         compression="zip",
         level="ERROR",
         backtrace=True,
-        diagnose=True,
-        format="{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {name}:{function}:{line} - {message}",
+        diagnose=settings.debug,
+        format=FILE_FORMAT,
+        serialize=settings.log_json,
+        enqueue=True,  # Forked web workers hand their records to the parent, the only process rotating the file
     )
 
     # Intercept standard logging
@@ -1,8 +1,14 @@
-"""Main entry point for fotacos application."""
+"""
+Main entry point for fotacos application.
 
-import click
+Commands import what they need when they run, so ``--help`` and the GUI do
+not pay for loading FastAPI, Tortoise and Pillow, nor set up the server logs.
+"""
+
+import asyncio
+from pathlib import Path
 
-from fotacos.api import run_web
+import click
 
 
 @click.group()
@@ -20,13 +26,100 @@ def gui():
     run_gui()
 
 
-@click.command()
+@cli.command()
 @click.option("--host", default="127.0.0.1", help="Host to bind to")
 @click.option("--port", default=8000, type=int, help="Port to bind to")
 @click.option("--reload", is_flag=True, help="Enable auto-reload for development")
-def web(host: str, port: int, reload: bool):
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Server processes sharing the port, default WEB_WORKERS; each runs IMAGE_WORKERS image processes",
+)
+def web(host: str, port: int, reload: bool, workers: int | None):
     """Run the web server."""
-    run_web(host=host, port=port, reload=reload)
+    from fotacos.api import run_web
+    from fotacos.env import get_settings
+
+    run_web(host=host, port=port, reload=reload, workers=workers or get_settings().web_workers)
+
+
+@cli.command("import")
+@click.argument("paths", nargs=-1, type=click.Path(exists=True, path_type=Path))
+@click.option("--batch-size", type=int, default=None, help="Photos inserted per transaction")
+@click.option("--remove-sources", is_flag=True, help="Delete source files once they are in the library")
+def import_photos(paths: tuple[Path, ...], batch_size: int | None, remove_sources: bool):
+    """Import image files from PATHS (default: the configured import directories)."""
+    from fotacos.services.importer import import_roots
+
+    asyncio.run(_run_importer(import_roots(paths), batch_size, remove_sources, watch=False))
+
+
+@cli.command()
+@click.argument("paths", nargs=-1, type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.option("--batch-size", type=int, default=None, help="Photos inserted per transaction")
+@click.option("--remove-sources", is_flag=True, help="Delete source files once they are in the library")
+def watch(paths: tuple[Path, ...], batch_size: int | None, remove_sources: bool):
+    """Import image files from PATHS now and whenever new ones appear."""
+    from fotacos.services.importer import import_roots
+
+    asyncio.run(_run_importer(import_roots(paths), batch_size, remove_sources, watch=True))
+
+
+async def _run_importer(paths: list[Path], batch_size: int | None, remove_sources: bool, watch: bool) -> None:
+    """Run an import pass, or keep watching, with the database and image worker set up."""
+    from fotacos.database import close_db, init_db
+    from fotacos.env import get_settings
+    from fotacos.services import get_image_worker, migrate_storage_layout
+    from fotacos.services.importer import PhotoImporter, get_import_state, watch_directories
+
+    settings = get_settings()
+    settings.ensure_directories()
+    migrate_storage_layout()
+    await init_db()
+    importer = PhotoImporter(
+        get_import_state(),
+        batch_size=batch_size or settings.import_batch_size,
+        concurrency=settings.image_workers * 2,
+        remove_sources=remove_sources,
+        on_progress=lambda stats: click.echo(stats.describe()),
+    )
+    try:
+        if watch:
+            click.echo(f"Watching {', '.join(str(path) for path in paths)} (Ctrl+C to stop)")
+            async for _ in watch_directories(importer, paths, settings.import_poll_interval):
+                pass
+        else:
+            stats = await importer.run(paths)
+            click.echo(f"Done in {stats.elapsed:.1f}s: {stats.describe()}")
+    finally:
+        get_image_worker().shutdown()
+        await close_db()
+
+
+@cli.command()
+@click.option("--dry-run", is_flag=True, help="Only report what would be reclaimed")
+@click.option("--grace-period", type=float, default=None, help="Seconds a file must be unmodified to be reclaimed")
+def fsck(dry_run: bool, grace_period: float | None):
+    """Reclaim stored files no photo uses and report photos missing their files."""
+    asyncio.run(_run_fsck(dry_run, grace_period))
+
+
+async def _run_fsck(dry_run: bool, grace_period: float | None) -> None:
+    """Run a storage check with the database set up."""
+    from fotacos.database import close_db, init_db
+    from fotacos.services import check_storage, migrate_storage_layout
+
+    # Files of an earlier layout would otherwise count as unused
+    migrate_storage_layout()
+    await init_db()
+    try:
+        report = await check_storage(dry_run=dry_run, grace_period=grace_period)
+    finally:
+        await close_db()
+    click.echo(report.describe())
+    if report.missing:
+        click.echo(f"Photos missing their image file: {', '.join(map(str, report.missing))}")
 
 
 def main():
@@ -0,0 +1,344 @@
+"""Prometheus metrics of the API, image processing, database and storage."""
+
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Self, TypeVar
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+IMAGE_STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+LabelValues = tuple[str, ...]
+# Values of a metric in a form that survives a round trip through JSON
+MetricSnapshot = list[list[Any]]
+M = TypeVar("M", bound="Metric")
+
+
+class UnknownLabelsError(ValueError):
+    """Raised when a metric is updated with labels other than the ones it was declared with."""
+
+    def __init__(self, name: str, expected: tuple[str, ...], given: Iterable[str]) -> None:
+        """Initialize the error with the declared and the given label names."""
+        super().__init__(f"Metric {name} takes labels {sorted(expected)}, got {sorted(given)}")
+
+
+class Metric(ABC):
+    """A named metric with values per combination of label values."""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        """
+        Initialize the metric.
+
+        Args:
+            name: Metric name, including its unit
+            documentation: Help text shown next to the metric
+            labelnames: Names of the labels every update must give
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> LabelValues:
+        """Label values in declaration order."""
+        if labels.keys() != set(self.labelnames):
+            raise UnknownLabelsError(self.name, self.labelnames, labels)
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, values: LabelValues, extra: tuple[tuple[str, str], ...] = ()) -> str:
+        """Render label pairs as ``{name="value",...}``, empty without labels."""
+        pairs = [*zip(self.labelnames, values, strict=True), *extra]
+        if not pairs:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped, strict=True)) + "}"
+
+    @abstractmethod
+    def samples(self) -> Iterator[str]:
+        """Sample lines of the text exposition format."""
+
+    @abstractmethod
+    def empty(self) -> Self:
+        """A metric of the same name and labels with no values."""
+
+    @abstractmethod
+    def snapshot(self) -> MetricSnapshot:
+        """Values of every label combination, to add to the metric of another process."""
+
+    @abstractmethod
+    def absorb(self, snapshot: MetricSnapshot) -> None:
+        """Add the values of a snapshot to this metric."""
+
+    def render(self) -> str:
+        """Render the metric with its help and type lines."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """A value that only goes up, such as a number of requests."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        """Initialize the counter; counters without labels start at zero."""
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {} if labelnames else {(): 0.0}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Increase the counter of a label combination."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterator[str]:
+        """One sample per label combination."""
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{self._format_labels(key)} {value}"
+
+    def empty(self) -> Self:
+        """A counter of the same name and labels with no values."""
+        return type(self)(self.name, self.documentation, self.labelnames)
+
+    def snapshot(self) -> MetricSnapshot:
+        """Label values and value of every label combination."""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def absorb(self, snapshot: MetricSnapshot) -> None:
+        """Add the values of a snapshot to the counter."""
+        with self._lock:
+            for key, value in snapshot:
+                self._values[tuple(key)] = self._values.get(tuple(key), 0.0) + value
+
+
+class Gauge(Counter):
+    """A value that goes up and down, such as the number of requests in flight."""
+
+    type_name = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        """Decrease the gauge of a label combination."""
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        """Set the gauge of a label combination."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative buckets, such as request durations."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        """Initialize the histogram with the upper bounds of its buckets, in increasing order."""
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        # Per label combination: a count per bucket plus one for +Inf, and the sum of observations
+        self._counts: dict[LabelValues, list[int]] = {}
+        self._sums: dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record an observation for a label combination."""
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the seconds spent in a block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterator[str]:
+        """Cumulative bucket counts, sum and count per label combination."""
+        with self._lock:
+            series = sorted((key, list(counts), self._sums[key]) for key, counts in self._counts.items())
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts, strict=True):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else str(bound)
+                yield f"{self.name}_bucket{self._format_labels(key, (('le', le),))} {cumulative}"
+            yield f"{self.name}_sum{self._format_labels(key)} {total}"
+            yield f"{self.name}_count{self._format_labels(key)} {cumulative}"
+
+    def empty(self) -> Self:
+        """A histogram of the same name, labels and buckets with no observations."""
+        return type(self)(self.name, self.documentation, self.labelnames, self.buckets)
+
+    def snapshot(self) -> MetricSnapshot:
+        """Label values, bucket counts and sum of every label combination."""
+        with self._lock:
+            return [[list(key), list(counts), self._sums[key]] for key, counts in self._counts.items()]
+
+    def absorb(self, snapshot: MetricSnapshot) -> None:
+        """Add the observations of a snapshot to the histogram."""
+        with self._lock:
+            for key, counts, total in snapshot:
+                merged = self._counts.setdefault(tuple(key), [0] * (len(self.buckets) + 1))
+                for index, count in enumerate(counts):
+                    merged[index] += count
+                self._sums[tuple(key)] = self._sums.get(tuple(key), 0.0) + total
+
+
+class MetricsRegistry:
+    """Set of metrics rendered together on the metrics endpoint."""
+
+    def __init__(self) -> None:
+        """Initialize an empty registry."""
+        self._metrics: list[Metric] = []
+
+    def register(self, metric: M) -> M:
+        """Add a metric to the registry and return it."""
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+    def snapshot(self) -> dict[str, MetricSnapshot]:
+        """Values of every metric, keyed by metric name."""
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def render_merged(self, snapshots: Iterable[tuple[dict[str, MetricSnapshot], bool]]) -> str:
+        """
+        Render the sum of the snapshots of several processes.
+
+        Args:
+            snapshots: Snapshot of each process and whether the process is
+                still running; gauges of processes that exited are left out,
+                while their counters and histograms still count towards the totals
+        """
+        merged = [metric.empty() for metric in self._metrics]
+        for snapshot, alive in snapshots:
+            for metric in merged:
+                if metric.name in snapshot and (alive or not isinstance(metric, Gauge)):
+                    metric.absorb(snapshot[metric.name])
+        return "\n".join(metric.render() for metric in merged) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.register(
+    Counter("fotacos_http_requests_total", "HTTP requests handled", ("method", "route", "status"))
+)
+HTTP_REQUEST_DURATION = REGISTRY.register(
+    Histogram("fotacos_http_request_duration_seconds", "Time to handle an HTTP request", ("method", "route"))
+)
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge("fotacos_http_requests_in_flight", "HTTP requests being handled"))
+IMAGE_STAGE_DURATION = REGISTRY.register(
+    Histogram(
+        "fotacos_image_stage_duration_seconds",
+        "Time spent in a stage of image processing",
+        ("stage",),
+        IMAGE_STAGE_BUCKETS,
+    )
+)
+DB_QUERY_DURATION = REGISTRY.register(
+    Histogram("fotacos_db_query_duration_seconds", "Time to run a database query", ("operation",), DB_QUERY_BUCKETS)
+)
+STORAGE_BYTES_WRITTEN = REGISTRY.register(
+    Counter("fotacos_storage_bytes_written_total", "Bytes of photo files stored", ("backend",))
+)
+
+# Set while a job runs in an image worker process, whose own metrics nobody scrapes
+_stage_buffer: list[tuple[str, float]] | None = None
+
+
+@contextmanager
+def timed_stage(stage: str) -> Iterator[None]:
+    """Time a stage of image processing, such as ``decode`` or ``encode_webp``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        if _stage_buffer is not None:
+            _stage_buffer.append((stage, seconds))
+        else:
+            IMAGE_STAGE_DURATION.observe(seconds, stage=stage)
+
+
+@contextmanager
+def buffered_stage_timings() -> Iterator[list[tuple[str, float]]]:
+    """Collect the stage timings of a block in a list, to send them back from a worker process."""
+    global _stage_buffer
+    previous, _stage_buffer = _stage_buffer, []
+    try:
+        yield _stage_buffer
+    finally:
+        _stage_buffer = previous
+
+
+def record_stage_timings(timings: Iterable[tuple[str, float]]) -> None:
+    """Observe stage timings collected in a worker process."""
+    for stage, seconds in timings:
+        IMAGE_STAGE_DURATION.observe(seconds, stage=stage)
+
+
+def write_snapshot(directory: Path) -> None:
+    """Write the metrics of this process where the other web workers read them, replacing its previous snapshot."""
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{os.getpid()}.json"
+    temporary = path.with_suffix(".tmp")
+    temporary.write_text(json.dumps(REGISTRY.snapshot()))
+    os.replace(temporary, path)
+
+
+def _is_running(pid: int) -> bool:
+    """Whether a process is still running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def render_shared(directory: Path) -> str:
+    """
+    Render the metrics of every web worker sharing a snapshot directory.
+
+    The snapshot of this process is written first, so its own metrics are
+    current; the other workers' are as recent as their last snapshot.
+    """
+    write_snapshot(directory)
+    snapshots = []
+    for path in directory.glob("*.json"):
+        try:
+            snapshot = json.loads(path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            continue
+        snapshots.append((snapshot, _is_running(int(path.stem))))
+    return REGISTRY.render_merged(snapshots)
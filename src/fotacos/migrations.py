@@ -0,0 +1,227 @@
+"""Versioned schema migrations tracked with SQLite's ``user_version``."""
+
+from collections.abc import Awaitable, Callable
+
+from loguru import logger
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.transactions import in_transaction
+
+Migration = tuple[int, str, Callable[[BaseDBAsyncClient], Awaitable[None]]]
+
+INITIAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS "photo" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "filename" VARCHAR(255) NOT NULL UNIQUE,
+    "original_url" VARCHAR(512) NOT NULL,
+    "thumbnail_url" VARCHAR(512) NOT NULL,
+    "file_size" INT NOT NULL DEFAULT 0,
+    "content_hash" VARCHAR(64) UNIQUE,
+    "status" VARCHAR(16) NOT NULL DEFAULT 'ready',
+    "derivatives_version" VARCHAR(64),
+    "created_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS "idx_photo_filenam_54963c" ON "photo" ("filename");
+CREATE INDEX IF NOT EXISTS "idx_photo_created_d09260" ON "photo" ("created_at", "id");
+CREATE TABLE IF NOT EXISTS "job" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "kind" VARCHAR(32) NOT NULL,
+    "status" VARCHAR(16) NOT NULL DEFAULT 'pending',
+    "attempts" INT NOT NULL DEFAULT 0,
+    "last_error" TEXT,
+    "run_after" TIMESTAMP NOT NULL,
+    "created_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updated_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "photo_id" INT NOT NULL REFERENCES "photo" ("id") ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS "idx_job_status_e98b55" ON "job" ("status", "run_after");
+"""
+
+
+class SchemaTooNewError(Exception):
+    """Raised when the database was migrated by a newer version of the application."""
+
+    def __init__(self, version: int, latest: int) -> None:
+        """Initialize the error with the database and application schema versions."""
+        super().__init__(f"Database schema version {version} is newer than the latest known version {latest}")
+
+
+async def _columns(connection: BaseDBAsyncClient, table: str) -> set[str]:
+    """Names of the columns of a table, empty if it does not exist."""
+    _, rows = await connection.execute_query(f'PRAGMA table_info("{table}")')
+    return {row["name"] for row in rows}
+
+
+async def _execute_statements(connection: BaseDBAsyncClient, script: str) -> None:
+    """
+    Run a script statement by statement.
+
+    ``execute_script`` would commit the migration's transaction before running.
+    """
+    for statement in script.split(";"):
+        if statement.strip():
+            await connection.execute_query(statement)
+
+
+async def _initial_schema(connection: BaseDBAsyncClient) -> None:
+    """
+    Create the photo and job tables.
+
+    Databases created by ``generate_schemas()`` before migrations existed may
+    already have an older photo table, which gets the columns added since.
+    Its photos are marked as built with the current thumbnail settings, which
+    they were, so the upgrade does not regenerate every derivative.
+    """
+    # Imported late, so loading the database module does not load every service
+    from fotacos.services.jobs import derivatives_signature
+
+    columns = await _columns(connection, "photo")
+    if columns:
+        added = {
+            "content_hash": "VARCHAR(64)",
+            "status": "VARCHAR(16) NOT NULL DEFAULT 'ready'",
+            "derivatives_version": "VARCHAR(64)",
+        }
+        for name, definition in added.items():
+            if name not in columns:
+                await connection.execute_query(f'ALTER TABLE "photo" ADD COLUMN "{name}" {definition}')
+        if "derivatives_version" not in columns:
+            await connection.execute_query('UPDATE "photo" SET "derivatives_version" = ?', [derivatives_signature()])
+        # SQLite cannot add a UNIQUE column, so uniqueness comes from an index instead
+        if "content_hash" not in columns:
+            await connection.execute_query(
+                'CREATE UNIQUE INDEX IF NOT EXISTS "uid_photo_content_hash" ON "photo" ("content_hash")'
+            )
+    await _execute_statements(connection, INITIAL_SCHEMA)
+
+
+PHOTO_METADATA_SCHEMA = """
+ALTER TABLE "photo" ADD COLUMN "width" INT;
+ALTER TABLE "photo" ADD COLUMN "height" INT;
+ALTER TABLE "photo" ADD COLUMN "orientation" VARCHAR(16);
+ALTER TABLE "photo" ADD COLUMN "taken_at" TIMESTAMP NOT NULL DEFAULT '1970-01-01 00:00:00+00:00';
+ALTER TABLE "photo" ADD COLUMN "camera" VARCHAR(128);
+ALTER TABLE "photo" ADD COLUMN "latitude" REAL;
+ALTER TABLE "photo" ADD COLUMN "longitude" REAL;
+UPDATE "photo" SET "taken_at" = "created_at";
+CREATE INDEX IF NOT EXISTS "idx_photo_taken_a_96ade2" ON "photo" ("taken_at", "id");
+CREATE INDEX IF NOT EXISTS "idx_photo_camera_70154c" ON "photo" ("camera", "taken_at", "id");
+CREATE INDEX IF NOT EXISTS "idx_photo_orienta_2f1706" ON "photo" ("orientation", "taken_at", "id");
+"""
+
+
+async def _photo_metadata(connection: BaseDBAsyncClient) -> None:
+    """
+    Add the capture metadata columns of photos and the indexes the listing filters use.
+
+    SQLite only adds NOT NULL columns with a constant default, so ``taken_at``
+    is backfilled with the upload time. The originals of existing photos are
+    gone, so their capture details stay unknown.
+    """
+    await _execute_statements(connection, PHOTO_METADATA_SCHEMA)
+
+
+async def _job_options(connection: BaseDBAsyncClient) -> None:
+    """Add the encoding options uploads pass on to their derivative jobs."""
+    await connection.execute_query('ALTER TABLE "job" ADD COLUMN "options" JSON')
+
+
+PHOTO_EVENT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS "photo_event" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "kind" VARCHAR(16) NOT NULL,
+    "photo_id" INT NOT NULL,
+    "created_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+async def _photo_events(connection: BaseDBAsyncClient) -> None:
+    """
+    Create the photo change feed.
+
+    AUTOINCREMENT keeps sequence numbers from being reused once old entries
+    are pruned, so a resuming client never mistakes a new change for one it saw.
+    """
+    await _execute_statements(connection, PHOTO_EVENT_SCHEMA)
+
+
+PHOTO_PLACEHOLDERS_SCHEMA = """
+ALTER TABLE "photo" ADD COLUMN "blurhash" VARCHAR(64);
+ALTER TABLE "photo" ADD COLUMN "dominant_color" VARCHAR(7);
+"""
+
+
+async def _photo_placeholders(connection: BaseDBAsyncClient) -> None:
+    """Add the placeholders of photos; existing photos get theirs when their derivatives are regenerated."""
+    await _execute_statements(connection, PHOTO_PLACEHOLDERS_SCHEMA)
+
+
+UPLOAD_SESSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS "upload_session" (
+    "id" VARCHAR(32) NOT NULL PRIMARY KEY,
+    "filename" VARCHAR(255) NOT NULL,
+    "length" BIGINT NOT NULL,
+    "offset" BIGINT NOT NULL DEFAULT 0,
+    "options" JSON,
+    "expires_at" TIMESTAMP NOT NULL,
+    "created_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+async def _upload_sessions(connection: BaseDBAsyncClient) -> None:
+    """Create the sessions of resumable uploads."""
+    await _execute_statements(connection, UPLOAD_SESSION_SCHEMA)
+
+
+MIGRATIONS: list[Migration] = [
+    (1, "photo and job tables", _initial_schema),
+    (2, "photo capture metadata", _photo_metadata),
+    (3, "job encoding options", _job_options),
+    (4, "photo change feed", _photo_events),
+    (5, "photo placeholders", _photo_placeholders),
+    (6, "resumable upload sessions", _upload_sessions),
+]
+
+
+def latest_version() -> int:
+    """Schema version the application expects."""
+    return MIGRATIONS[-1][0]
+
+
+async def schema_version(connection: BaseDBAsyncClient) -> int:
+    """Schema version recorded in the database."""
+    _, rows = await connection.execute_query("PRAGMA user_version")
+    return rows[0][0]
+
+
+async def migrate(connection_name: str = "default") -> int:
+    """
+    Apply the migrations the database has not seen yet, each in its own transaction.
+
+    Args:
+        connection_name: Tortoise connection to migrate
+
+    Returns:
+        Schema version of the database after migrating
+
+    Raises:
+        SchemaTooNewError: If the database is ahead of this version of the application
+    """
+    async with in_transaction(connection_name) as connection:
+        current = await schema_version(connection)
+    if current > latest_version():
+        raise SchemaTooNewError(current, latest_version())
+
+    for version, description, apply in MIGRATIONS:
+        if version <= current:
+            continue
+        async with in_transaction(connection_name) as connection:
+            # Another process may have migrated since the version was read
+            if await schema_version(connection) >= version:
+                continue
+            logger.info("Applying database migration {}: {}", version, description)
+            await apply(connection)
+            await connection.execute_query(f"PRAGMA user_version = {version}")
+        current = version
+    return current
@@ -1,5 +1,18 @@
 """Database models."""
 
-from fotacos.models.photo import Photo
+from fotacos.models.event import PhotoEvent, PhotoEventKind
+from fotacos.models.job import Job, JobKind, JobStatus
+from fotacos.models.photo import Photo, PhotoOrientation, PhotoStatus
+from fotacos.models.upload import UploadSession
 
-__all__ = ["Photo"]
+__all__ = [
+    "Job",
+    "JobKind",
+    "JobStatus",
+    "Photo",
+    "PhotoEvent",
+    "PhotoEventKind",
+    "PhotoOrientation",
+    "PhotoStatus",
+    "UploadSession",
+]
@@ -0,0 +1,34 @@
+"""Photo change feed database model."""
+
+from enum import StrEnum
+
+from tortoise import fields
+from tortoise.models import Model
+
+
+class PhotoEventKind(StrEnum):
+    """What happened to a photo."""
+
+    ADDED = "added"
+    UPDATED = "updated"
+    REMOVED = "removed"
+
+
+class PhotoEvent(Model):
+    """
+    Entry of the photo change feed, recorded in the transaction of the change.
+
+    The id is the sequence number clients resume from. Photo ids are kept
+    without a foreign key, so removals outlive the photo they describe.
+    """
+
+    id = fields.IntField(primary_key=True)
+    kind = fields.CharEnumField(PhotoEventKind, max_length=16)
+    photo_id = fields.IntField()
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "photo_event"
+
+    def __str__(self):
+        return f"{self.kind} event {self.id} of photo {self.photo_id}"
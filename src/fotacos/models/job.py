@@ -0,0 +1,44 @@
+"""Background job database model."""
+
+from enum import StrEnum
+
+from tortoise import fields
+from tortoise.models import Model
+
+
+class JobKind(StrEnum):
+    """Kinds of background work."""
+
+    DERIVATIVES = "derivatives"
+
+
+class JobStatus(StrEnum):
+    """Lifecycle states of a background job."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class Job(Model):
+    """Durable background job, claimed and executed by the job runner."""
+
+    id = fields.IntField(primary_key=True)
+    kind = fields.CharEnumField(JobKind, max_length=32)
+    photo = fields.ForeignKeyField("models.Photo", related_name="jobs", on_delete=fields.CASCADE)
+    status = fields.CharEnumField(JobStatus, max_length=16, default=JobStatus.PENDING)
+    attempts = fields.IntField(default=0)
+    last_error = fields.TextField(null=True)
+    # Encoding choices of the upload that queued the job, e.g. {"profile": "fast", "formats": ["avif"]}
+    options = fields.JSONField(null=True)
+    run_after = fields.DatetimeField()
+    created_at = fields.DatetimeField(auto_now_add=True)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        # Serves the runner's "next due pending job" lookup
+        indexes = (("status", "run_after"),)
+
+    def __str__(self):
+        return f"{self.kind} job {self.id}"
@@ -1,9 +1,36 @@
 """Photo database model."""
 
-from tortoise import fields
+from enum import StrEnum
+
+from tortoise import fields, timezone
 from tortoise.models import Model
 
 
+class PhotoStatus(StrEnum):
+    """Processing state of a photo's derivatives."""
+
+    PENDING = "pending"
+    READY = "ready"
+    FAILED = "failed"
+
+
+class PhotoOrientation(StrEnum):
+    """Shape of a photo as displayed, after its EXIF rotation is applied."""
+
+    LANDSCAPE = "landscape"
+    PORTRAIT = "portrait"
+    SQUARE = "square"
+
+    @classmethod
+    def of(cls, width: int, height: int) -> "PhotoOrientation":
+        """Classify an image by its dimensions."""
+        if width > height:
+            return cls.LANDSCAPE
+        if width < height:
+            return cls.PORTRAIT
+        return cls.SQUARE
+
+
 class Photo(Model):
     """Photo model representing stored images."""
 
@@ -12,7 +39,34 @@ class Photo(Model):
     original_url = fields.CharField(max_length=512)
     thumbnail_url = fields.CharField(max_length=512)
     file_size = fields.IntField(default=0)
+    # SHA-256 of the uploaded bytes, used to skip re-processing duplicate uploads
+    content_hash = fields.CharField(max_length=64, null=True, unique=True)
+    status = fields.CharEnumField(PhotoStatus, max_length=16, default=PhotoStatus.READY)
+    # Thumbnail settings the derivatives were generated with, see services.jobs.derivatives_signature
+    derivatives_version = fields.CharField(max_length=64, null=True)
+    # Dimensions of the stored image, known once its derivatives are generated
+    width = fields.IntField(null=True)
+    height = fields.IntField(null=True)
+    orientation = fields.CharEnumField(PhotoOrientation, max_length=16, null=True)
+    # Painted by clients until the thumbnail arrives: a BlurHash and the dominant colour as #rrggbb
+    blurhash = fields.CharField(max_length=64, null=True)
+    dominant_color = fields.CharField(max_length=7, null=True)
+    # Capture time from EXIF, or the upload time for photos that do not record one
+    taken_at = fields.DatetimeField(default=timezone.now)
+    camera = fields.CharField(max_length=128, null=True)
+    latitude = fields.FloatField(null=True)
+    longitude = fields.FloatField(null=True)
     created_at = fields.DatetimeField(auto_now_add=True)
 
+    class Meta:
+        # Leading created_at column serves date lookups and keyset pagination of the newest-first listing
+        indexes = (
+            ("created_at", "id"),
+            # The listing sorts by capture time, optionally filtered by camera or orientation first
+            ("taken_at", "id"),
+            ("camera", "taken_at", "id"),
+            ("orientation", "taken_at", "id"),
+        )
+
     def __str__(self):
         return self.filename
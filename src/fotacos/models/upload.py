@@ -0,0 +1,31 @@
+"""Resumable upload session database model."""
+
+from tortoise import fields
+from tortoise.models import Model
+
+
+class UploadSession(Model):
+    """
+    Upload sent in chunks, whose bytes so far are kept in the staging area.
+
+    The id is random and only known to the client that created the session,
+    which uses it to append chunks, resume after a dropped connection and
+    finish the upload.
+    """
+
+    id = fields.CharField(max_length=32, primary_key=True)
+    filename = fields.CharField(max_length=255)
+    # Total size announced by the client and the number of bytes received so far
+    length = fields.BigIntField()
+    offset = fields.BigIntField(default=0)
+    # Encoding choices passed on to the derivative job of the photo
+    options = fields.JSONField(null=True)
+    # Pushed back whenever a chunk arrives; expired sessions are collected with their bytes
+    expires_at = fields.DatetimeField()
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "upload_session"
+
+    def __str__(self):
+        return f"upload {self.id} of {self.filename}"
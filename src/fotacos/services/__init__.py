@@ -1,5 +1,157 @@
 """Services module."""
 
-from fotacos.services.images import convert_to_webp, generate_thumbnail
+from fotacos.services.encoding import (
+    EncodingProfile,
+    UnavailableFormatError,
+    available_sibling_formats,
+    get_encoding_profile,
+    resolve_sibling_formats,
+)
+from fotacos.services.events import (
+    ChangesExpiredError,
+    PhotoChange,
+    PhotoFeed,
+    changes_after,
+    get_photo_feed,
+    latest_sequence,
+    record_photo_events,
+)
+from fotacos.services.files import FileLock, atomic_write, new_photo_filename, photo_urls
+from fotacos.services.fsck import FsckReport, check_storage
+from fotacos.services.images import (
+    PhotoMetadata,
+    Placeholder,
+    SavedImage,
+    compute_placeholder,
+    convert_to_webp,
+    encode_image,
+    generate_thumbnail,
+    process_image,
+    read_metadata,
+    render_sprite_sheet,
+    render_variant,
+    save_image,
+)
+from fotacos.services.importer import ImportState, ImportStats, PhotoImporter, import_roots, watch_directories
+from fotacos.services.ingest import IngestedFile, UnsupportedImageError, UploadTooLargeError, spool_upload
+from fotacos.services.jobs import (
+    JobRunner,
+    derivatives_signature,
+    enqueue_derivatives,
+    enqueue_stale_derivatives,
+    get_job_runner,
+    image_fields,
+    pending_original_path,
+    recover_interrupted_jobs,
+    store_derivatives,
+)
+from fotacos.services.sprites import SpriteCache, SpritePhoto, SpriteSheet, SpriteTile, get_sprite_cache
+from fotacos.services.storage import (
+    LocalStorage,
+    S3Storage,
+    Storage,
+    StorageError,
+    StoredObject,
+    full_image_key,
+    get_storage,
+    migrate_storage_layout,
+    photo_keys,
+    sibling_key,
+    thumbnail_key,
+)
+from fotacos.services.unit_of_work import FileChanges, unit_of_work
+from fotacos.services.uploads import (
+    UploadBusyError,
+    UploadIncompleteError,
+    UploadOffsetError,
+    append_chunk,
+    collect_expired_uploads,
+    create_upload,
+    discard_upload,
+    finish_upload,
+)
+from fotacos.services.variants import VariantCache, VariantSpec, get_variant_cache
+from fotacos.services.worker import ImageWorker, WorkerBusyError, get_image_worker
 
-__all__ = ["convert_to_webp", "generate_thumbnail"]
+__all__ = [
+    "ChangesExpiredError",
+    "EncodingProfile",
+    "FileChanges",
+    "FileLock",
+    "FsckReport",
+    "ImageWorker",
+    "ImportState",
+    "ImportStats",
+    "IngestedFile",
+    "JobRunner",
+    "LocalStorage",
+    "PhotoChange",
+    "PhotoFeed",
+    "PhotoImporter",
+    "PhotoMetadata",
+    "Placeholder",
+    "S3Storage",
+    "SavedImage",
+    "SpriteCache",
+    "SpritePhoto",
+    "SpriteSheet",
+    "SpriteTile",
+    "Storage",
+    "StorageError",
+    "StoredObject",
+    "UnavailableFormatError",
+    "UnsupportedImageError",
+    "UploadBusyError",
+    "UploadIncompleteError",
+    "UploadOffsetError",
+    "UploadTooLargeError",
+    "VariantCache",
+    "VariantSpec",
+    "WorkerBusyError",
+    "append_chunk",
+    "atomic_write",
+    "available_sibling_formats",
+    "changes_after",
+    "check_storage",
+    "collect_expired_uploads",
+    "compute_placeholder",
+    "convert_to_webp",
+    "create_upload",
+    "derivatives_signature",
+    "discard_upload",
+    "encode_image",
+    "enqueue_derivatives",
+    "enqueue_stale_derivatives",
+    "finish_upload",
+    "full_image_key",
+    "generate_thumbnail",
+    "get_encoding_profile",
+    "get_image_worker",
+    "get_job_runner",
+    "get_photo_feed",
+    "get_sprite_cache",
+    "get_storage",
+    "get_variant_cache",
+    "image_fields",
+    "import_roots",
+    "latest_sequence",
+    "migrate_storage_layout",
+    "new_photo_filename",
+    "pending_original_path",
+    "photo_keys",
+    "photo_urls",
+    "process_image",
+    "read_metadata",
+    "record_photo_events",
+    "recover_interrupted_jobs",
+    "render_sprite_sheet",
+    "render_variant",
+    "resolve_sibling_formats",
+    "save_image",
+    "sibling_key",
+    "spool_upload",
+    "store_derivatives",
+    "thumbnail_key",
+    "unit_of_work",
+    "watch_directories",
+]
@@ -0,0 +1,148 @@
+"""Encoding profiles and the optional image formats stored next to each WebP file."""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Literal
+
+from loguru import logger
+from PIL import Image
+
+from fotacos.env import get_settings
+
+EncodingProfileName = Literal["fast", "balanced", "archival"]
+SiblingFormat = Literal["avif", "jxl"]
+
+
+@dataclass(frozen=True)
+class EncodingProfile:
+    """How the full-size image of a photo and its siblings are encoded."""
+
+    name: str
+    # WebP quality (0-100)
+    quality: int
+    # WebP effort (0-6): higher is slower and a few percent smaller
+    method: int
+    # Encode PNG and GIF graphics losslessly, where lossy encoding smears flat colours and text
+    lossless_graphics: bool
+    # Longest edge of the full-size image, None to keep the source resolution
+    max_dimension: int | None
+    # Drop the EXIF data of the source, which includes its GPS position
+    strip_metadata: bool
+    # Quality of AVIF and JPEG XL siblings (0-100)
+    sibling_quality: int
+    # Speed of AVIF and JPEG XL siblings, 0 slowest to 10 fastest
+    sibling_speed: int
+
+
+ENCODING_PROFILES: dict[str, EncodingProfile] = {
+    "fast": EncodingProfile(
+        name="fast",
+        quality=80,
+        method=2,
+        lossless_graphics=False,
+        max_dimension=4096,
+        strip_metadata=True,
+        sibling_quality=60,
+        sibling_speed=9,
+    ),
+    "balanced": EncodingProfile(
+        name="balanced",
+        quality=85,
+        method=4,
+        lossless_graphics=True,
+        max_dimension=None,
+        strip_metadata=True,
+        sibling_quality=65,
+        sibling_speed=7,
+    ),
+    "archival": EncodingProfile(
+        name="archival",
+        quality=92,
+        method=6,
+        lossless_graphics=True,
+        max_dimension=None,
+        strip_metadata=False,
+        sibling_quality=80,
+        sibling_speed=6,
+    ),
+}
+
+
+@dataclass(frozen=True)
+class ImageFormat:
+    """An image format siblings can be stored in."""
+
+    # Pillow format name
+    pillow_format: str
+    suffix: str
+    media_type: str
+
+
+SIBLING_FORMATS: dict[str, ImageFormat] = {
+    "avif": ImageFormat("AVIF", ".avif", "image/avif"),
+    "jxl": ImageFormat("JXL", ".jxl", "image/jxl"),
+}
+
+
+class UnavailableFormatError(ValueError):
+    """Raised when siblings are requested in a format the installed Pillow cannot encode."""
+
+    def __init__(self, formats: list[str]) -> None:
+        """Initialize the error with the formats that cannot be encoded."""
+        super().__init__(f"Image formats not available on this server: {', '.join(formats)}")
+
+
+@lru_cache
+def register_plugins() -> None:
+    """Register the optional Pillow plugins that add encoders, once per process."""
+    try:
+        import pillow_jxl  # noqa: F401
+    except ImportError:
+        logger.debug("pillow-jxl-plugin is not installed, JPEG XL siblings are unavailable")
+
+
+@lru_cache
+def available_sibling_formats() -> frozenset[str]:
+    """Sibling formats the installed Pillow and its plugins can encode."""
+    register_plugins()
+    Image.init()
+    return frozenset(name for name, image_format in SIBLING_FORMATS.items() if image_format.pillow_format in Image.SAVE)
+
+
+@lru_cache
+def _usable_formats(configured: tuple[str, ...]) -> list[str]:
+    """Drop the configured sibling formats that cannot be encoded, warning once."""
+    available = available_sibling_formats()
+    missing = [name for name in configured if name not in available]
+    if missing:
+        logger.warning("Skipping sibling formats Pillow cannot encode: {}", ", ".join(missing))
+    return [name for name in dict.fromkeys(configured) if name in available]
+
+
+def get_encoding_profile(name: str | None = None) -> EncodingProfile:
+    """Get an encoding profile by name, default the one configured in settings."""
+    return ENCODING_PROFILES[name or get_settings().encoding_profile]
+
+
+def resolve_sibling_formats(requested: list[str] | None = None) -> list[str]:
+    """
+    Pick the sibling formats to encode.
+
+    Formats configured in settings but not available are skipped with a
+    warning, while explicitly requested ones are refused.
+
+    Args:
+        requested: Formats asked for by a client, default the ones configured in settings
+
+    Returns:
+        Names of the sibling formats to encode
+
+    Raises:
+        UnavailableFormatError: If a requested format cannot be encoded
+    """
+    if requested is None:
+        return list(_usable_formats(tuple(get_settings().image_sibling_formats)))
+    missing = [name for name in requested if name not in available_sibling_formats()]
+    if missing:
+        raise UnavailableFormatError(missing)
+    return list(dict.fromkeys(requested))
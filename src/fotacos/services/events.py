@@ -0,0 +1,192 @@
+"""Photo change feed, followed by clients that keep their gallery up to date without reloading it."""
+
+import asyncio
+from collections.abc import AsyncIterator, Iterable
+from contextlib import suppress
+from dataclasses import dataclass
+from functools import lru_cache
+
+from loguru import logger
+from tortoise.functions import Max, Min
+
+from fotacos.database import data_version
+from fotacos.env import get_settings
+from fotacos.models import PhotoEvent, PhotoEventKind
+
+settings = get_settings()
+
+# Changes read from the database at a time, so a client far behind catches up in steps
+CHANGE_BATCH_SIZE = 500
+
+
+class ChangesExpiredError(Exception):
+    """Raised when a client resumes from a change that is no longer kept, so it would miss some."""
+
+    def __init__(self, sequence: int, latest: int) -> None:
+        """Initialize the error with the requested and the latest sequence number."""
+        super().__init__(f"Changes after {sequence} are no longer kept, the feed is at {latest}")
+        self.sequence = sequence
+        self.latest = latest
+
+
+@dataclass(frozen=True)
+class PhotoChange:
+    """Something that happened to a photo, at a position of the feed."""
+
+    sequence: int
+    kind: PhotoEventKind
+    photo_id: int
+
+
+async def record_photo_events(kind: PhotoEventKind, photo_ids: Iterable[int]) -> None:
+    """
+    Append changes of photos to the feed and prune the oldest ones.
+
+    Call it in the transaction of the change, so both commit or neither does,
+    then `notify()` the feed once the transaction committed.
+
+    Args:
+        kind: What happened to the photos
+        photo_ids: Photos it happened to
+    """
+    events = [PhotoEvent(kind=kind, photo_id=photo_id) for photo_id in photo_ids]
+    if not events:
+        return
+    await PhotoEvent.bulk_create(events)
+    _, latest = await sequence_range()
+    await PhotoEvent.filter(id__lte=latest - settings.event_retention).delete()
+
+
+async def sequence_range() -> tuple[int, int]:
+    """
+    Sequence numbers of the oldest and the latest change kept.
+
+    Returns:
+        The oldest and latest sequence numbers, (1, 0) before the first change
+    """
+    oldest, latest = (
+        await PhotoEvent.annotate(oldest=Min("id"), latest=Max("id")).first().values_list("oldest", "latest")
+    )
+    return (oldest, latest) if latest is not None else (1, 0)
+
+
+async def latest_sequence() -> int:
+    """Sequence number of the latest change, 0 before the first one."""
+    _, latest = await sequence_range()
+    return latest
+
+
+async def changes_after(sequence: int, limit: int = CHANGE_BATCH_SIZE) -> list[PhotoChange]:
+    """The changes following a sequence number, oldest first."""
+    rows = await PhotoEvent.filter(id__gt=sequence).order_by("id").limit(limit).values_list("id", "kind", "photo_id")
+    return [PhotoChange(sequence, PhotoEventKind(kind), photo_id) for sequence, kind, photo_id in rows]
+
+
+class PhotoFeed:
+    """
+    Delivers the photo change feed to subscribers as it grows.
+
+    Changes committed in this process wake subscribers through `notify()`.
+    While anyone is subscribed, the database is also polled for commits made
+    by other processes, such as further web workers or an import, so their
+    changes arrive too.
+    """
+
+    def __init__(self, poll_interval: float) -> None:
+        """
+        Initialize the feed.
+
+        Args:
+            poll_interval: Seconds between checks for commits by other processes
+        """
+        self.poll_interval = poll_interval
+        self._waiters: set[asyncio.Event] = set()
+        self._poller: asyncio.Task | None = None
+
+    @property
+    def subscribers(self) -> int:
+        """Number of subscriptions currently following the feed."""
+        return len(self._waiters)
+
+    def notify(self) -> None:
+        """Wake subscribers up after changes were committed."""
+        for waiter in self._waiters:
+            waiter.set()
+
+    async def subscribe(
+        self, after: int | None = None, heartbeat: float | None = None
+    ) -> AsyncIterator[list[PhotoChange]]:
+        """
+        Follow the feed until the iteration is stopped.
+
+        Args:
+            after: Sequence number of the last change already seen, default the latest one
+            heartbeat: Yield an empty batch after this many seconds without changes
+
+        Yields:
+            Batches of changes in sequence order
+
+        Raises:
+            ChangesExpiredError: If changes following `after` were pruned, or `after` is ahead of the feed
+        """
+        oldest, latest = await sequence_range()
+        if after is None:
+            after = latest
+        elif not oldest - 1 <= after <= latest:
+            raise ChangesExpiredError(after, latest)
+
+        waiter = asyncio.Event()
+        self._waiters.add(waiter)
+        self._ensure_polling()
+        try:
+            while True:
+                # Cleared before reading, so a change committed meanwhile still wakes the next wait
+                waiter.clear()
+                changes = await changes_after(after)
+                if changes:
+                    after = changes[-1].sequence
+                    yield changes
+                elif not await self._wait(waiter, heartbeat):
+                    yield []
+        finally:
+            self._waiters.discard(waiter)
+
+    async def stop(self) -> None:
+        """Stop polling the database; subscriptions started later poll again."""
+        if self._poller is not None:
+            self._poller.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._poller
+            self._poller = None
+
+    async def _wait(self, waiter: asyncio.Event, timeout: float | None) -> bool:
+        """Wait until woken up, returning False if the timeout passed first."""
+        try:
+            await asyncio.wait_for(waiter.wait(), timeout)
+        except TimeoutError:
+            return False
+        return True
+
+    def _ensure_polling(self) -> None:
+        """Start polling for commits by other processes, unless it is already running."""
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll())
+
+    async def _poll(self) -> None:
+        """Wake subscribers when another connection commits, until none is left."""
+        try:
+            version = await data_version()
+            while self._waiters:
+                await asyncio.sleep(self.poll_interval)
+                current = await data_version()
+                if current != version:
+                    version = current
+                    self.notify()
+        except Exception:
+            logger.exception("Polling for photo changes failed")
+
+
+@lru_cache
+def get_photo_feed() -> PhotoFeed:
+    """Get the shared photo change feed configured from settings."""
+    return PhotoFeed(poll_interval=settings.event_poll_interval)
@@ -0,0 +1,103 @@
+"""Filesystem helpers for naming and writing photo files safely."""
+
+import fcntl
+import os
+import re
+import tempfile
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO
+
+# Files named by new_photo_filename(), and the renditions stored alongside them under the same stem
+PHOTO_FILE_PATTERN = re.compile(r"^photo_[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\.\w+$")
+
+
+@contextmanager
+def atomic_write(path: Path) -> Iterator[BinaryIO]:
+    """
+    Open a temporary file next to `path` and rename it into place on success.
+
+    Readers never observe a partially written file: the destination either
+    keeps its previous content or receives the complete new one. If the block
+    raises, the temporary file is removed and the destination is untouched.
+
+    Args:
+        path: Final location of the file
+
+    Yields:
+        Binary file object to write the content to
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    temp_path = Path(temp_name)
+    try:
+        with os.fdopen(fd, "wb") as output:
+            yield output
+        os.replace(temp_path, path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+
+def new_photo_filename() -> str:
+    """Generate a unique filename for a stored photo."""
+    return f"photo_{uuid.uuid4()}.webp"
+
+
+def photo_urls(webp_filename: str) -> dict[str, str]:
+    """Generate the filename and URLs of a photo for the mounted static directories."""
+    return {
+        "filename": webp_filename,
+        "original_url": f"/public/picts/{webp_filename}",
+        "thumbnail_url": f"/public/picts/thumbnails/{webp_filename}",
+    }
+
+
+class FileLock:
+    """
+    Advisory lock on a file, held by at most one open lock at a time across processes.
+
+    The operating system releases the lock when its holder exits, even after
+    a crash, so a lock is never left behind.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """Initialize the lock on a file, created on first acquisition."""
+        self.path = path
+        self._fd: int | None = None
+
+    @property
+    def held(self) -> bool:
+        """Whether this lock is currently held."""
+        return self._fd is not None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """
+        Take the lock.
+
+        Args:
+            blocking: Wait until the lock is free instead of giving up at once
+
+        Returns:
+            Whether the lock is now held
+        """
+        if self._fd is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        """Give the lock up; releasing a lock that is not held does nothing."""
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,202 @@
+"""Reconciliation of stored photo files against the database."""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from loguru import logger
+
+from fotacos.env import get_settings
+from fotacos.models import Photo, PhotoStatus
+from fotacos.services.files import PHOTO_FILE_PATTERN
+from fotacos.services.jobs import enqueue_derivatives
+from fotacos.services.storage import Storage, get_storage
+from fotacos.services.variants import get_variant_cache
+
+
+@dataclass
+class FsckReport:
+    """Outcome of a storage check."""
+
+    photos: int = 0
+    files_scanned: int = 0
+    orphaned_files: int = 0
+    reclaimed_bytes: int = 0
+    # Photos whose image file is gone and cannot be regenerated
+    missing: list[int] = field(default_factory=list)
+    # Photos queued for regeneration because a derivative is missing
+    requeued: int = 0
+    dry_run: bool = False
+
+    def describe(self) -> str:
+        """One-line summary of the check."""
+        action = "would reclaim" if self.dry_run else "reclaimed"
+        return (
+            f"{self.photos} photos, {self.files_scanned} files: {self.orphaned_files} orphaned files, "
+            f"{action} {self.reclaimed_bytes / 1024 / 1024:.1f} MiB, {len(self.missing)} photos missing their image, "
+            f"{self.requeued} queued for regeneration"
+        )
+
+
+def _is_orphan(name: str, referenced: set[str], mtime: float, cutoff: float) -> bool:
+    """Whether a photo file belongs to no photo, ignoring files that may be in flight."""
+    if mtime >= cutoff:
+        return False
+    if name.startswith(".") and name.endswith(".tmp"):
+        # Left behind by an atomic write interrupted by a crash
+        return True
+    return PHOTO_FILE_PATTERN.match(name) is not None and name.partition(".")[0] not in referenced
+
+
+async def _scan_storage(
+    storage: Storage, referenced: set[str], cutoff: float, dry_run: bool, report: FsckReport
+) -> tuple[set[str], set[str]]:
+    """
+    Remove the orphaned full-size images and thumbnails from storage.
+
+    Returns:
+        Names of the photo files present as full-size images and as thumbnails
+    """
+    full_images, thumbnails = set(), set()
+    async for stored in storage.list_objects():
+        parent, _, name = stored.key.rpartition("/")
+        if parent not in ("", "thumbnails"):
+            continue
+        report.files_scanned += 1
+        if not _is_orphan(name, referenced, stored.modified, cutoff):
+            (thumbnails if parent else full_images).add(name)
+            continue
+        report.orphaned_files += 1
+        report.reclaimed_bytes += stored.size
+        if not dry_run:
+            await storage.delete(stored.key)
+    return full_images, thumbnails
+
+
+def _scan_directory(
+    directory: Path, referenced: set[str], cutoff: float, dry_run: bool, report: FsckReport
+) -> set[str]:
+    """
+    Remove the orphaned files of a local staging directory.
+
+    Files that do not look like photo files are never touched.
+
+    Returns:
+        Names of the photo files present in the directory
+    """
+    present = set()
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return present
+    for entry in entries:
+        if not entry.is_file(follow_symlinks=False):
+            continue
+        report.files_scanned += 1
+        stat = entry.stat(follow_symlinks=False)
+        if not _is_orphan(entry.name, referenced, stat.st_mtime, cutoff):
+            present.add(entry.name)
+            continue
+        report.orphaned_files += 1
+        report.reclaimed_bytes += stat.st_size
+        if not dry_run:
+            Path(entry.path).unlink(missing_ok=True)
+    return present
+
+
+def _scan_variants(cache_dir: Path, referenced: set[str], report: FsckReport) -> list[str]:
+    """
+    Measure the cached variants of photos that no longer exist.
+
+    Returns:
+        Stems of the photos whose variants are orphaned
+    """
+    orphaned = []
+    try:
+        entries = list(os.scandir(cache_dir))
+    except FileNotFoundError:
+        return orphaned
+    for entry in entries:
+        if not entry.is_dir(follow_symlinks=False) or entry.name in referenced:
+            continue
+        orphaned.append(entry.name)
+        for variant in os.scandir(entry.path):
+            report.files_scanned += 1
+            report.orphaned_files += 1
+            report.reclaimed_bytes += variant.stat(follow_symlinks=False).st_size
+    return orphaned
+
+
+def _check_photos(
+    rows: list[tuple[int, str, str]],
+    full_images: set[str],
+    thumbnails: set[str],
+    originals: set[str],
+    report: FsckReport,
+) -> list[Photo]:
+    """
+    Record the photos missing their image and find those missing only a thumbnail.
+
+    Returns:
+        Photos whose derivatives must be regenerated
+    """
+    regenerate = []
+    for photo_id, filename, status in rows:
+        if status == PhotoStatus.READY and filename not in full_images:
+            report.missing.append(photo_id)
+        elif status == PhotoStatus.READY and filename not in thumbnails:
+            regenerate.append(Photo(id=photo_id))
+        elif status == PhotoStatus.PENDING and filename not in originals and filename not in full_images:
+            report.missing.append(photo_id)
+    return regenerate
+
+
+async def check_storage(dry_run: bool = False, grace_period: float | None = None) -> FsckReport:
+    """
+    Reconcile the stored files with the photo table and reclaim what no photo uses.
+
+    Orphaned files are left behind by crashes between writing a file and
+    committing its row, or between committing a delete and removing the files.
+    Files younger than the grace period are skipped, as they may belong to an
+    upload whose transaction has not committed yet. Ready photos missing only a
+    thumbnail are queued for regeneration; photos missing their image are
+    reported.
+
+    Args:
+        dry_run: Only report, without deleting files or queueing jobs
+        grace_period: Seconds a file must be unmodified before it can be reclaimed, default from settings
+
+    Returns:
+        FsckReport describing what was found and reclaimed
+    """
+    settings = get_settings()
+    if grace_period is None:
+        grace_period = settings.gc_grace_period
+    cutoff = time.time() - grace_period
+
+    rows = await Photo.all().values_list("id", "filename", "status")
+    referenced = {filename.partition(".")[0] for _, filename, _ in rows}
+    report = FsckReport(photos=len(rows), dry_run=dry_run)
+
+    full_images, thumbnails = await _scan_storage(get_storage(), referenced, cutoff, dry_run, report)
+    originals = await asyncio.to_thread(
+        _scan_directory, settings.staging_dir / "originals", referenced, cutoff, dry_run, report
+    )
+    # Derivatives only stay in the work directory until the job that rendered them stores them
+    for directory in (settings.staging_dir / "work", settings.staging_dir / "work" / "thumbnails"):
+        await asyncio.to_thread(_scan_directory, directory, set(), cutoff, dry_run, report)
+    orphaned_variants = await asyncio.to_thread(_scan_variants, settings.variant_cache_dir, referenced, report)
+    if not dry_run:
+        for stem in orphaned_variants:
+            await get_variant_cache().discard(stem)
+
+    regenerate = _check_photos(rows, full_images, thumbnails, originals, report)
+    if regenerate:
+        report.requeued = len(regenerate) if dry_run else await enqueue_derivatives(regenerate)
+
+    if report.missing:
+        logger.warning("Photos missing their image file: {}", report.missing)
+    logger.info("Storage check: {}", report.describe())
+    return report
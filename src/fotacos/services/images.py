@@ -1,55 +1,101 @@
 """Image processing service using PIL."""
 
+import math
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
 from io import BytesIO
-from typing import BinaryIO
+from pathlib import Path
+from typing import Any, BinaryIO
 
-from PIL import ExifTags, Image
+from PIL import ExifTags, Image, ImageOps
 
 from fotacos.env import get_settings
+from fotacos.metrics import timed_stage
+from fotacos.services.encoding import SIBLING_FORMATS, EncodingProfile, get_encoding_profile, register_plugins
+from fotacos.services.files import atomic_write
+from fotacos.services.placeholders import blurhash, dominant_color, placeholder_source
 
 settings = get_settings()
 THUMBNAIL_SIZE = (settings.thumbnail_size, settings.thumbnail_size)
+ALPHA_FORMATS = {"WEBP", "PNG", "AVIF", "JXL"}
+# Sources that are usually drawn rather than photographed, with few enough colours to encode losslessly
+GRAPHIC_FORMATS = {"PNG", "GIF"}
+GRAPHIC_MAX_COLORS = 256
+EXIF_DATETIME_FORMAT = "%Y:%m:%d %H:%M:%S"
+CAMERA_MAX_LENGTH = 128
+
+
+@dataclass(frozen=True)
+class PhotoMetadata:
+    """Capture details read from the EXIF data of a source image."""
+
+    taken_at: datetime | None = None
+    camera: str | None = None
+    latitude: float | None = None
+    longitude: float | None = None
+    # EXIF orientation of the source; stored images are already rotated upright
+    orientation: int = 1
+
+
+@dataclass
+class ProcessedImage:
+    """Encoded outputs of a single pass over a source image."""
+
+    full: BinaryIO
+    thumbnails: dict[int, BinaryIO] = field(default_factory=dict)
+    width: int = 0
+    height: int = 0
+    metadata: PhotoMetadata = field(default_factory=PhotoMetadata)
+
+
+@dataclass(frozen=True)
+class Placeholder:
+    """What clients paint while the thumbnail of a photo downloads."""
+
+    blurhash: str
+    dominant_color: str
+
+
+@dataclass(frozen=True)
+class SavedImage:
+    """Summary of an image whose outputs were written to disk."""
+
+    width: int
+    height: int
+    file_size: int
+    metadata: PhotoMetadata = field(default_factory=PhotoMetadata)
+    placeholder: Placeholder | None = None
 
 
 def convert_to_webp(
     input_photo: BinaryIO,
     quality: int | None = None,
+    profile: EncodingProfile | None = None,
 ) -> BinaryIO:
     """
     Convert an image to WebP format.
 
     Args:
         input_photo: BinaryIO stream containing the source image
-        quality: WebP quality (0-100), default 90
+        quality: WebP quality (0-100), default from the encoding profile
+        profile: Encoding profile, default the one configured in settings
 
     Returns:
         BinaryIO stream containing the converted WebP image
     """
-    if quality is None:
-        quality = 90  # High quality for original images
+    profile = profile or get_encoding_profile()
 
     # Reset stream position to beginning
     input_photo.seek(0)
 
     with Image.open(input_photo) as img:
+        _decode(img)
         # Fix orientation from EXIF data
-        img = _fix_orientation(img)
-
-        # Convert to RGB if necessary
-        if img.mode in ("RGBA", "P"):
-            # For WebP, we can preserve transparency
-            if img.mode == "P":
-                img = img.convert("RGBA")
-        elif img.mode not in ("RGB", "RGBA"):
-            img = img.convert("RGB")
-
-        # Save as WebP to BytesIO
-        output = BytesIO()
-        img.save(output, "WEBP", quality=quality, method=6)
-
-        # Reset output stream position for reading
-        output.seek(0)
-        return output
+        with timed_stage("orient"):
+            img = _fix_orientation(img)
+        return _encode_webp(_to_webp_mode(img), profile, quality)
 
 
 def generate_thumbnail(
@@ -73,48 +119,505 @@ def generate_thumbnail(
     input_photo.seek(0)
 
     with Image.open(input_photo) as img:
+        # Let the JPEG decoder skip detail the thumbnail would throw away anyway
+        img.draft("RGB", (max(size), max(size)))
+        _decode(img)
+
         # Fix orientation from EXIF data
-        img = _fix_orientation(img)
-
-        # Convert to RGB if necessary (for PNG with transparency, etc.)
-        if img.mode in ("RGBA", "P"):
-            # Create white background for transparent images
-            background = Image.new("RGB", img.size, (255, 255, 255))
-            if img.mode == "P":
-                img = img.convert("RGBA")
-            background.paste(img, mask=img.split()[-1] if img.mode == "RGBA" else None)
-            img = background
-        elif img.mode != "RGB":
-            img = img.convert("RGB")
+        with timed_stage("orient"):
+            img = _fix_orientation(img)
 
         # Create thumbnail maintaining aspect ratio
-        img.thumbnail(size, Image.Resampling.LANCZOS)
+        with timed_stage("resize"):
+            img = _flatten_to_rgb(img)
+            img.thumbnail(size, Image.Resampling.LANCZOS)
+
+        return _encode_webp(img, get_encoding_profile(), settings.thumbnail_quality)
+
+
+def process_image(
+    input_photo: BinaryIO,
+    thumbnail_sizes: Sequence[int] | None = None,
+    quality: int | None = None,
+    max_dimension: int | None = None,
+    profile: EncodingProfile | None = None,
+) -> ProcessedImage:
+    """
+    Produce the full WebP image and every thumbnail from a single decode.
+
+    The source is decoded and oriented once. Thumbnails are derived from the
+    in-memory pixels, largest first, each one downscaled from the previous one
+    with ``reduce()`` doing most of the work before the LANCZOS filter runs.
+
+    Args:
+        input_photo: BinaryIO stream containing the source image
+        thumbnail_sizes: Bounding box edges of the thumbnails, default from settings
+        quality: WebP quality of the full image (0-100), default from the encoding profile
+        max_dimension: Optional limit for the longest edge of the full image,
+            which lets JPEG sources be decoded at a reduced scale via ``draft()``,
+            default from the encoding profile
+        profile: Encoding profile, default the one configured in settings
+
+    Returns:
+        ProcessedImage with the encoded full image, thumbnails keyed by size
+        and the metadata of the source
+    """
+    profile = profile or get_encoding_profile()
+    sizes = _thumbnail_order(thumbnail_sizes)
+
+    # Reset stream position to beginning
+    input_photo.seek(0)
+
+    with Image.open(input_photo) as img:
+        metadata = read_metadata(img)
+        extra = _metadata_options(img, profile.strip_metadata)
+        lossless = profile.lossless_graphics and _is_graphic(img)
+        renditions = _iter_renditions(img, metadata.orientation, sizes, max_dimension or profile.max_dimension)
+        full = next(renditions)
+        result = ProcessedImage(
+            full=_encode_webp(full, profile, quality, lossless, **extra),
+            width=full.width,
+            height=full.height,
+            metadata=metadata,
+        )
+        thumbnail_extra = _metadata_options(img, strip_exif=True)
+        for size, thumbnail in zip(sizes, renditions, strict=True):
+            result.thumbnails[size] = _encode_webp(thumbnail, profile, settings.thumbnail_quality, **thumbnail_extra)
+    return result
 
-        # Save as WebP to BytesIO
-        output = BytesIO()
-        img.save(output, "WEBP", quality=settings.thumbnail_quality, method=6)
 
-        # Reset output stream position for reading
-        output.seek(0)
-        return output
+def save_image(
+    source_path: Path,
+    full_path: Path | None,
+    thumbnail_paths: Mapping[int, Path],
+    quality: int | None = None,
+    max_dimension: int | None = None,
+    profile: EncodingProfile | None = None,
+    sibling_formats: Sequence[str] = (),
+) -> SavedImage:
+    """
+    Run the single-decode pipeline and encode every output straight to disk.
+
+    Each output is written to a temporary file in its destination directory
+    and renamed into place, so no encoded copy is buffered in memory and a
+    failure never leaves a truncated file behind. Runs inside an image worker
+    process, so it takes paths instead of streams.
+
+    Args:
+        source_path: Path of the source image
+        full_path: Destination of the full-size WebP image, or None to only
+            regenerate thumbnails when the source already is the full image
+        thumbnail_paths: Destination of each thumbnail, keyed by bounding box edge
+        quality: WebP quality of the full image (0-100), default from the encoding profile
+        max_dimension: Optional limit for the longest edge of the full image, default from the encoding profile
+        profile: Encoding profile, default the one configured in settings
+        sibling_formats: Names of the formats every output is also encoded in,
+            written next to it with the format's suffix
+
+    Returns:
+        SavedImage with the full image dimensions, its size on disk, the
+        metadata of the source and a placeholder computed from the smallest
+        rendition
+    """
+    profile = profile or get_encoding_profile()
+    sizes = _thumbnail_order(thumbnail_paths)
+    if sibling_formats:
+        register_plugins()
+    with Image.open(source_path) as img:
+        metadata = read_metadata(img)
+        extra = _metadata_options(img, profile.strip_metadata)
+        thumbnail_extra = _metadata_options(img, strip_exif=True)
+        lossless = profile.lossless_graphics and _is_graphic(img)
+        renditions = _iter_renditions(img, metadata.orientation, sizes, max_dimension or profile.max_dimension)
+        full = next(renditions)
+        width, height = full.size
+        if full_path is not None:
+            _save_with_siblings(full, full_path, sibling_formats, profile, quality, lossless, extra)
+        smallest = full
+        for size, thumbnail in zip(sizes, renditions, strict=True):
+            _save_with_siblings(
+                thumbnail,
+                thumbnail_paths[size],
+                sibling_formats,
+                profile,
+                settings.thumbnail_quality,
+                False,
+                thumbnail_extra,
+            )
+            smallest = thumbnail
+        placeholder = compute_placeholder(smallest)
+
+    file_size = (full_path or source_path).stat().st_size
+    return SavedImage(width=width, height=height, file_size=file_size, metadata=metadata, placeholder=placeholder)
+
+
+def compute_placeholder(image: Image.Image) -> Placeholder:
+    """
+    Compute the placeholder of a photo from one of its renditions.
+
+    Pass the smallest rendition at hand, as its pixels are downscaled further.
+    """
+    with timed_stage("placeholder"):
+        source = placeholder_source(_flatten_to_rgb(image))
+        return Placeholder(blurhash=blurhash(source), dominant_color=dominant_color(source))
+
+
+def render_variant(source_path: Path, dest_path: Path, box: tuple[int, int], image_format: str, quality: int) -> int:
+    """
+    Render a resized copy of an image for on-demand delivery.
+
+    Runs inside an image worker process. Images are never upscaled, and
+    formats without transparency get a white background.
+
+    Args:
+        source_path: Path of the source image
+        dest_path: Destination of the rendered variant
+        box: Bounding box (width, height) the variant must fit in
+        image_format: Pillow format name, e.g. "WEBP" or "JPEG"
+        quality: Encoder quality (0-100)
+
+    Returns:
+        Size in bytes of the rendered variant
+    """
+    with Image.open(source_path) as img:
+        img.draft("RGB", box)
+        _decode(img)
+        with timed_stage("orient"):
+            img = _fix_orientation(img)
+        with timed_stage("resize"):
+            img = _to_webp_mode(img) if image_format in ALPHA_FORMATS else _flatten_to_rgb(img)
+            img = _fit_within(img, box)
+        with atomic_write(dest_path) as output, timed_stage(f"encode_{image_format.lower()}"):
+            # Favour encoding speed over the last few bytes: variants are rendered while a client waits
+            img.save(output, image_format, quality=quality, method=4)
+    return dest_path.stat().st_size
+
+
+def render_sprite_sheet(
+    dest_path: Path,
+    cells_path: Path,
+    tiles: Sequence[tuple[Path, tuple[int, int, int, int] | None]],
+    columns: int,
+    tile_size: int,
+    quality: int,
+) -> int:
+    """
+    Pack thumbnails into a sprite sheet, a grid of square cells filled left to right, top to bottom.
+
+    Runs inside an image worker process. Thumbnails are cropped to fill their
+    cell; cells copied from the lossless cells of a previous sheet are pasted
+    as they are, so each source file is only decoded once and copied cells
+    lose no quality however often they are copied.
+
+    Args:
+        dest_path: Destination of the sprite sheet, written as WebP
+        cells_path: Destination of the same pixels losslessly encoded, to copy cells from later
+        tiles: Source of each cell, the image path and the box to copy from it or None to fit the whole image
+        columns: Number of cells per row
+        tile_size: Edge of a cell in pixels
+        quality: Encoder quality (0-100)
+
+    Returns:
+        Size in bytes of the sprite sheet and its lossless cells
+    """
+    rows = math.ceil(len(tiles) / columns)
+    sheet = Image.new("RGB", (columns * tile_size, rows * tile_size), (255, 255, 255))
+    with ExitStack() as stack:
+        sources: dict[Path, Image.Image] = {}
+        for index, (source_path, box) in enumerate(tiles):
+            source = sources.get(source_path)
+            if source is None:
+                source = sources[source_path] = stack.enter_context(Image.open(source_path))
+            if box is None:
+                with timed_stage("resize"):
+                    tile = ImageOps.fit(_flatten_to_rgb(source), (tile_size, tile_size), Image.Resampling.LANCZOS)
+            else:
+                tile = source.crop(box)
+            sheet.paste(tile, ((index % columns) * tile_size, (index // columns) * tile_size))
+    with atomic_write(cells_path) as output, timed_stage("encode_webp"):
+        # Fastest lossless effort, these are only read back by the next rebuild
+        sheet.save(output, "WEBP", lossless=True, quality=0, method=0)
+    with atomic_write(dest_path) as output, timed_stage("encode_webp"):
+        sheet.save(output, "WEBP", quality=quality, method=4)
+    return dest_path.stat().st_size + cells_path.stat().st_size
+
+
+def _thumbnail_order(thumbnail_sizes: Iterable[int] | None) -> list[int]:
+    """Deduplicate thumbnail sizes and order them largest first, defaulting to settings."""
+    if thumbnail_sizes is None:
+        return [settings.thumbnail_size]
+    return sorted(set(thumbnail_sizes), reverse=True)
+
+
+def _iter_renditions(
+    img: Image.Image,
+    orientation: int,
+    sizes: Sequence[int],
+    max_dimension: int | None,
+) -> Iterator[Image.Image]:
+    """
+    Decode an opened source once and yield the full image, then one thumbnail per size.
+
+    `sizes` must be ordered largest first, as each thumbnail is downscaled from
+    the previous one. The source must stay open until the iterator is exhausted.
+    """
+    if max_dimension is not None:
+        img.draft("RGB", (max_dimension, max_dimension))
+    _decode(img)
+
+    # Fix orientation from EXIF data
+    with timed_stage("orient"):
+        img = _fix_orientation(img, orientation)
+
+    with timed_stage("resize"):
+        if max_dimension is not None:
+            img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+        full = _to_webp_mode(img)
+    yield full
+
+    source = _flatten_to_rgb(full)
+    for size in sizes:
+        with timed_stage("resize"):
+            source = _fit_within(source, (size, size))
+        yield source
+
+
+def _decode(image: Image.Image) -> None:
+    """Decode the pixels of an opened source, after any ``draft()`` request."""
+    with timed_stage("decode"):
+        image.load()
+
+
+def _fit_within(image: Image.Image, box: tuple[int, int]) -> Image.Image:
+    """Downscale an image into a bounding box without copying it first; smaller images are returned as is."""
+    width, height = image.size
+    scale = min(box[0] / width, box[1] / height)
+    if scale >= 1:
+        return image
+    target = (max(1, round(width * scale)), max(1, round(height * scale)))
+    # reducing_gap makes Pillow reduce() by an integer factor before the LANCZOS pass
+    return image.resize(target, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+
+def _to_webp_mode(image: Image.Image) -> Image.Image:
+    """Convert an image to a mode WebP can store, preserving transparency."""
+    if image.mode == "P":
+        return image.convert("RGBA")
+    if image.mode not in ("RGB", "RGBA"):
+        return image.convert("RGB")
+    return image
+
+
+def _flatten_to_rgb(image: Image.Image) -> Image.Image:
+    """Convert an image to RGB, compositing transparent images onto a white background."""
+    if image.mode in ("RGBA", "P"):
+        if image.mode == "P":
+            image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        return background
+    if image.mode != "RGB":
+        return image.convert("RGB")
+    return image
+
+
+def encode_image(
+    image: Image.Image,
+    output: BinaryIO,
+    image_format: str,
+    profile: EncodingProfile,
+    quality: int | None = None,
+    lossless: bool = False,
+    **extra: Any,
+) -> None:
+    """
+    Encode an image into a writable binary stream with the settings of an encoding profile.
+
+    Args:
+        image: Image in a mode the format can store
+        output: Stream the encoded image is written to
+        image_format: Pillow format name, "WEBP", "AVIF" or "JXL"
+        profile: Encoding profile providing the encoder effort and quality
+        quality: Quality overriding the profile's (0-100)
+        lossless: Encode without loss, ignored by AVIF
+        **extra: Passed on to the encoder, such as ``exif`` or ``icc_profile``
+    """
+    if image_format == "WEBP":
+        options = {"quality": profile.quality if quality is None else quality, "method": profile.method}
+    else:
+        options = {"quality": profile.sibling_quality if quality is None else quality}
+        if image_format == "AVIF":
+            options["speed"] = profile.sibling_speed
+        else:
+            # JPEG XL counts effort upwards from 1, fastest, to 9
+            options["effort"] = min(9, max(1, 10 - profile.sibling_speed))
+    if lossless and image_format != "AVIF":
+        options["lossless"] = True
+    with timed_stage(f"encode_{image_format.lower()}"):
+        image.save(output, image_format, **options, **extra)
+
+
+def _encode_webp(
+    image: Image.Image, profile: EncodingProfile, quality: int | None = None, lossless: bool = False, **extra: Any
+) -> BinaryIO:
+    """Encode an image as WebP into an in-memory stream positioned at the start."""
+    output = BytesIO()
+    encode_image(image, output, "WEBP", profile, quality, lossless, **extra)
+
+    # Reset output stream position for reading
+    output.seek(0)
+    return output
+
+
+def _save_with_siblings(
+    image: Image.Image,
+    path: Path,
+    sibling_formats: Sequence[str],
+    profile: EncodingProfile,
+    quality: int | None,
+    lossless: bool,
+    extra: dict[str, Any],
+) -> None:
+    """Write an image as WebP and as each sibling format next to it."""
+    with atomic_write(path) as output:
+        encode_image(image, output, "WEBP", profile, quality, lossless, **extra)
+    for name in sibling_formats:
+        image_format = SIBLING_FORMATS[name]
+        with atomic_write(path.with_suffix(image_format.suffix)) as output:
+            # Sibling formats have their own quality scale, so only the profile's applies
+            encode_image(image, output, image_format.pillow_format, profile, None, lossless, **extra)
+
+
+def _is_graphic(image: Image.Image) -> bool:
+    """Whether an opened source is a drawing with few colours rather than a photo."""
+    if image.format not in GRAPHIC_FORMATS:
+        return False
+    return image.mode in ("1", "P", "PA") or image.getcolors(GRAPHIC_MAX_COLORS) is not None
+
+
+def _metadata_options(image: Image.Image, strip_exif: bool) -> dict[str, Any]:
+    """
+    Encoder options carrying over the colour profile and, unless stripped, the EXIF data of a source.
+
+    The colour profile is always kept, as colours render wrong without it.
+    Kept EXIF data has its orientation reset, since the pixels are stored upright.
+    """
+    extra: dict[str, Any] = {}
+    icc_profile = image.info.get("icc_profile")
+    if icc_profile:
+        extra["icc_profile"] = icc_profile
+    if not strip_exif:
+        try:
+            exif = image.getexif()
+        except (AttributeError, KeyError, IndexError, ValueError, SyntaxError):
+            return extra
+        if exif:
+            if ExifTags.Base.Orientation in exif:
+                exif[ExifTags.Base.Orientation] = 1
+            extra["exif"] = exif.tobytes()
+    return extra
+
+
+def read_metadata(image: Image.Image) -> PhotoMetadata:
+    """
+    Read the capture time, camera, GPS position and orientation of an opened image.
+
+    The EXIF block is parsed once and every value is looked up by its tag, so
+    no pixel data is decoded. Capture times without a recorded UTC offset are
+    taken as UTC.
+
+    Args:
+        image: Opened source image
+
+    Returns:
+        PhotoMetadata with the values present in the EXIF data
+    """
+    try:
+        exif = image.getexif()
+        exif_ifd = exif.get_ifd(ExifTags.IFD.Exif)
+        gps_ifd = exif.get_ifd(ExifTags.IFD.GPSInfo)
+    except (AttributeError, KeyError, IndexError, ValueError, SyntaxError):
+        return PhotoMetadata()
+
+    taken_at = _parse_exif_datetime(
+        exif_ifd.get(ExifTags.Base.DateTimeOriginal), exif_ifd.get(ExifTags.Base.OffsetTimeOriginal)
+    ) or _parse_exif_datetime(exif.get(ExifTags.Base.DateTime), exif_ifd.get(ExifTags.Base.OffsetTime))
+    latitude = _gps_coordinate(gps_ifd.get(ExifTags.GPS.GPSLatitude), gps_ifd.get(ExifTags.GPS.GPSLatitudeRef), 90)
+    longitude = _gps_coordinate(gps_ifd.get(ExifTags.GPS.GPSLongitude), gps_ifd.get(ExifTags.GPS.GPSLongitudeRef), 180)
+    orientation = exif.get(ExifTags.Base.Orientation)
+    return PhotoMetadata(
+        taken_at=taken_at,
+        camera=_camera_name(exif.get(ExifTags.Base.Make), exif.get(ExifTags.Base.Model)),
+        latitude=latitude if longitude is not None else None,
+        longitude=longitude if latitude is not None else None,
+        orientation=orientation if isinstance(orientation, int) and 1 <= orientation <= 8 else 1,
+    )
+
+
+def _exif_text(value: object) -> str | None:
+    """Clean up an EXIF string, which cameras often pad with NUL bytes or spaces."""
+    if isinstance(value, bytes):
+        value = value.decode(errors="replace")
+    if not isinstance(value, str):
+        return None
+    return value.strip("\x00 ") or None
+
+
+def _parse_exif_datetime(value: object, offset: object) -> datetime | None:
+    """Parse an EXIF date and time with its optional UTC offset into a UTC datetime."""
+    text = _exif_text(value)
+    if text is None:
+        return None
+    try:
+        parsed = datetime.strptime(text, EXIF_DATETIME_FORMAT)
+    except ValueError:
+        # Unset clocks are recorded as "0000:00:00 00:00:00"
+        return None
+    offset_text = _exif_text(offset)
+    if offset_text is not None:
+        try:
+            return datetime.strptime(f"{text} {offset_text}", f"{EXIF_DATETIME_FORMAT} %z").astimezone(timezone.utc)
+        except ValueError:
+            pass
+    return parsed.replace(tzinfo=timezone.utc)
+
+
+def _gps_coordinate(value: object, ref: object, limit: float) -> float | None:
+    """Convert EXIF degrees, minutes and seconds with their hemisphere into signed decimal degrees."""
+    if not isinstance(value, tuple) or len(value) != 3:
+        return None
+    try:
+        degrees, minutes, seconds = (float(part) for part in value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    coordinate = degrees + minutes / 60 + seconds / 3600
+    if not math.isfinite(coordinate) or coordinate > limit:
+        return None
+    return -coordinate if _exif_text(ref) in ("S", "W") else coordinate
+
+
+def _camera_name(make: object, model: object) -> str | None:
+    """Combine the EXIF make and model, which often already starts with the make."""
+    make_text, model_text = _exif_text(make), _exif_text(model)
+    if model_text is None:
+        return make_text
+    if make_text is None or model_text.lower().startswith(make_text.split()[0].lower()):
+        return model_text[:CAMERA_MAX_LENGTH]
+    return f"{make_text} {model_text}"[:CAMERA_MAX_LENGTH]
 
 
 def _get_exif_orientation(image: Image.Image) -> int | None:
     """Get EXIF orientation value from image."""
     try:
-        exif = image.getexif()
-        if exif is not None:
-            for tag, value in exif.items():
-                if ExifTags.TAGS.get(tag) == "Orientation":
-                    return value
-    except (AttributeError, KeyError, IndexError):
-        pass
-    return None
-
-
-def _fix_orientation(image: Image.Image) -> Image.Image:
-    """Fix image orientation based on EXIF data."""
-    orientation = _get_exif_orientation(image)
+        return image.getexif().get(ExifTags.Base.Orientation)
+    except (AttributeError, KeyError, IndexError, ValueError, SyntaxError):
+        return None
+
+
+def _fix_orientation(image: Image.Image, orientation: int | None = None) -> Image.Image:
+    """Fix image orientation based on EXIF data, or on an orientation read beforehand."""
+    if orientation is None:
+        orientation = _get_exif_orientation(image)
 
     if orientation is None:
         return image
@@ -0,0 +1,380 @@
+"""Bulk import of photo files found on disk, with an optional directory watcher."""
+
+import asyncio
+import hashlib
+import json
+import time
+from collections.abc import AsyncIterator, Callable, Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from loguru import logger
+
+from fotacos.env import get_settings
+from fotacos.models import Photo, PhotoEventKind
+from fotacos.services.events import record_photo_events
+from fotacos.services.files import PHOTO_FILE_PATTERN, atomic_write, new_photo_filename, photo_urls
+from fotacos.services.ingest import CHUNK_SIZE, SNIFF_SIZE, sniff_image_format
+from fotacos.services.jobs import derivatives_signature, image_fields, store_derivatives
+from fotacos.services.storage import photo_keys
+from fotacos.services.unit_of_work import unit_of_work
+
+settings = get_settings()
+
+IMPORTABLE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp"}
+STATE_SAVE_INTERVAL = 5.0  # Seconds between writes of the import state file
+SETTLE_SECONDS = 2.0  # Files modified more recently may still be being copied
+
+
+@dataclass
+class ImportStats:
+    """Progress of an import run."""
+
+    found: int = 0
+    skipped: int = 0
+    imported: int = 0
+    duplicates: int = 0
+    failed: int = 0
+    deferred: int = 0
+    bytes_processed: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def processed(self) -> int:
+        """Files whose outcome is known."""
+        return self.skipped + self.imported + self.duplicates + self.failed
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the run started."""
+        return time.monotonic() - self.started
+
+    def describe(self) -> str:
+        """One-line progress summary with throughput."""
+        elapsed = max(self.elapsed, 1e-9)
+        handled = self.imported + self.duplicates + self.failed
+        return (
+            f"{self.processed}/{self.found} files: {self.imported} imported, {self.duplicates} duplicates, "
+            f"{self.failed} failed, {self.skipped} unchanged "
+            f"({handled / elapsed:.1f} files/s, {self.bytes_processed / elapsed / 1024 / 1024:.1f} MiB/s)"
+        )
+
+
+@dataclass(frozen=True)
+class _SourceFile:
+    """A candidate file with the stat values used to detect changes."""
+
+    path: Path
+    size: int
+    mtime_ns: int
+
+
+class ImportState:
+    """
+    Outcome of every file already handled, keyed by path, so a rerun skips unchanged files.
+
+    Files are recognised by size and modification time. The state is a JSON
+    file written atomically; losing it only costs re-hashing, as content that
+    is already stored is never imported twice.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """
+        Load the import state.
+
+        Args:
+            path: JSON file the state is kept in
+        """
+        self.path = path
+        self._files: dict[str, list] = {}
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        if path.exists():
+            try:
+                self._files = json.loads(path.read_text())
+            except (OSError, ValueError) as e:
+                logger.warning("Ignoring unreadable import state {}: {}", path, e)
+
+    def is_unchanged(self, source: _SourceFile) -> bool:
+        """Whether a file was handled before and has not changed since."""
+        return self._files.get(str(source.path), [None, None])[:2] == [source.size, source.mtime_ns]
+
+    def record(self, source: _SourceFile, outcome: str) -> None:
+        """Remember the outcome of a file."""
+        self._files[str(source.path)] = [source.size, source.mtime_ns, outcome]
+        self._dirty = True
+
+    def save(self, force: bool = False) -> None:
+        """Write the state if it changed, at most every few seconds unless forced."""
+        if not self._dirty or (not force and time.monotonic() - self._saved_at < STATE_SAVE_INTERVAL):
+            return
+        with atomic_write(self.path) as output:
+            output.write(json.dumps(self._files, separators=(",", ":")).encode())
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+
+def _hash_file(path: Path) -> tuple[str, str | None]:
+    """Hash a file and sniff its image format."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        header = source.read(SNIFF_SIZE)
+        digest.update(header)
+        while chunk := source.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest(), sniff_image_format(header)
+
+
+class PhotoImporter:
+    """
+    Imports image files into the library through the image worker.
+
+    Files are hashed and converted in parallel, then inserted in batches, each
+    batch in one transaction. Content that is already stored is skipped.
+    """
+
+    def __init__(
+        self,
+        state: ImportState,
+        batch_size: int,
+        concurrency: int,
+        remove_sources: bool = False,
+        on_progress: Callable[[ImportStats], None] | None = None,
+        on_batch: Callable[[], None] | None = None,
+    ) -> None:
+        """
+        Initialize the importer.
+
+        Args:
+            state: Record of files already handled
+            batch_size: Photos inserted per transaction
+            concurrency: Files hashed and converted at once
+            remove_sources: Delete source files once their photo is stored or found to be a duplicate
+            on_progress: Called with the statistics after every batch
+            on_batch: Called after photos were inserted, e.g. to invalidate caches
+        """
+        self.state = state
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.remove_sources = remove_sources
+        self.on_progress = on_progress
+        self.on_batch = on_batch
+
+    async def run(self, paths: Iterable[Path], settle_seconds: float = 0.0) -> ImportStats:
+        """
+        Import every new or changed image file under the given files and directories.
+
+        Args:
+            paths: Files and directories to scan recursively
+            settle_seconds: Leave files modified more recently than this for a later run
+
+        Returns:
+            Statistics of the run
+        """
+        stats = ImportStats()
+        sources = await asyncio.to_thread(self._collect, list(paths), settle_seconds, stats)
+        pending = [source for source in sources if not self.state.is_unchanged(source)]
+        stats.skipped = len(sources) - len(pending)
+        known_hashes: set[str] = set()
+        batch: list[tuple[_SourceFile, Photo]] = []
+        queue: asyncio.Queue[_SourceFile | None] = asyncio.Queue(maxsize=self.concurrency * 2)
+        results: asyncio.Queue[tuple[_SourceFile, Photo | str | None]] = asyncio.Queue()
+
+        tasks = [asyncio.create_task(self._feed(queue, pending))]
+        tasks += [
+            asyncio.create_task(self._convert_worker(queue, results, known_hashes)) for _ in range(self.concurrency)
+        ]
+        try:
+            for _ in pending:
+                source, result = await results.get()
+                if isinstance(result, Photo):
+                    batch.append((source, result))
+                    stats.bytes_processed += source.size
+                elif result is None:
+                    stats.duplicates += 1
+                    self.state.record(source, "duplicate")
+                    self._remove_source(source)
+                else:
+                    stats.failed += 1
+                    self.state.record(source, "failed")
+                    logger.warning("Failed to import {}: {}", source.path, result)
+                if len(batch) >= self.batch_size:
+                    await self._flush(batch, stats)
+            await self._flush(batch, stats)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.state.save(force=True)
+
+        logger.info("Import finished in {:.1f}s: {}", stats.elapsed, stats.describe())
+        return stats
+
+    def _collect(self, paths: list[Path], settle_seconds: float, stats: ImportStats) -> list[_SourceFile]:
+        """List the importable files under the given paths, skipping generated photo files."""
+        excluded = {
+            (settings.upload_dir / "thumbnails").resolve(),
+            settings.staging_dir.resolve(),
+            settings.variant_cache_dir.resolve(),
+        }
+        upload_dir = settings.upload_dir.resolve()
+        fresh_after = time.time_ns() - int(settle_seconds * 1e9)
+        sources = []
+        for root in paths:
+            candidates = [root] if root.is_file() else root.rglob("*")
+            for path in candidates:
+                path = path.resolve()
+                if (
+                    path.suffix.lower() not in IMPORTABLE_EXTENSIONS
+                    or path.name.startswith(".")
+                    or any(path.is_relative_to(directory) for directory in excluded)
+                    # Files written by the application itself
+                    or (path.is_relative_to(upload_dir) and PHOTO_FILE_PATTERN.match(path.name))
+                    or not path.is_file()
+                ):
+                    continue
+                stat = path.stat()
+                if stat.st_mtime_ns > fresh_after:
+                    stats.deferred += 1
+                    continue
+                sources.append(_SourceFile(path, stat.st_size, stat.st_mtime_ns))
+        stats.found = len(sources)
+        return sources
+
+    async def _feed(self, queue: asyncio.Queue, sources: list[_SourceFile]) -> None:
+        """Queue files for the convert workers, then one stop marker per worker."""
+        for source in sources:
+            await queue.put(source)
+        for _ in range(self.concurrency):
+            await queue.put(None)
+
+    async def _convert_worker(
+        self,
+        queue: asyncio.Queue,
+        results: asyncio.Queue,
+        known_hashes: set[str],
+    ) -> None:
+        """Hash and convert queued files, reporting a Photo, None for duplicates or an error message."""
+        while (source := await queue.get()) is not None:
+            try:
+                result = await self._convert(source, known_hashes)
+            except Exception as e:
+                result = str(e) or type(e).__name__
+            await results.put((source, result))
+
+    async def _convert(self, source: _SourceFile, known_hashes: set[str]) -> Photo | str | None:
+        """Convert one file into an unsaved Photo, unless its content is already stored or queued."""
+        content_hash, image_format = await asyncio.to_thread(_hash_file, source.path)
+        if image_format is None:
+            return "not a supported image"
+        if content_hash in known_hashes or await Photo.exists(content_hash=content_hash):
+            return None
+        known_hashes.add(content_hash)
+
+        webp_filename = new_photo_filename()
+        try:
+            saved = await store_derivatives(source.path, webp_filename)
+        except Exception:
+            known_hashes.discard(content_hash)
+            raise
+        return Photo(
+            **photo_urls(webp_filename),
+            **image_fields(saved),
+            content_hash=content_hash,
+            derivatives_version=derivatives_signature(),
+        )
+
+    async def _flush(self, batch: list[tuple[_SourceFile, Photo]], stats: ImportStats) -> None:
+        """Insert a batch of converted photos in one transaction and record the outcome."""
+        if batch:
+            photos = [photo for _, photo in batch]
+            async with unit_of_work() as files:
+                for photo in photos:
+                    files.adopt(*photo_keys(photo.filename))
+                # Content uploaded meanwhile is skipped so the rest of the batch survives
+                await Photo.bulk_create(photos, ignore_conflicts=True)
+                inserted = dict(
+                    await Photo.filter(filename__in=[photo.filename for photo in photos]).values_list(
+                        "content_hash", "id"
+                    )
+                )
+                for photo in photos:
+                    if photo.content_hash not in inserted:
+                        files.delete(*photo_keys(photo.filename))
+                await record_photo_events(PhotoEventKind.ADDED, inserted.values())
+
+            for source, photo in batch:
+                outcome = "imported" if photo.content_hash in inserted else "duplicate"
+                if outcome == "imported":
+                    stats.imported += 1
+                else:
+                    stats.duplicates += 1
+                self.state.record(source, outcome)
+                self._remove_source(source)
+            batch.clear()
+            if self.on_batch is not None:
+                self.on_batch()
+
+        self.state.save()
+        if self.on_progress is not None:
+            self.on_progress(stats)
+
+    def _remove_source(self, source: _SourceFile) -> None:
+        """Delete a source file that is now stored in the library, if requested."""
+        if self.remove_sources:
+            source.path.unlink(missing_ok=True)
+
+
+def import_roots(paths: Iterable[Path]) -> list[Path]:
+    """Resolve the paths to import from, defaulting to the configured directories."""
+    roots = [Path(path) for path in paths] or settings.import_dirs or [settings.upload_dir]
+    for root in roots:
+        if not root.exists():
+            logger.warning("Import path {} does not exist", root)
+    return [root for root in roots if root.exists()]
+
+
+def get_import_state() -> ImportState:
+    """Load the import state kept in the staging directory."""
+    return ImportState(settings.staging_dir / "import-state.json")
+
+
+async def watch_directories(
+    importer: PhotoImporter,
+    paths: list[Path],
+    poll_interval: float,
+) -> AsyncIterator[ImportStats]:
+    """
+    Import new files whenever the watched directories change.
+
+    Uses inotify through watchfiles when it is installed and falls back to
+    rescanning every `poll_interval` seconds. Each pass is an incremental
+    scan, so missed events only delay an import until the next one. Files
+    still being copied are retried once they have settled.
+
+    Args:
+        importer: Importer used for every pass
+        paths: Directories to watch
+        poll_interval: Seconds between rescans without change notifications
+
+    Yields:
+        Statistics of each pass that found files to import
+    """
+    try:
+        from watchfiles import awatch
+    except ImportError:
+        awatch = None
+        logger.info("watchfiles is not installed, rescanning every {}s", poll_interval)
+
+    changes = awatch(*paths, rust_timeout=int(poll_interval * 1000), yield_on_timeout=True) if awatch else None
+    while True:
+        stats = await importer.run(paths, settle_seconds=SETTLE_SECONDS)
+        if stats.processed > stats.skipped:
+            yield stats
+        if stats.deferred:
+            # Come back once the files being copied have settled
+            await asyncio.sleep(SETTLE_SECONDS)
+        elif changes is not None:
+            await changes.__anext__()
+        else:
+            await asyncio.sleep(poll_interval)
@@ -0,0 +1,107 @@
+"""Streaming ingestion of uploaded files into a staging area."""
+
+import hashlib
+import os
+import tempfile
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastapi import UploadFile
+
+CHUNK_SIZE = 1024 * 1024
+SNIFF_SIZE = 16
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the configured size limit."""
+
+    def __init__(self, max_bytes: int) -> None:
+        """Initialize the error with the limit that was exceeded."""
+        super().__init__(f"Upload exceeds the maximum size of {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+class UnsupportedImageError(Exception):
+    """Raised when an upload does not start with a known image signature."""
+
+
+@dataclass(frozen=True)
+class IngestedFile:
+    """An upload spooled to the staging area."""
+
+    path: Path
+    size: int
+    content_hash: str
+    image_format: str
+
+
+def sniff_image_format(header: bytes) -> str | None:
+    """
+    Detect the image format from the first bytes of a file.
+
+    Args:
+        header: At least the first 12 bytes of the file
+
+    Returns:
+        Pillow format name, or None if the signature is not a supported image
+    """
+    if header.startswith(b"\xff\xd8\xff"):
+        return "JPEG"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "PNG"
+    if header.startswith((b"GIF87a", b"GIF89a")):
+        return "GIF"
+    if header.startswith(b"RIFF") and header[8:12] == b"WEBP":
+        return "WEBP"
+    if header.startswith(b"BM"):
+        return "BMP"
+    return None
+
+
+@asynccontextmanager
+async def spool_upload(file: UploadFile, staging_dir: Path, max_bytes: int) -> AsyncIterator[IngestedFile]:
+    """
+    Stream an upload into a staging file, hashing and size-checking it on the way.
+
+    The body is read in fixed-size chunks, so it is never held in memory as a
+    whole. The staging file is removed when the context exits; move it away
+    first to keep it.
+
+    Args:
+        file: Uploaded file to ingest
+        staging_dir: Directory for the staging file
+        max_bytes: Maximum accepted size in bytes
+
+    Yields:
+        The ingested file with its size, SHA-256 hash and sniffed format
+
+    Raises:
+        UploadTooLargeError: If the upload is larger than `max_bytes`
+        UnsupportedImageError: If the content is not a supported image format
+    """
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(dir=staging_dir, suffix=".upload")
+    path = Path(temp_name)
+    try:
+        digest = hashlib.sha256()
+        size = 0
+        image_format = None
+        with os.fdopen(fd, "wb") as output:
+            while chunk := await file.read(CHUNK_SIZE):
+                if image_format is None:
+                    image_format = sniff_image_format(chunk[:SNIFF_SIZE])
+                    if image_format is None:
+                        raise UnsupportedImageError
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(max_bytes)
+                digest.update(chunk)
+                output.write(chunk)
+        if image_format is None:
+            raise UnsupportedImageError
+
+        yield IngestedFile(path=path, size=size, content_hash=digest.hexdigest(), image_format=image_format)
+    finally:
+        path.unlink(missing_ok=True)
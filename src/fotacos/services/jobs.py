@@ -0,0 +1,399 @@
+"""Durable background job queue for derivative generation."""
+
+import asyncio
+import hashlib
+from collections.abc import Callable
+from contextlib import suppress
+from dataclasses import replace
+from datetime import timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+from tortoise import timezone
+from tortoise.expressions import Q
+from tortoise.transactions import in_transaction
+
+from fotacos.env import get_settings
+from fotacos.models import Job, JobKind, JobStatus, Photo, PhotoEventKind, PhotoOrientation, PhotoStatus
+from fotacos.services.encoding import (
+    SIBLING_FORMATS,
+    EncodingProfile,
+    get_encoding_profile,
+    resolve_sibling_formats,
+)
+from fotacos.services.events import record_photo_events
+from fotacos.services.images import SavedImage, save_image
+from fotacos.services.storage import full_image_key, get_storage, sibling_key, thumbnail_key
+from fotacos.services.worker import get_image_worker
+
+settings = get_settings()
+
+
+def derivatives_signature() -> str:
+    """Describe the settings derivatives are generated with, to detect when they change."""
+    return f"thumb:{settings.thumbnail_size}:q{settings.thumbnail_quality}"
+
+
+def pending_original_path(filename: str) -> Path:
+    """Location of an uploaded original waiting for its derivatives to be generated."""
+    return settings.staging_dir / "originals" / filename
+
+
+async def store_derivatives(
+    source_path: Path,
+    filename: str,
+    include_full: bool = True,
+    profile: EncodingProfile | None = None,
+    formats: list[str] | None = None,
+) -> SavedImage:
+    """
+    Generate the derivatives of a photo on the image worker and put them in storage.
+
+    The worker writes into the staging directory, from where each output is
+    moved or uploaded to storage. If storing fails part way, the outputs of a
+    new photo that were already stored are removed again.
+
+    Args:
+        source_path: Local image the derivatives are generated from
+        filename: Stored filename of the photo
+        include_full: Also store the full-size image, False when regenerating the thumbnail from it
+        profile: Encoding profile, default the one configured in settings
+        formats: Sibling formats encoded next to each WebP output, default the ones configured in settings
+
+    Returns:
+        SavedImage describing the full-size image
+    """
+    storage = get_storage()
+    profile = profile or get_encoding_profile()
+    if not include_full:
+        # The source is the stored full image, whose dimensions the photo keeps describing
+        profile = replace(profile, max_dimension=None)
+    formats = resolve_sibling_formats(formats)
+    work_dir = settings.staging_dir / "work"
+    full_path = work_dir / filename if include_full else None
+    thumbnail_path = work_dir / "thumbnails" / filename
+    webp_outputs = [(thumbnail_key(filename), thumbnail_path)]
+    if full_path is not None:
+        webp_outputs.insert(0, (full_image_key(filename), full_path))
+    outputs = [(key, path, "image/webp") for key, path in webp_outputs] + [
+        (sibling_key(key, name), path.with_suffix(SIBLING_FORMATS[name].suffix), SIBLING_FORMATS[name].media_type)
+        for key, path in webp_outputs
+        for name in formats
+    ]
+
+    stored = []
+    try:
+        saved = await get_image_worker().run(
+            save_image,
+            source_path,
+            full_path,
+            {settings.thumbnail_size: thumbnail_path},
+            None,
+            None,
+            profile,
+            formats,
+            wait=True,
+        )
+        for key, path, media_type in outputs:
+            await storage.put_file(key, path, media_type)
+            stored.append(key)
+    except BaseException:
+        if include_full:
+            for key in stored:
+                await storage.delete(key)
+        raise
+    finally:
+        for _, path, _ in outputs:
+            path.unlink(missing_ok=True)
+    return saved
+
+
+def image_fields(saved: SavedImage) -> dict[str, Any]:
+    """
+    Photo fields describing a saved image and the capture details of its source.
+
+    Capture details are only included when the source recorded them, so
+    regenerating from a stored image, which carries no EXIF data, keeps them.
+    """
+    values: dict[str, Any] = {
+        "file_size": saved.file_size,
+        "width": saved.width,
+        "height": saved.height,
+        "orientation": PhotoOrientation.of(saved.width, saved.height),
+    }
+    if saved.placeholder is not None:
+        values["blurhash"] = saved.placeholder.blurhash
+        values["dominant_color"] = saved.placeholder.dominant_color
+    metadata = saved.metadata
+    if metadata.taken_at is not None:
+        values["taken_at"] = metadata.taken_at
+    if metadata.camera is not None:
+        values["camera"] = metadata.camera
+    if metadata.latitude is not None and metadata.longitude is not None:
+        values["latitude"] = metadata.latitude
+        values["longitude"] = metadata.longitude
+    return values
+
+
+async def enqueue_derivatives(photos: list[Photo]) -> int:
+    """
+    Queue derivative generation for photos that do not already have a pending job.
+
+    Returns:
+        Number of jobs created
+    """
+    queued = set(
+        await Job.filter(
+            kind=JobKind.DERIVATIVES,
+            status__in=[JobStatus.PENDING, JobStatus.RUNNING],
+            photo_id__in=[photo.id for photo in photos],
+        ).values_list("photo_id", flat=True)
+    )
+    now = timezone.now()
+    jobs = [
+        Job(kind=JobKind.DERIVATIVES, photo_id=photo.id, run_after=now) for photo in photos if photo.id not in queued
+    ]
+    if jobs:
+        await Job.bulk_create(jobs)
+    return len(jobs)
+
+
+async def enqueue_stale_derivatives() -> int:
+    """
+    Queue regeneration for photos whose derivatives were built with different settings or lack a placeholder.
+
+    Returns:
+        Number of jobs created
+    """
+    signature = derivatives_signature()
+    stale = await Photo.filter(
+        Q(derivatives_version__isnull=True) | Q(derivatives_version__not=signature) | Q(blurhash__isnull=True),
+        status=PhotoStatus.READY,
+    ).only("id")
+    return await enqueue_derivatives(stale)
+
+
+def _versioned_url(url: str, version: str) -> str:
+    """Replace the version query of a static file URL."""
+    token = hashlib.blake2b(version.encode(), digest_size=4).hexdigest()
+    return f"{url.partition('?')[0]}?v={token}"
+
+
+class JobRunner:
+    """Claims due jobs from the database and executes them with retries."""
+
+    def __init__(
+        self,
+        concurrency: int,
+        max_attempts: int,
+        retry_delay: float,
+        poll_interval: float,
+        lease_timeout: float,
+    ) -> None:
+        """
+        Initialize the job runner.
+
+        Args:
+            concurrency: Maximum number of jobs executed at once
+            max_attempts: Attempts before a job is marked as failed
+            retry_delay: Base delay in seconds before a retry, doubled on each attempt
+            poll_interval: Seconds between database polls when not notified
+            lease_timeout: Seconds without a heartbeat before a running job is claimed again
+        """
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.lease_timeout = lease_timeout
+        self.on_photo_change: Callable[[], None] | None = None
+        self._task: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._running: set[asyncio.Task] = set()
+
+    def start(self, recover: bool = True) -> None:
+        """
+        Start claiming jobs in the background of the running event loop.
+
+        Args:
+            recover: Re-queue jobs left running by a previous shutdown first; only
+                safe when no other process runs jobs on the same database
+        """
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(recover))
+
+    async def stop(self) -> None:
+        """Stop the runner; interrupted jobs are picked up again on the next start."""
+        tasks = [task for task in (self._task, *self._running) if task is not None]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        self._task = None
+        self._running.clear()
+
+    def notify(self) -> None:
+        """Wake the runner up after a job was enqueued."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self, recover: bool) -> None:
+        """Claim and execute jobs until cancelled."""
+        if recover:
+            await recover_interrupted_jobs()
+
+        slots = asyncio.Semaphore(self.concurrency)
+        while True:
+            await slots.acquire()
+            try:
+                job = await self._claim_next()
+            except Exception:
+                # E.g. the database stayed locked past its busy timeout; the runner must outlive it
+                slots.release()
+                logger.exception("Could not claim the next job, retrying")
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if job is None:
+                slots.release()
+                await self._wait_for_work()
+                continue
+
+            task = asyncio.create_task(self._execute(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _wait_for_work(self) -> None:
+        """Sleep until notified or until the next poll is due."""
+        if self._wakeup is None:
+            return
+        self._wakeup.clear()
+        with suppress(TimeoutError):
+            await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+
+    async def _claim_next(self) -> Job | None:
+        """
+        Atomically move the oldest due job to running.
+
+        Running jobs whose lease expired count as due: the process running
+        them stopped renewing it, typically because it crashed.
+        """
+        while True:
+            now = timezone.now()
+            claimable = Q(status=JobStatus.PENDING, run_after__lte=now) | Q(
+                status=JobStatus.RUNNING, updated_at__lt=now - timedelta(seconds=self.lease_timeout)
+            )
+            job = await Job.filter(claimable).order_by("run_after", "id").first()
+            if job is None:
+                return None
+            # Conditional update so two runners never claim the same job
+            claimed = await Job.filter(claimable, id=job.id).update(
+                status=JobStatus.RUNNING, attempts=job.attempts + 1, updated_at=now
+            )
+            if claimed:
+                if job.status == JobStatus.RUNNING:
+                    logger.warning("Took over {}, whose lease expired", job)
+                job.status = JobStatus.RUNNING
+                job.attempts += 1
+                return job
+
+    async def _execute(self, job: Job) -> None:
+        """Run a claimed job and record its outcome."""
+        logger.debug("Running {} (attempt {})", job, job.attempts)
+        heartbeat = asyncio.create_task(self._renew_lease(job))
+        try:
+            await self._run_derivatives(job)
+        except Exception as e:
+            await self._record_failure(job, e)
+        else:
+            job.status = JobStatus.DONE
+            job.last_error = None
+            await job.save(update_fields=["status", "last_error", "updated_at"])
+            logger.info("Finished {}", job)
+        finally:
+            heartbeat.cancel()
+
+    async def _renew_lease(self, job: Job) -> None:
+        """Keep the lease of a running job, so other runners leave it alone while it makes progress."""
+        while True:
+            await asyncio.sleep(self.lease_timeout / 3)
+            try:
+                await Job.filter(id=job.id, status=JobStatus.RUNNING).update(updated_at=timezone.now())
+            except Exception:
+                logger.exception("Could not renew the lease of {}", job)
+
+    async def _record_failure(self, job: Job, error: Exception) -> None:
+        """Schedule a retry with exponential backoff, or mark the job and its photo as failed."""
+        job.last_error = str(error)
+        if job.attempts >= self.max_attempts:
+            job.status = JobStatus.FAILED
+            async with in_transaction():
+                await Photo.filter(id=job.photo_id).update(status=PhotoStatus.FAILED)
+                await record_photo_events(PhotoEventKind.UPDATED, [job.photo_id])
+            self._photo_changed()
+            logger.error("{} failed permanently after {} attempts: {}", job, job.attempts, error)
+        else:
+            job.status = JobStatus.PENDING
+            job.run_after = timezone.now() + timedelta(seconds=self.retry_delay * 2 ** (job.attempts - 1))
+            logger.warning("{} failed (attempt {}), retrying at {}: {}", job, job.attempts, job.run_after, error)
+        await job.save(update_fields=["status", "last_error", "run_after", "updated_at"])
+
+    async def _run_derivatives(self, job: Job) -> None:
+        """Generate the full WebP image and thumbnail of a photo."""
+        photo = await Photo.get_or_none(id=job.photo_id)
+        if photo is None:
+            logger.debug("Photo of {} was deleted, nothing to generate", job)
+            return
+        original_path = pending_original_path(photo.filename)
+        options = job.options or {}
+        profile = get_encoding_profile(options.get("profile"))
+        formats = options.get("formats")
+        if original_path.exists():
+            saved = await store_derivatives(original_path, photo.filename, profile=profile, formats=formats)
+        else:
+            # Regenerating after a settings change: the full WebP image is the source
+            async with get_storage().local_copy(full_image_key(photo.filename)) as full_image:
+                saved = await store_derivatives(
+                    full_image, photo.filename, include_full=False, profile=profile, formats=formats
+                )
+            # Thumbnails are served as immutable, so the rewritten one needs a new URL
+            photo.thumbnail_url = _versioned_url(photo.thumbnail_url, derivatives_signature())
+
+        values = image_fields(saved)
+        for name, value in values.items():
+            setattr(photo, name, value)
+        photo.status = PhotoStatus.READY
+        photo.derivatives_version = derivatives_signature()
+        async with in_transaction():
+            await photo.save(update_fields=["status", "derivatives_version", "thumbnail_url", *values])
+            await record_photo_events(PhotoEventKind.UPDATED, [photo.id])
+        original_path.unlink(missing_ok=True)
+        self._photo_changed()
+
+    def _photo_changed(self) -> None:
+        """Tell interested parties that a photo's status or files changed, once the change committed."""
+        if self.on_photo_change is not None:
+            self.on_photo_change()
+
+
+async def recover_interrupted_jobs() -> int:
+    """Re-queue the jobs left running by a previous shutdown, returning how many there were."""
+    recovered = await Job.filter(status=JobStatus.RUNNING).update(status=JobStatus.PENDING)
+    if recovered:
+        logger.info("Re-queued {} jobs interrupted by the previous shutdown", recovered)
+    return recovered
+
+
+@lru_cache
+def get_job_runner() -> JobRunner:
+    """Get the shared job runner configured from settings."""
+    return JobRunner(
+        concurrency=settings.image_workers,
+        max_attempts=settings.job_max_attempts,
+        retry_delay=settings.job_retry_delay,
+        poll_interval=settings.job_poll_interval,
+        lease_timeout=settings.job_lease_timeout,
+    )
@@ -0,0 +1,110 @@
+"""Tiny placeholders clients paint while the thumbnail of a photo downloads."""
+
+import math
+
+from PIL import Image
+
+# Edge of the image the placeholders are computed from; BlurHash only keeps a few frequencies anyway
+PLACEHOLDER_SIZE = 32
+BLURHASH_COMPONENTS = (4, 3)
+DOMINANT_PALETTE_COLORS = 8
+BASE83_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def placeholder_source(image: Image.Image) -> Image.Image:
+    """Downscale an RGB rendition to the size placeholders are computed from."""
+    if max(image.size) <= PLACEHOLDER_SIZE:
+        return image
+    copy = image.copy()
+    copy.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    return copy
+
+
+def blurhash(image: Image.Image, components: tuple[int, int] = BLURHASH_COMPONENTS) -> str:
+    """
+    Encode an RGB image as a BlurHash string.
+
+    Args:
+        image: RGB image, ideally already downscaled with `placeholder_source()`
+        components: Horizontal and vertical number of cosine components, 1 to 9 each
+
+    Returns:
+        The BlurHash, 6 characters plus 2 per component after the first
+    """
+    x_components, y_components = components
+    width, height = image.size
+    # Channels of every pixel in a row, r, g, b, r, g, b...
+    linear = [_SRGB_TO_LINEAR[value] for value in image.tobytes()]
+    cos_x = [[math.cos(math.pi * i * x / width) for x in range(width)] for i in range(x_components)]
+    cos_y = [[math.cos(math.pi * j * y / height) for y in range(height)] for j in range(y_components)]
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            scale = (1 if i == j == 0 else 2) / (width * height)
+            r = g = b = 0.0
+            for y in range(height):
+                row = y * width
+                basis_y = cos_y[j][y]
+                for x in range(width):
+                    basis = cos_x[i][x] * basis_y
+                    offset = (row + x) * 3
+                    r += basis * linear[offset]
+                    g += basis * linear[offset + 1]
+                    b += basis * linear[offset + 2]
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    encoded = _base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        quantized_max = max(0, min(82, math.floor(max(abs(value) for factor in ac for value in factor) * 166 - 0.5)))
+        maximum = (quantized_max + 1) / 166
+        encoded += _base83(quantized_max, 1)
+    else:
+        maximum = 1.0
+        encoded += _base83(0, 1)
+    encoded += _base83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+    for factor in ac:
+        r, g, b = (_quantize_ac(value / maximum) for value in factor)
+        encoded += _base83(r * 19 * 19 + g * 19 + b, 2)
+    return encoded
+
+
+def dominant_color(image: Image.Image) -> str:
+    """
+    Most common colour of an RGB image, after reducing it to a small palette.
+
+    Returns:
+        The colour as ``#rrggbb``
+    """
+    palette_image = image.quantize(DOMINANT_PALETTE_COLORS, method=Image.Quantize.MEDIANCUT)
+    _, index = max(palette_image.getcolors(DOMINANT_PALETTE_COLORS))
+    palette = palette_image.getpalette() or []
+    r, g, b = palette[index * 3 : index * 3 + 3]
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def _srgb_to_linear(value: int) -> float:
+    """Convert an sRGB channel value to linear light."""
+    v = value / 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+_SRGB_TO_LINEAR = [_srgb_to_linear(value) for value in range(256)]
+
+
+def _linear_to_srgb(value: float) -> int:
+    """Convert a linear light value to an sRGB channel value."""
+    v = max(0.0, min(1.0, value))
+    srgb = v * 12.92 if v <= 0.0031308 else 1.055 * v ** (1 / 2.4) - 0.055
+    return math.floor(srgb * 255 + 0.5)
+
+
+def _quantize_ac(value: float) -> int:
+    """Quantize an AC component, scaled by the maximum to [-1, 1], to 0-18."""
+    return max(0, min(18, math.floor(math.copysign(abs(value) ** 0.5, value) * 9 + 9.5)))
+
+
+def _base83(value: int, length: int) -> str:
+    """Encode an integer in the fixed number of base 83 digits BlurHash uses."""
+    return "".join(BASE83_ALPHABET[value // 83 ** (length - digit) % 83] for digit in range(1, length + 1))
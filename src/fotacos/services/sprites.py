@@ -0,0 +1,322 @@
+"""Sprite sheets packing the thumbnails of a listing page into one image, kept in a size-bounded disk cache."""
+
+import asyncio
+import hashlib
+import json
+import math
+import re
+from collections import OrderedDict
+from collections.abc import Hashable, Sequence
+from contextlib import AsyncExitStack
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+from loguru import logger
+
+from fotacos.env import get_settings
+from fotacos.services.images import render_sprite_sheet
+from fotacos.services.storage import Storage, get_storage, thumbnail_key
+from fotacos.services.worker import get_image_worker
+
+# Sheets are named after a digest of their content, so a name always refers to the same image
+SPRITE_NAME = re.compile(r"[0-9a-f]{32}\.webp")
+# Lossless copy of a sheet that rebuilds copy cells from, never served
+CELLS_SUFFIX = ".cells.webp"
+
+
+@dataclass(frozen=True)
+class SpritePhoto:
+    """A photo whose thumbnail goes into a sprite sheet."""
+
+    photo_id: int
+    filename: str
+    # Derivatives signature of the thumbnail, so a regenerated thumbnail gets a new sheet
+    version: str | None = None
+
+
+@dataclass(frozen=True)
+class SpriteTile:
+    """Where the thumbnail of a photo is in a sprite sheet."""
+
+    photo_id: int
+    x: int
+    y: int
+    size: int
+
+
+@dataclass(frozen=True)
+class SpriteSheet:
+    """Thumbnails of a sequence of photos in square cells, filled left to right, top to bottom."""
+
+    name: str
+    photos: tuple[SpritePhoto, ...]
+    columns: int
+    tile_size: int
+
+    @property
+    def width(self) -> int:
+        """Width of the sheet in pixels."""
+        return self.columns * self.tile_size
+
+    @property
+    def height(self) -> int:
+        """Height of the sheet in pixels."""
+        return math.ceil(len(self.photos) / self.columns) * self.tile_size
+
+    def box(self, index: int) -> tuple[int, int, int, int]:
+        """Box (left, upper, right, lower) of the cell at an index."""
+        x = (index % self.columns) * self.tile_size
+        y = (index // self.columns) * self.tile_size
+        return x, y, x + self.tile_size, y + self.tile_size
+
+    def tiles(self) -> list[SpriteTile]:
+        """Where each photo is in the sheet, in order."""
+        return [
+            SpriteTile(photo.photo_id, *self.box(index)[:2], self.tile_size) for index, photo in enumerate(self.photos)
+        ]
+
+
+@dataclass
+class SpriteCacheStats:
+    """Counters of the sprite sheet cache."""
+
+    hits: int = 0
+    builds: int = 0
+    tiles_copied: int = 0
+    tiles_rendered: int = 0
+    evictions: int = 0
+
+
+class SpriteCache:
+    """
+    Disk cache of sprite sheets, bounded by total size and evicted least recently used first.
+
+    The last sheet built for each page is remembered, so when the photos of
+    the page change, cells of photos that stay on it are copied from that
+    sheet and only the thumbnails of new photos are decoded. Cells are copied
+    from a lossless copy kept next to each sheet, so they do not degrade with
+    every rebuild. Concurrent requests for a sheet that is being built wait
+    for the same build.
+    """
+
+    def __init__(
+        self, storage: Storage, cache_dir: Path, max_bytes: int, tile_size: int, quality: int, max_pages: int
+    ) -> None:
+        """
+        Initialize the sprite sheet cache.
+
+        Args:
+            storage: Storage the thumbnails are read from
+            cache_dir: Directory the sheets are stored in
+            max_bytes: Total size of cached sheets before the least recently used are evicted
+            tile_size: Edge of the square cells in pixels
+            quality: Encoder quality of the sheets (0-100)
+            max_pages: Number of pages whose last sheet is remembered for incremental rebuilds
+        """
+        self.storage = storage
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.tile_size = tile_size
+        self.quality = quality
+        self.max_pages = max_pages
+        self.stats = SpriteCacheStats()
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._total_bytes = 0
+        self._pages: OrderedDict[Hashable, SpriteSheet] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task[None]] = {}
+
+    @property
+    def total_bytes(self) -> int:
+        """Size of all cached sheets."""
+        return self._total_bytes
+
+    def load(self) -> None:
+        """Index sheets left on disk by a previous run, oldest modification first."""
+        self._entries.clear()
+        self._total_bytes = 0
+        if not self.cache_dir.exists():
+            return
+        files = [path for path in self.cache_dir.iterdir() if SPRITE_NAME.fullmatch(path.name)]
+        stats = sorted(((path.stat(), path) for path in files), key=lambda item: item[0].st_mtime)
+        for stat, path in stats:
+            self._add(path.name, stat.st_size + self._cells_size(path.name))
+        self._evict()
+        logger.debug("Indexed {} cached sprite sheets ({} bytes)", len(self._entries), self._total_bytes)
+
+    def layout(self, photos: Sequence[SpritePhoto]) -> SpriteSheet:
+        """Lay out the sheet of a sequence of photos, as square as possible."""
+        key = [self.tile_size, self.quality, [[photo.filename, photo.version] for photo in photos]]
+        digest = hashlib.blake2b(json.dumps(key).encode(), digest_size=16).hexdigest()
+        return SpriteSheet(
+            name=f"{digest}.webp",
+            photos=tuple(photos),
+            columns=max(1, math.ceil(math.sqrt(len(photos)))),
+            tile_size=self.tile_size,
+        )
+
+    def cells_path(self, name: str) -> Path:
+        """Path of the lossless cells of a sheet."""
+        return self.cache_dir / f"{name.removesuffix('.webp')}{CELLS_SUFFIX}"
+
+    def path(self, name: str) -> Path | None:
+        """Path of a cached sheet, None if there is no such sheet."""
+        if not SPRITE_NAME.fullmatch(name):
+            return None
+        path = self.cache_dir / name
+        if not path.exists():
+            return None
+        if name in self._entries:
+            self._entries.move_to_end(name)
+        return path
+
+    async def get(self, page: Hashable, photos: Sequence[SpritePhoto]) -> SpriteSheet | None:
+        """
+        Get the sheet of a page of photos, building it on the image worker if it is not cached.
+
+        Args:
+            page: Key of the page, typically the listing parameters
+            photos: Photos of the page in order, all with a thumbnail
+
+        Returns:
+            The sheet, None if there are no photos
+
+        Raises:
+            FileNotFoundError: If the thumbnail of a photo is not in storage
+        """
+        if not photos:
+            return None
+        sheet = self.layout(photos)
+        previous = self._pages.pop(page, None)
+        self._pages[page] = sheet
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+
+        path = self.cache_dir / sheet.name
+        if path.exists():
+            self.stats.hits += 1
+            if sheet.name in self._entries:
+                self._entries.move_to_end(sheet.name)
+            else:
+                # Built by another web worker sharing the directory
+                self._add(sheet.name, path.stat().st_size + self._cells_size(sheet.name))
+                self._evict()
+            return sheet
+        if sheet.name in self._entries:
+            # Evicted or discarded by another web worker
+            self._total_bytes -= self._entries.pop(sheet.name)
+
+        task = self._inflight.get(sheet.name)
+        if task is None:
+            task = asyncio.create_task(self._build(sheet, previous))
+            self._inflight[sheet.name] = task
+            task.add_done_callback(lambda _: self._inflight.pop(sheet.name, None))
+        # Shielded so a client disconnecting does not cancel the build other requests wait on
+        await asyncio.shield(task)
+        return sheet
+
+    async def _build(self, sheet: SpriteSheet, previous: SpriteSheet | None) -> None:
+        """Build a sheet, copying cells from the previous sheet of its page, and evict old sheets."""
+        copied: dict[SpritePhoto, tuple[int, int, int, int]] = {}
+        previous_cells = None
+        if previous is not None and self.path(previous.name) is not None:
+            copied = {photo: previous.box(index) for index, photo in enumerate(previous.photos)}
+            previous_cells = self.cells_path(previous.name)
+        try:
+            tiles, size = await self._render(sheet, previous_cells, copied)
+        except FileNotFoundError:
+            if not copied:
+                raise
+            # The previous sheet was evicted meanwhile, by this or another web worker
+            logger.debug("Previous sheet of {} is gone, rendering every cell", sheet.name)
+            tiles, size = await self._render(sheet, None, {})
+
+        rendered = sum(1 for _, box in tiles if box is None)
+        self.stats.builds += 1
+        self.stats.tiles_rendered += rendered
+        self.stats.tiles_copied += len(tiles) - rendered
+        self._add(sheet.name, size)
+        self._evict()
+        logger.debug(
+            "Built sprite sheet {} of {} photos, {} copied from the previous sheet ({} bytes)",
+            sheet.name,
+            len(tiles),
+            len(tiles) - rendered,
+            size,
+        )
+
+    async def _render(
+        self,
+        sheet: SpriteSheet,
+        previous_cells: Path | None,
+        copied: dict[SpritePhoto, tuple[int, int, int, int]],
+    ) -> tuple[list[tuple[Path, tuple[int, int, int, int] | None]], int]:
+        """Render a sheet on the image worker, returning the source of each cell and the size on disk."""
+        tiles: list[tuple[Path, tuple[int, int, int, int] | None]] = []
+        async with AsyncExitStack() as stack:
+            for photo in sheet.photos:
+                box = copied.get(photo)
+                if box is not None and previous_cells is not None:
+                    tiles.append((previous_cells, box))
+                else:
+                    source = await stack.enter_async_context(self.storage.local_copy(thumbnail_key(photo.filename)))
+                    tiles.append((source, None))
+            size = await get_image_worker().run(
+                render_sprite_sheet,
+                self.cache_dir / sheet.name,
+                self.cells_path(sheet.name),
+                tiles,
+                sheet.columns,
+                sheet.tile_size,
+                self.quality,
+                wait=True,
+            )
+        return tiles, size
+
+    def discard(self, photo_filename: str) -> None:
+        """Remove every remembered sheet showing a photo, so its thumbnail is no longer served."""
+        for page, sheet in list(self._pages.items()):
+            if any(photo.filename == photo_filename for photo in sheet.photos):
+                del self._pages[page]
+                self._total_bytes -= self._entries.pop(sheet.name, 0)
+                self._unlink(sheet.name)
+
+    def _add(self, name: str, size: int) -> None:
+        """Record a sheet as the most recently used."""
+        self._total_bytes += size - self._entries.pop(name, 0)
+        self._entries[name] = size
+
+    def _evict(self) -> None:
+        """Delete least recently used sheets until the cache fits its size limit, keeping the newest."""
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self._unlink(name)
+            self.stats.evictions += 1
+
+    def _cells_size(self, name: str) -> int:
+        """Size of the lossless cells of a sheet, 0 if they are missing."""
+        try:
+            return self.cells_path(name).stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def _unlink(self, name: str) -> None:
+        """Delete a sheet and its lossless cells."""
+        (self.cache_dir / name).unlink(missing_ok=True)
+        self.cells_path(name).unlink(missing_ok=True)
+
+
+@lru_cache
+def get_sprite_cache() -> SpriteCache:
+    """Get the shared sprite sheet cache configured from settings."""
+    settings = get_settings()
+    return SpriteCache(
+        storage=get_storage(),
+        cache_dir=settings.sprite_cache_dir,
+        # Web workers share the directory, each keeping its own index within its share of the budget
+        max_bytes=settings.sprite_cache_max_bytes // settings.web_workers,
+        tile_size=settings.sprite_tile_size,
+        quality=settings.thumbnail_quality,
+        max_pages=settings.list_cache_entries,
+    )
@@ -0,0 +1,104 @@
+"""Units of work keeping stored photo files consistent with the database."""
+
+import os
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from loguru import logger
+from tortoise.transactions import in_transaction
+
+from fotacos.services.storage import Storage, get_storage
+
+
+class FileChanges:
+    """
+    File operations of a unit of work, completed or undone with its transaction.
+
+    New files must be complete under their final name before the transaction
+    commits, and are removed if it rolls back. Deletions wait until the commit,
+    so a committed row never points at a missing file. A crash between the two
+    steps can only leave unreferenced files behind, which the garbage collector
+    reclaims.
+    """
+
+    def __init__(self, storage: Storage) -> None:
+        """Initialize an empty set of changes to files in a storage backend."""
+        self.storage = storage
+        self._created_keys: list[str] = []
+        self._deleted_keys: list[str] = []
+        self._created_paths: list[Path] = []
+        self._deleted_paths: list[Path] = []
+
+    def adopt(self, *keys: str) -> None:
+        """Take ownership of files already put in storage, such as the derivatives of a photo."""
+        self._created_keys.extend(keys)
+
+    def delete(self, *keys: str) -> None:
+        """Delete stored files once the transaction has committed; missing files are ignored."""
+        self._deleted_keys.extend(keys)
+
+    def move(self, source: Path, destination: Path) -> None:
+        """Rename a local file into place; it is removed again if the unit of work fails."""
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source, destination)
+        self._created_paths.append(destination)
+
+    def discard(self, *paths: Path) -> None:
+        """Delete local files once the transaction has committed; missing files are ignored."""
+        self._deleted_paths.extend(paths)
+
+    async def commit(self) -> None:
+        """Apply the deferred deletions."""
+        for path in self._deleted_paths:
+            path.unlink(missing_ok=True)
+        for key in self._deleted_keys:
+            try:
+                await self.storage.delete(key)
+            except Exception as e:
+                # The row is gone already; the garbage collector retries later
+                logger.warning("Could not delete {} from storage: {}", key, e)
+        self._clear()
+
+    async def rollback(self) -> None:
+        """Remove the files created in this unit of work."""
+        for path in self._created_paths:
+            path.unlink(missing_ok=True)
+        for key in self._created_keys:
+            try:
+                await self.storage.delete(key)
+            except Exception as e:
+                logger.warning("Could not remove {} from storage after a failed transaction: {}", key, e)
+        self._clear()
+
+    def _clear(self) -> None:
+        """Forget every recorded operation."""
+        self._created_keys.clear()
+        self._deleted_keys.clear()
+        self._created_paths.clear()
+        self._deleted_paths.clear()
+
+
+@asynccontextmanager
+async def unit_of_work(connection_name: str | None = None) -> AsyncIterator[FileChanges]:
+    """
+    Run database changes in a transaction together with the file operations they imply.
+
+    Files moved or adopted in the block are removed if it raises; deletions
+    requested in the block happen after the transaction commits.
+
+    Args:
+        connection_name: Tortoise connection to open the transaction on
+
+    Yields:
+        FileChanges to record the file operations on
+    """
+    changes = FileChanges(get_storage())
+    try:
+        async with in_transaction(connection_name):
+            yield changes
+    except BaseException:
+        # Also covers a failed commit, after which the rows were never written
+        await changes.rollback()
+        raise
+    await changes.commit()
@@ -0,0 +1,264 @@
+"""Resumable uploads, received in chunks over several requests and kept in the staging area meanwhile."""
+
+import asyncio
+import hashlib
+import os
+import uuid
+from collections.abc import AsyncIterable, AsyncIterator, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from loguru import logger
+from tortoise import timezone
+
+from fotacos.env import get_settings
+from fotacos.models import UploadSession
+from fotacos.services.files import FileLock
+from fotacos.services.ingest import (
+    CHUNK_SIZE,
+    SNIFF_SIZE,
+    IngestedFile,
+    UnsupportedImageError,
+    UploadTooLargeError,
+    sniff_image_format,
+)
+
+settings = get_settings()
+
+PART_SUFFIX = ".part"
+LOCK_SUFFIX = ".lock"
+
+
+class UploadOffsetError(Exception):
+    """Raised when a chunk does not start where the bytes received so far end."""
+
+    def __init__(self, offset: int, expected: int) -> None:
+        """Initialize the error with the offset of the chunk and the one expected."""
+        super().__init__(f"Chunk starts at byte {offset}, but {expected} bytes were received so far")
+        self.offset = offset
+        self.expected = expected
+
+
+class UploadIncompleteError(Exception):
+    """Raised when an upload is finished before all of its bytes were received."""
+
+    def __init__(self, offset: int, length: int) -> None:
+        """Initialize the error with the bytes received and the announced length."""
+        super().__init__(f"Only {offset} of {length} bytes were received")
+        self.offset = offset
+        self.length = length
+
+
+class UploadBusyError(Exception):
+    """Raised when another request is already writing to the same upload."""
+
+
+def uploads_dir() -> Path:
+    """Directory of the staging area the bytes of resumable uploads are kept in."""
+    return settings.staging_dir / "uploads"
+
+
+def upload_path(session_id: str) -> Path:
+    """Path of the bytes received so far for an upload."""
+    return uploads_dir() / f"{session_id}{PART_SUFFIX}"
+
+
+def upload_expiry() -> datetime:
+    """Expiry of an upload that just received a chunk."""
+    return timezone.now() + timedelta(seconds=settings.upload_session_ttl)
+
+
+@contextmanager
+def _locked(session_id: str) -> Iterator[None]:
+    """Hold the lock of an upload, shared by every web worker."""
+    lock = FileLock(uploads_dir() / f"{session_id}{LOCK_SUFFIX}")
+    if not lock.acquire(blocking=False):
+        raise UploadBusyError
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+async def create_upload(filename: str, length: int, options: dict[str, Any] | None = None) -> UploadSession:
+    """
+    Start a resumable upload.
+
+    Args:
+        filename: Original filename, for logging
+        length: Size of the whole file in bytes
+        options: Encoding choices passed on to the derivative job of the photo
+
+    Returns:
+        The new upload session, with nothing received yet
+
+    Raises:
+        UploadTooLargeError: If the file is larger than the maximum upload size
+    """
+    if length > settings.max_upload_size:
+        raise UploadTooLargeError(settings.max_upload_size)
+    session = await UploadSession.create(
+        id=uuid.uuid4().hex, filename=filename, length=length, options=options, expires_at=upload_expiry()
+    )
+    path = upload_path(session.id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+    logger.info("Started upload {} of {} ({} bytes)", session.id, filename, length)
+    return session
+
+
+async def append_chunk(session: UploadSession, offset: int, chunks: AsyncIterable[bytes]) -> int:
+    """
+    Append a chunk to an upload, writing its bytes to the staging area as they arrive.
+
+    Bytes received before an error or a dropped connection are kept, so the
+    client resumes from the offset following them.
+
+    Args:
+        session: Upload to append to
+        offset: Position of the chunk in the file, which must be the number of bytes received so far
+        chunks: Bytes of the chunk, as they arrive
+
+    Returns:
+        The number of bytes received so far
+
+    Raises:
+        UploadBusyError: If another request is writing to the upload
+        UploadOffsetError: If the chunk does not start where the received bytes end
+        UploadTooLargeError: If the chunk goes past the announced length
+        UnsupportedImageError: If the file does not start with a supported image signature
+    """
+    with _locked(session.id):
+        # Another web worker may have appended since the session was read
+        await session.refresh_from_db(fields=["offset"])
+        if offset != session.offset:
+            raise UploadOffsetError(offset, session.offset)
+
+        received = offset
+        try:
+            with upload_path(session.id).open("r+b") as output:
+                head = await asyncio.to_thread(_rewind_part, output, received)
+                async for chunk in chunks:
+                    if received + len(chunk) > session.length:
+                        raise UploadTooLargeError(session.length)
+                    if len(head) < SNIFF_SIZE:
+                        head += chunk[: SNIFF_SIZE - len(head)]
+                        if len(head) == SNIFF_SIZE and sniff_image_format(head) is None:
+                            raise UnsupportedImageError
+                    await asyncio.to_thread(output.write, chunk)
+                    received += len(chunk)
+        finally:
+            session.offset = received
+            session.expires_at = upload_expiry()
+            await session.save(update_fields=["offset", "expires_at"])
+    logger.debug("Upload {} received {} of {} bytes", session.id, received, session.length)
+    return received
+
+
+def _rewind_part(output: BinaryIO, offset: int) -> bytes:
+    """Read the first bytes of an upload for sniffing, and drop the bytes past the offset, which were never acknowledged."""
+    head = output.read(min(offset, SNIFF_SIZE))
+    output.seek(offset)
+    output.truncate()
+    return head
+
+
+def _hash_file(path: Path) -> tuple[str, str | None]:
+    """SHA-256 of a file and the image format sniffed from its first bytes."""
+    digest = hashlib.sha256()
+    with path.open("rb") as source:
+        image_format = sniff_image_format(source.read(SNIFF_SIZE))
+        source.seek(0)
+        while chunk := source.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest(), image_format
+
+
+@asynccontextmanager
+async def finish_upload(session: UploadSession) -> AsyncIterator[IngestedFile]:
+    """
+    Provide a complete upload as an ingested file, to be stored like a single-request upload.
+
+    The session and its bytes are removed once the block completes; if it
+    raises they are kept, so finishing can be retried.
+
+    Args:
+        session: Upload to finish
+
+    Yields:
+        The ingested file with its size, SHA-256 hash and sniffed format
+
+    Raises:
+        UploadBusyError: If another request is writing to or finishing the upload
+        UploadIncompleteError: If bytes are still missing
+        UnsupportedImageError: If the content is not a supported image format
+    """
+    with _locked(session.id):
+        await session.refresh_from_db(fields=["offset"])
+        if session.offset != session.length:
+            raise UploadIncompleteError(session.offset, session.length)
+        path = upload_path(session.id)
+        content_hash, image_format = await asyncio.to_thread(_hash_file, path)
+        if image_format is None:
+            raise UnsupportedImageError
+        yield IngestedFile(path=path, size=session.length, content_hash=content_hash, image_format=image_format)
+        await discard_upload(session)
+
+
+async def discard_upload(session: UploadSession) -> None:
+    """
+    Remove an upload session and the bytes received for it.
+
+    Its lock file is left to :func:`collect_expired_uploads`, as another
+    request may still hold it; a new lock file would let a second writer in.
+    """
+    await session.delete()
+    upload_path(session.id).unlink(missing_ok=True)
+
+
+def _unlink_lock(path: Path) -> None:
+    """Delete a lock file unless a request still holds it."""
+    lock = FileLock(path)
+    if not lock.acquire(blocking=False):
+        return
+    try:
+        path.unlink(missing_ok=True)
+    finally:
+        lock.release()
+
+
+async def collect_expired_uploads() -> int:
+    """
+    Remove uploads that received no chunk for longer than the session lifetime.
+
+    Bytes left in the staging area without a session, after a crash while
+    removing one, are removed too, as are the lock files of removed sessions
+    that no request holds any more.
+
+    Returns:
+        Number of expired uploads removed
+    """
+    expired = await UploadSession.filter(expires_at__lt=timezone.now())
+    for session in expired:
+        await discard_upload(session)
+
+    # Listed before reading the sessions, as a session is created before its file
+    try:
+        entries = list(os.scandir(uploads_dir()))
+    except FileNotFoundError:
+        entries = []
+    known = set(await UploadSession.all().values_list("id", flat=True))
+    for entry in entries:
+        session_id, _, suffix = entry.name.rpartition(".")
+        if session_id in known:
+            continue
+        if f".{suffix}" == PART_SUFFIX:
+            Path(entry.path).unlink(missing_ok=True)
+        elif f".{suffix}" == LOCK_SUFFIX:
+            _unlink_lock(Path(entry.path))
+
+    if expired:
+        logger.info("Removed {} expired uploads", len(expired))
+    return len(expired)
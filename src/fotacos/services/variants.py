@@ -0,0 +1,207 @@
+"""On-demand image variants kept in a size-bounded disk cache."""
+
+import asyncio
+import shutil
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO
+
+from loguru import logger
+
+from fotacos.env import get_settings
+from fotacos.services.images import render_variant
+from fotacos.services.storage import Storage, full_image_key, get_storage
+from fotacos.services.worker import get_image_worker
+
+VARIANT_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+}
+# Renders of a variant that another web worker evicts before it is opened, before giving up
+OPEN_ATTEMPTS = 3
+
+
+@dataclass(frozen=True)
+class VariantSpec:
+    """A resized rendition of a photo."""
+
+    width: int
+    height: int
+    fmt: str
+
+    @property
+    def media_type(self) -> str:
+        """MIME type of the rendered variant."""
+        return VARIANT_FORMATS[self.fmt][1]
+
+    def cache_name(self, photo_filename: str) -> str:
+        """Path of the variant relative to the cache directory."""
+        return f"{Path(photo_filename).stem}/{self.width}x{self.height}.{self.fmt}"
+
+
+@dataclass
+class VariantCacheStats:
+    """Counters of the variant cache."""
+
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    evictions: int = 0
+
+
+class VariantCache:
+    """
+    Disk cache of rendered variants, bounded by total size and evicted least recently used first.
+
+    Concurrent requests for a variant that is being rendered wait for the same
+    render instead of starting their own.
+    """
+
+    def __init__(self, storage: Storage, cache_dir: Path, max_bytes: int, quality: int) -> None:
+        """
+        Initialize the variant cache.
+
+        Args:
+            storage: Storage the full-size images are rendered from
+            cache_dir: Directory the variants are stored in
+            max_bytes: Total size of cached variants before the least recently used are evicted
+            quality: Encoder quality of rendered variants (0-100)
+        """
+        self.storage = storage
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.stats = VariantCacheStats()
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._total_bytes = 0
+        self._inflight: dict[str, asyncio.Task[Path]] = {}
+
+    @property
+    def total_bytes(self) -> int:
+        """Size of all cached variants."""
+        return self._total_bytes
+
+    def load(self) -> None:
+        """Index variants left on disk by a previous run, oldest modification first."""
+        self._entries.clear()
+        self._total_bytes = 0
+        if not self.cache_dir.exists():
+            return
+        files = [path for path in self.cache_dir.glob("*/*") if path.is_file() and not path.name.startswith(".")]
+        stats = sorted(((path.stat(), path) for path in files), key=lambda item: item[0].st_mtime)
+        for stat, path in stats:
+            self._add(path.relative_to(self.cache_dir).as_posix(), stat.st_size)
+        self._evict()
+        logger.debug("Indexed {} cached variants ({} bytes)", len(self._entries), self._total_bytes)
+
+    async def get(self, photo_filename: str, spec: VariantSpec) -> Path:
+        """
+        Get the path of a variant, rendering it on the image worker if it is not cached.
+
+        Args:
+            photo_filename: Stored filename of the photo, which keys its variants
+            spec: Size and format of the variant
+
+        Returns:
+            Path of the cached variant
+
+        Raises:
+            FileNotFoundError: If the photo's full-size image is not in storage
+        """
+        name = spec.cache_name(photo_filename)
+        path = self.cache_dir / name
+        if name in self._entries:
+            if path.exists():
+                self._entries.move_to_end(name)
+                self.stats.hits += 1
+                return path
+            # Evicted or discarded by another web worker sharing the directory
+            self._total_bytes -= self._entries.pop(name)
+
+        task = self._inflight.get(name)
+        if task is None:
+            self.stats.misses += 1
+            task = asyncio.create_task(self._render(name, photo_filename, spec))
+            self._inflight[name] = task
+            task.add_done_callback(lambda _: self._inflight.pop(name, None))
+        else:
+            self.stats.coalesced += 1
+        # Shielded so a client disconnecting does not cancel the render other requests wait on
+        return await asyncio.shield(task)
+
+    async def open(self, photo_filename: str, spec: VariantSpec) -> BinaryIO:
+        """
+        Open a variant for reading, rendering it on the image worker if it is not cached.
+
+        Once open, the variant stays readable even if it is evicted meanwhile,
+        which a path handed to a response does not.
+
+        Args:
+            photo_filename: Stored filename of the photo, which keys its variants
+            spec: Size and format of the variant
+
+        Returns:
+            The variant, open for reading in binary mode
+
+        Raises:
+            FileNotFoundError: If the photo's full-size image is not in storage
+        """
+        name = spec.cache_name(photo_filename)
+        for _ in range(OPEN_ATTEMPTS - 1):
+            path = await self.get(photo_filename, spec)
+            try:
+                return await asyncio.to_thread(path.open, "rb")
+            except FileNotFoundError:
+                # Evicted by another web worker, or this one, between the lookup and opening it
+                self._total_bytes -= self._entries.pop(name, 0)
+        path = await self.get(photo_filename, spec)
+        return await asyncio.to_thread(path.open, "rb")
+
+    async def _render(self, name: str, photo_filename: str, spec: VariantSpec) -> Path:
+        """Render a variant into the cache and evict old variants to stay within the size limit."""
+        path = self.cache_dir / name
+        image_format = VARIANT_FORMATS[spec.fmt][0]
+        async with self.storage.local_copy(full_image_key(photo_filename)) as source_path:
+            size = await get_image_worker().run(
+                render_variant, source_path, path, (spec.width, spec.height), image_format, self.quality, wait=True
+            )
+        self._add(name, size)
+        self._evict()
+        logger.debug("Rendered variant {} ({} bytes)", name, size)
+        return path
+
+    async def discard(self, photo_filename: str) -> None:
+        """Remove every cached variant of a photo."""
+        prefix = f"{Path(photo_filename).stem}/"
+        for name in [name for name in self._entries if name.startswith(prefix)]:
+            self._total_bytes -= self._entries.pop(name)
+        await asyncio.to_thread(shutil.rmtree, self.cache_dir / Path(photo_filename).stem, ignore_errors=True)
+
+    def _add(self, name: str, size: int) -> None:
+        """Record a variant as the most recently used."""
+        self._total_bytes += size - self._entries.pop(name, 0)
+        self._entries[name] = size
+
+    def _evict(self) -> None:
+        """Delete least recently used variants until the cache fits its size limit, keeping the newest."""
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            (self.cache_dir / name).unlink(missing_ok=True)
+            self.stats.evictions += 1
+
+
+@lru_cache
+def get_variant_cache() -> VariantCache:
+    """Get the shared variant cache configured from settings."""
+    settings = get_settings()
+    return VariantCache(
+        storage=get_storage(),
+        cache_dir=settings.variant_cache_dir,
+        # Web workers share the directory, each keeping its own index within its share of the budget
+        max_bytes=settings.variant_cache_max_bytes // settings.web_workers,
+        quality=settings.thumbnail_quality,
+    )
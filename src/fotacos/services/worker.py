@@ -0,0 +1,153 @@
+"""Process pool worker for CPU-bound image processing."""
+
+import asyncio
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any
+
+from loguru import logger
+
+from fotacos.env import get_settings
+from fotacos.metrics import buffered_stage_timings, record_stage_timings
+
+
+class WorkerBusyError(Exception):
+    """Raised when the image worker queue is full."""
+
+    def __init__(self, pending: int, queue_depth: int) -> None:
+        """Initialize the error with the current queue occupancy."""
+        super().__init__(f"Image worker queue is full ({pending}/{queue_depth} jobs)")
+
+
+@dataclass
+class WorkerStats:
+    """Aggregated timing metrics for image worker jobs."""
+
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    rejected: int = 0
+    queue_seconds: float = 0.0
+    run_seconds: float = 0.0
+    max_run_seconds: float = 0.0
+
+    def record(self, queue_seconds: float, run_seconds: float) -> None:
+        """Record the timings of a completed job."""
+        self.completed += 1
+        self.queue_seconds += queue_seconds
+        self.run_seconds += run_seconds
+        self.max_run_seconds = max(self.max_run_seconds, run_seconds)
+
+
+def _run_timed(func: Callable[..., Any], args: tuple[Any, ...]) -> tuple[Any, float, float, list[tuple[str, float]]]:
+    """Run a job inside the worker process and measure when it started, how long it took and its stages."""
+    started_at = time.time()
+    start = time.perf_counter()
+    with buffered_stage_timings() as stages:
+        result = func(*args)
+    return result, started_at, time.perf_counter() - start, stages
+
+
+class ImageWorker:
+    """Bounded process pool that runs image jobs off the event loop."""
+
+    def __init__(self, max_workers: int, queue_depth: int) -> None:
+        """
+        Initialize the image worker.
+
+        Args:
+            max_workers: Number of worker processes
+            queue_depth: Maximum number of jobs queued or running at once
+        """
+        self.max_workers = max_workers
+        self.queue_depth = queue_depth
+        self.stats = WorkerStats()
+        self._executor: ProcessPoolExecutor | None = None
+        self._pending = 0
+        self._capacity: asyncio.Condition | None = None
+        self._capacity_loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def pending(self) -> int:
+        """Number of jobs currently queued or running."""
+        return self._pending
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Create the process pool on first use."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def _get_capacity(self) -> asyncio.Condition:
+        """Get the condition signalled when a job finishes, bound to the running loop."""
+        loop = asyncio.get_running_loop()
+        if self._capacity is None or self._capacity_loop is not loop:
+            self._capacity = asyncio.Condition()
+            self._capacity_loop = loop
+        return self._capacity
+
+    async def run(self, func: Callable[..., Any], *args: Any, wait: bool = False) -> Any:
+        """
+        Run a picklable function in the process pool and await its result.
+
+        Args:
+            func: Module-level function to execute in a worker process
+            *args: Picklable arguments passed to the function
+            wait: Wait for a free queue slot instead of failing when the queue is full
+
+        Returns:
+            The value returned by the function
+
+        Raises:
+            WorkerBusyError: If the queue is already full and `wait` is False
+        """
+        if self._pending >= self.queue_depth:
+            if not wait:
+                self.stats.rejected += 1
+                raise WorkerBusyError(self._pending, self.queue_depth)
+            capacity = self._get_capacity()
+            async with capacity:
+                await capacity.wait_for(lambda: self._pending < self.queue_depth)
+
+        self._pending += 1
+        self.stats.submitted += 1
+        submitted_at = time.time()
+        loop = asyncio.get_running_loop()
+        try:
+            result, started_at, run_seconds, stages = await loop.run_in_executor(
+                self._get_executor(), _run_timed, func, args
+            )
+        except Exception:
+            self.stats.failed += 1
+            raise
+        finally:
+            self._pending -= 1
+            await self._notify_capacity()
+
+        queue_seconds = max(0.0, started_at - submitted_at)
+        self.stats.record(queue_seconds, run_seconds)
+        record_stage_timings(stages)
+        logger.debug("Image job {} finished (queued {:.3f}s, ran {:.3f}s)", func.__name__, queue_seconds, run_seconds)
+        return result
+
+    async def _notify_capacity(self) -> None:
+        """Wake up one job waiting for a free queue slot."""
+        if self._capacity is not None and self._capacity_loop is asyncio.get_running_loop():
+            async with self._capacity:
+                self._capacity.notify()
+
+    def shutdown(self) -> None:
+        """Stop the worker processes, cancelling jobs that have not started."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+@lru_cache
+def get_image_worker() -> ImageWorker:
+    """Get the shared image worker configured from settings."""
+    settings = get_settings()
+    return ImageWorker(max_workers=settings.image_workers, queue_depth=settings.image_queue_depth)
@@ -7,8 +7,14 @@ import {
 	useReactTable,
 } from "@tanstack/react-table";
 import { Trash2 } from "lucide-react";
-import { useState } from "react";
-import { formatDate, formatFileSize, type Photo } from "../lib/api";
+import { type CSSProperties, useMemo, useState } from "react";
+import {
+	formatDate,
+	formatFileSize,
+	type Photo,
+	type SpriteSheet,
+	type SpriteTile,
+} from "../lib/api";
 import { Button } from "./ui/button";
 import {
 	Table,
@@ -19,18 +25,44 @@ import {
 	TableRow,
 } from "./ui/table";
 
+// Edge of the thumbnail cell in pixels, w-20
+const THUMBNAIL_PX = 80;
+
 interface PhotosTableProps {
 	photos: Photo[];
+	sprites?: SpriteSheet[];
 	onDelete: (photoId: number) => void;
 	isDeleting?: boolean;
 }
 
+function spriteStyle(
+	sheet: SpriteSheet,
+	tile: SpriteTile,
+	size: number,
+): CSSProperties {
+	const scale = size / tile.width;
+	return {
+		backgroundImage: `url(${sheet.sheet_url})`,
+		backgroundSize: `${sheet.width * scale}px ${sheet.height * scale}px`,
+		backgroundPosition: `-${tile.x * scale}px -${tile.y * scale}px`,
+	};
+}
+
 export function PhotosTable({
 	photos,
+	sprites,
 	onDelete,
 	isDeleting,
 }: PhotosTableProps) {
 	const [sorting, setSorting] = useState<SortingState>([]);
+	const tiles = useMemo(() => {
+		const tiles = new Map<number, [SpriteSheet, SpriteTile]>();
+		for (const sheet of sprites ?? []) {
+			if (!sheet.sheet_url) continue;
+			for (const tile of sheet.tiles) tiles.set(tile.id, [sheet, tile]);
+		}
+		return tiles;
+	}, [sprites]);
 
 	const columns: ColumnDef<Photo>[] = [
 		{
@@ -38,14 +70,28 @@ export function PhotosTable({
 			header: "Vista previa",
 			cell: ({ row }) => {
 				const photo = row.original;
+				// Photos added since the sheet was built load their own thumbnail
+				const sprite = tiles.get(photo.id);
 				return (
-					<div className="w-20 h-20">
-						<img
-							src={photo.thumbnail_url}
-							alt={photo.thumbnail_url}
-							className="w-full h-full object-cover rounded-md"
-							loading="lazy"
-						/>
+					<div
+						className="w-20 h-20 rounded-md"
+						style={{ backgroundColor: photo.dominant_color ?? undefined }}
+					>
+						{sprite ? (
+							<div
+								role="img"
+								aria-label={photo.thumbnail_url}
+								className="w-full h-full rounded-md"
+								style={spriteStyle(...sprite, THUMBNAIL_PX)}
+							/>
+						) : (
+							<img
+								src={photo.thumbnail_url}
+								alt={photo.thumbnail_url}
+								className="w-full h-full object-cover rounded-md"
+								loading="lazy"
+							/>
+						)}
 					</div>
 				);
 			},
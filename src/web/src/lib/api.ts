@@ -4,19 +4,78 @@ export interface Photo {
 	original_url: string;
 	thumbnail_url: string;
 	file_size: number;
+	status: "pending" | "ready" | "failed";
+	width: number | null;
+	height: number | null;
+	orientation: PhotoOrientation | null;
+	blurhash: string | null;
+	dominant_color: string | null;
+	taken_at: string;
+	camera: string | null;
+	latitude: number | null;
+	longitude: number | null;
 	created_at: string;
 }
 
+export type PhotoOrientation = "landscape" | "portrait" | "square";
+
+export interface PhotoFilters {
+	sort?: "taken_at" | "created_at";
+	takenAfter?: string;
+	takenBefore?: string;
+	camera?: string;
+	orientation?: PhotoOrientation;
+}
+
 export interface PhotoListResponse {
 	photos: Photo[];
 	total: number;
+	next_cursor: string | null;
+}
+
+export interface SpriteTile {
+	id: number;
+	x: number;
+	y: number;
+	width: number;
+	height: number;
+}
+
+export interface SpriteSheet {
+	sheet_url: string | null;
+	width: number;
+	height: number;
+	tile_size: number;
+	tiles: SpriteTile[];
+	next_cursor: string | null;
 }
 
 const API_BASE_URL =
 	import.meta.env.VITE_API_URL || "http://localhost:8000/api";
 
-export async function fetchPhotos(): Promise<PhotoListResponse> {
-	const response = await fetch(`${API_BASE_URL}/photos`);
+function listingQuery(
+	cursor?: string,
+	limit?: number,
+	filters: PhotoFilters = {},
+): string {
+	const params = new URLSearchParams();
+	if (cursor) params.set("cursor", cursor);
+	if (limit) params.set("limit", String(limit));
+	if (filters.sort) params.set("sort", filters.sort);
+	if (filters.takenAfter) params.set("taken_after", filters.takenAfter);
+	if (filters.takenBefore) params.set("taken_before", filters.takenBefore);
+	if (filters.camera) params.set("camera", filters.camera);
+	if (filters.orientation) params.set("orientation", filters.orientation);
+	return params.size > 0 ? `?${params}` : "";
+}
+
+export async function fetchPhotos(
+	cursor?: string,
+	limit?: number,
+	filters: PhotoFilters = {},
+): Promise<PhotoListResponse> {
+	const query = listingQuery(cursor, limit, filters);
+	const response = await fetch(`${API_BASE_URL}/photos${query}`);
 
 	if (!response.ok) {
 		throw new Error(`Failed to fetch photos: ${response.statusText}`);
@@ -25,7 +84,133 @@ export async function fetchPhotos(): Promise<PhotoListResponse> {
 	return response.json();
 }
 
+// Thumbnails of the same page as fetchPhotos, packed into one image
+export async function fetchSpriteSheet(
+	cursor?: string,
+	limit?: number,
+	filters: PhotoFilters = {},
+): Promise<SpriteSheet> {
+	const query = listingQuery(cursor, limit, filters);
+	const response = await fetch(`${API_BASE_URL}/photos/sprites${query}`);
+
+	if (!response.ok) {
+		throw new Error(`Failed to fetch sprite sheet: ${response.statusText}`);
+	}
+
+	return response.json();
+}
+
+export function photoImageUrl(
+	photoId: number,
+	width?: number,
+	height?: number,
+	format: "webp" | "jpeg" | "png" = "webp",
+): string {
+	const params = new URLSearchParams({ fmt: format });
+	if (width) params.set("w", String(width));
+	if (height) params.set("h", String(height));
+	return `${API_BASE_URL}/photos/${photoId}/image?${params}`;
+}
+
+export type PhotoEventKind = "added" | "updated" | "removed" | "reset";
+
+export function photoEventsUrl(): string {
+	return `${API_BASE_URL}/photos/events`;
+}
+
+export function comparePhotos(a: Photo, b: Photo): number {
+	return Date.parse(b.taken_at) - Date.parse(a.taken_at) || b.id - a.id;
+}
+
+// Larger files go in chunks, so a dropped connection only resends one chunk
+const RESUMABLE_UPLOAD_THRESHOLD = 8 * 1024 * 1024;
+const UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024;
+const UPLOAD_CHUNK_RETRIES = 5;
+
+async function responseError(
+	response: Response,
+	fallback: string,
+): Promise<Error> {
+	const error = await response
+		.json()
+		.catch(() => ({ detail: response.statusText }));
+	return new Error(error.detail || fallback);
+}
+
+async function uploadedOffset(url: string, fallback: number): Promise<number> {
+	try {
+		const response = await fetch(url, { method: "HEAD" });
+		if (response.ok) return Number(response.headers.get("Upload-Offset"));
+	} catch {
+		// Still offline, the next chunk attempt tells
+	}
+	return fallback;
+}
+
+async function sendChunks(url: string, file: File): Promise<void> {
+	let offset = 0;
+	let failures = 0;
+	while (offset < file.size) {
+		let response: Response | null = null;
+		try {
+			response = await fetch(url, {
+				method: "PATCH",
+				headers: {
+					"Upload-Offset": String(offset),
+					"Content-Type": "application/offset+octet-stream",
+				},
+				body: file.slice(offset, offset + UPLOAD_CHUNK_SIZE),
+			});
+		} catch {
+			// Connection dropped, the server keeps what arrived
+		}
+		if (response?.ok) {
+			offset = Number(response.headers.get("Upload-Offset"));
+			failures = 0;
+			continue;
+		}
+		const retryable =
+			!response ||
+			[409, 423].includes(response.status) ||
+			response.status >= 500;
+		if (response && !retryable) {
+			throw await responseError(response, "Failed to upload photo");
+		}
+		failures += 1;
+		if (failures > UPLOAD_CHUNK_RETRIES) {
+			throw new Error("Upload interrupted, try again later");
+		}
+		await new Promise((resolve) => setTimeout(resolve, 1000 * failures));
+		offset = await uploadedOffset(url, offset);
+	}
+}
+
+async function uploadPhotoInChunks(file: File): Promise<Photo> {
+	const params = new URLSearchParams({ filename: file.name });
+	const created = await fetch(`${API_BASE_URL}/photos/uploads?${params}`, {
+		method: "POST",
+		headers: { "Upload-Length": String(file.size) },
+	});
+	if (!created.ok) {
+		throw await responseError(created, "Failed to upload photo");
+	}
+	const { id } = await created.json();
+	const url = `${API_BASE_URL}/photos/uploads/${id}`;
+
+	await sendChunks(url, file);
+
+	const response = await fetch(`${url}/finish`, { method: "POST" });
+	if (!response.ok) {
+		throw await responseError(response, "Failed to upload photo");
+	}
+	return response.json();
+}
+
 export async function uploadPhoto(file: File): Promise<Photo> {
+	if (file.size > RESUMABLE_UPLOAD_THRESHOLD) {
+		return uploadPhotoInChunks(file);
+	}
+
 	const formData = new FormData();
 	formData.append("file", file);
 
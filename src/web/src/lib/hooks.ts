@@ -1,17 +1,44 @@
 import {
+	type InfiniteData,
+	infiniteQueryOptions,
+	type QueryClient,
 	queryOptions,
 	useMutation,
 	useQueryClient,
 } from "@tanstack/react-query";
-import { deletePhoto, fetchPhotos, uploadPhoto } from "./api";
+import { useEffect } from "react";
+import {
+	comparePhotos,
+	deletePhoto,
+	fetchPhotos,
+	fetchSpriteSheet,
+	type Photo,
+	type PhotoEventKind,
+	type PhotoListResponse,
+	photoEventsUrl,
+	uploadPhoto,
+} from "./api";
 
 export const PHOTOS_QUERY_KEY = ["photos"];
 
-export const photosQueryOptions = queryOptions({
+type PhotoPages = InfiniteData<PhotoListResponse, string | undefined>;
+
+// Pages are loaded one after the other by following their cursors
+export const photosQueryOptions = infiniteQueryOptions({
 	queryKey: PHOTOS_QUERY_KEY,
-	queryFn: fetchPhotos,
+	queryFn: ({ pageParam }) => fetchPhotos(pageParam),
+	initialPageParam: undefined as string | undefined,
+	getNextPageParam: (page) => page.next_cursor ?? undefined,
 });
 
+// One sheet per page, under the photos key so invalidating refetches them
+export function spriteSheetQueryOptions(cursor: string | undefined) {
+	return queryOptions({
+		queryKey: [...PHOTOS_QUERY_KEY, "sprites", cursor ?? null],
+		queryFn: () => fetchSpriteSheet(cursor),
+	});
+}
+
 export function useUploadPhoto() {
 	const queryClient = useQueryClient();
 
@@ -33,3 +60,84 @@ export function useDeletePhoto() {
 		},
 	});
 }
+
+// Replaces the photos of one page and the total of every page
+function patchPages(
+	data: PhotoPages,
+	index: number,
+	photos: Photo[] | null,
+	total: number,
+): PhotoPages {
+	const pages = data.pages.map((page, i) => ({
+		...page,
+		photos: i === index && photos ? photos : page.photos,
+		total,
+	}));
+	return { ...data, pages };
+}
+
+// Patches the page of the photo, or returns null when only a refetch will do
+function applyPhotoEvent(
+	data: PhotoPages,
+	kind: PhotoEventKind,
+	photo: Photo,
+): PhotoPages | null {
+	const total = data.pages[0]?.total ?? 0;
+	const index = data.pages.findIndex((page) =>
+		page.photos.some((p) => p.id === photo.id),
+	);
+	if (kind === "removed") {
+		if (index < 0) return null;
+		const photos = data.pages[index].photos.filter((p) => p.id !== photo.id);
+		return patchPages(data, index, photos, total - 1);
+	}
+	if (index >= 0) {
+		const photos = data.pages[index].photos.map((p) =>
+			p.id === photo.id ? photo : p,
+		);
+		return patchPages(data, index, photos, total);
+	}
+	if (kind === "updated") return data;
+	// The first page ending after the photo, or the last page when complete
+	const target = data.pages.findIndex((page) => {
+		const last = page.photos[page.photos.length - 1];
+		return !page.next_cursor || (last && comparePhotos(photo, last) <= 0);
+	});
+	if (target < 0) {
+		// Belongs to a page that is not loaded yet
+		return patchPages(data, -1, null, total + 1);
+	}
+	const photos = [...data.pages[target].photos, photo].sort(comparePhotos);
+	return patchPages(data, target, photos, total + 1);
+}
+
+function listenToPhotoEvents(queryClient: QueryClient): EventSource {
+	const source = new EventSource(photoEventsUrl());
+	const refetch = () =>
+		queryClient.invalidateQueries({ queryKey: PHOTOS_QUERY_KEY });
+	for (const kind of ["added", "updated", "removed"] as const) {
+		source.addEventListener(kind, (event) => {
+			const data = queryClient.getQueryData<PhotoPages>(PHOTOS_QUERY_KEY);
+			if (!data) return;
+			const photo: Photo = JSON.parse((event as MessageEvent<string>).data);
+			const patched = applyPhotoEvent(data, kind, photo);
+			if (patched) {
+				queryClient.setQueryData(PHOTOS_QUERY_KEY, patched);
+			} else {
+				refetch();
+			}
+		});
+	}
+	// Changes were missed while disconnected
+	source.addEventListener("reset", refetch);
+	return source;
+}
+
+export function usePhotoEvents() {
+	const queryClient = useQueryClient();
+
+	useEffect(() => {
+		const source = listenToPhotoEvents(queryClient);
+		return () => source.close();
+	}, [queryClient]);
+}
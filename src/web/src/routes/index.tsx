@@ -1,4 +1,8 @@
-import { queryOptions, useSuspenseQuery } from "@tanstack/react-query";
+import {
+	type UseQueryResult,
+	useQueries,
+	useSuspenseInfiniteQuery,
+} from "@tanstack/react-query";
 import { createFileRoute } from "@tanstack/react-router";
 import { AlertCircle, CheckCircle, Loader2, Upload } from "lucide-react";
 import { useRef, useState } from "react";
@@ -11,17 +15,23 @@ import {
 	CardHeader,
 	CardTitle,
 } from "../components/ui/card";
-import { fetchPhotos } from "../lib/api";
-import { useDeletePhoto, useUploadPhoto } from "../lib/hooks";
+import type { SpriteSheet } from "../lib/api";
+import {
+	photosQueryOptions,
+	spriteSheetQueryOptions,
+	useDeletePhoto,
+	usePhotoEvents,
+	useUploadPhoto,
+} from "../lib/hooks";
 
-const photosQueryOptions = queryOptions({
-	queryKey: ["photos"],
-	queryFn: fetchPhotos,
-});
+// Sheets loaded so far, in page order
+function loadedSheets(results: UseQueryResult<SpriteSheet>[]): SpriteSheet[] {
+	return results.flatMap((result) => result.data ?? []);
+}
 
 export const Route = createFileRoute("/")({
 	loader: ({ context }) =>
-		context.queryClient.ensureQueryData(photosQueryOptions),
+		context.queryClient.ensureInfiniteQueryData(photosQueryOptions),
 	component: PhotoGallery,
 });
 
@@ -29,7 +39,15 @@ function PhotoGallery() {
 	const fileInputRef = useRef<HTMLInputElement>(null);
 	const [uploadError, setUploadError] = useState<string | null>(null);
 
-	const { data } = useSuspenseQuery(photosQueryOptions);
+	const { data, fetchNextPage, hasNextPage, isFetchingNextPage } =
+		useSuspenseInfiniteQuery(photosQueryOptions);
+	const photos = data.pages.flatMap((page) => page.photos);
+	// Thumbnails show one by one until the sheet of their page arrives
+	const sprites = useQueries({
+		queries: data.pageParams.map(spriteSheetQueryOptions),
+		combine: loadedSheets,
+	});
+	usePhotoEvents();
 
 	const uploadMutation = useUploadPhoto();
 
@@ -120,13 +138,32 @@ function PhotoGallery() {
 				<CardContent>
 					<div className="space-y-4">
 						<div className="text-sm text-slate-500">
-							Total de fotos: {data?.total ?? 0}
+							Total de fotos: {data.pages[0]?.total ?? 0}
 						</div>
 						<PhotosTable
-							photos={data?.photos ?? []}
+							photos={photos}
+							sprites={sprites}
 							onDelete={handleDelete}
 							isDeleting={deleteMutation.isPending}
 						/>
+						{hasNextPage && (
+							<div className="flex justify-center">
+								<Button
+									variant="outline"
+									onClick={() => fetchNextPage()}
+									disabled={isFetchingNextPage}
+								>
+									{isFetchingNextPage ? (
+										<>
+											<Loader2 className="h-4 w-4 animate-spin" />
+											Cargando...
+										</>
+									) : (
+										"Cargar más fotos"
+									)}
+								</Button>
+							</div>
+						)}
 					</div>
 				</CardContent>
 			</Card>
@@ -0,0 +1,15 @@
+"""Shared test configuration."""
+
+import os
+import tempfile
+from pathlib import Path
+
+# Settings are cached on first import, so point them at throwaway storage before any fotacos module loads
+_TEST_ROOT = Path(tempfile.mkdtemp(prefix="fotacos-tests-"))
+os.environ["DATABASE_URL"] = "sqlite://:memory:"
+os.environ["UPLOAD_DIR"] = str(_TEST_ROOT / "public" / "picts")
+os.environ["STAGING_DIR"] = str(_TEST_ROOT / "staging")
+os.environ["VARIANT_CACHE_DIR"] = str(_TEST_ROOT / "cache" / "variants")
+os.environ["SPRITE_CACHE_DIR"] = str(_TEST_ROOT / "cache" / "sprites")
+os.environ["IMAGE_WORKERS"] = "1"
+(_TEST_ROOT / "public" / "picts").mkdir(parents=True)
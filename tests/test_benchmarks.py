@@ -0,0 +1,60 @@
+"""Tests for the regression tracking of the benchmark suite."""
+
+from io import BytesIO
+
+import pytest
+from PIL import ExifTags, Image
+
+from benchmarks.suite import IMAGES, compare, make_source, percentile, summarize
+
+
+def _results(**cases: dict) -> dict:
+    """Wrap case results like a written results file."""
+    return {"meta": {}, "cases": cases}
+
+
+def test_summary_reports_percentiles_and_throughput():
+    """Test that latency percentiles interpolate between samples and throughput uses the total time."""
+    samples = [0.010, 0.020, 0.030, 0.040, 0.100]
+
+    summary = summarize(samples, elapsed=0.5, peak_rss_mb=64.0)
+
+    assert percentile([0.5], 95) == 0.5
+    assert summary["p50_ms"] == pytest.approx(30.0)
+    assert summary["p95_ms"] == pytest.approx(88.0)
+    assert summary["throughput_per_s"] == pytest.approx(10.0)
+    assert summary["peak_rss_mb"] == 64.0
+
+
+def test_compare_flags_regressions_beyond_the_threshold():
+    """Test that slower, less productive or bigger cases are flagged, and noise-level timings are not."""
+    base = {"p50_ms": 100.0, "p95_ms": 150.0, "throughput_per_s": 10.0, "peak_rss_mb": 100.0}
+    tiny = {"p50_ms": 0.01, "p95_ms": 0.02, "throughput_per_s": 90_000.0, "peak_rss_mb": 60.0}
+    baseline = _results(slower=base, steady=base, tiny=tiny, failed=base)
+    current = _results(
+        slower={**base, "p50_ms": 130.0, "throughput_per_s": 7.0},
+        steady={**base, "p95_ms": 160.0, "peak_rss_mb": 90.0},
+        tiny={**tiny, "p50_ms": 0.05, "peak_rss_mb": 80.0},
+        failed={"error": "RuntimeError: boom"},
+        added=base,
+    )
+
+    regressions = compare(baseline, current, threshold=0.15)
+
+    assert [(regression.case, regression.metric) for regression in regressions] == [
+        ("slower", "p50_ms"),
+        ("slower", "throughput_per_s"),
+        ("tiny", "peak_rss_mb"),
+    ]
+    assert regressions[0].change == pytest.approx(0.3)
+
+
+def test_synthetic_sources_are_reproducible():
+    """Test that sources are identical across calls and carry the requested orientation."""
+    rotated = next(image for image in IMAGES if image.orientation == 6)
+
+    source = make_source(rotated, 64, 48)
+
+    assert source == make_source(rotated, 64, 48)
+    with Image.open(BytesIO(source)) as img:
+        assert img.getexif()[ExifTags.Base.Orientation] == 6
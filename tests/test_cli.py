@@ -0,0 +1,37 @@
+"""Test the command line entry point."""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import fotacos
+
+# Loaded only by the commands that need them, never by the CLI itself
+HEAVY_MODULES = ("fastapi", "tortoise", "PIL", "PySide6", "uvicorn", "fotacos.api")
+
+
+def _run_python(cwd: Path, *args: str) -> subprocess.CompletedProcess:
+    """Run a fresh interpreter that can import fotacos."""
+    source_root = str(Path(fotacos.__file__).parent.parent)
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [source_root, os.environ.get("PYTHONPATH")]))}
+    return subprocess.run([sys.executable, *args], cwd=cwd, env=env, capture_output=True, text=True, check=True)  # noqa: S603
+
+
+def test_cli_import_stays_light(tmp_path):
+    """Test that the CLI loads without the server stack."""
+    probe = f"import sys, fotacos.main; print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))"
+
+    loaded = _run_python(tmp_path, "-c", probe).stdout.strip()
+
+    assert loaded == ""
+
+
+def test_cli_help_lists_every_command(tmp_path):
+    """Test that --help lists every command without setting up logging."""
+    usage = _run_python(tmp_path, "-m", "fotacos.main", "--help").stdout
+
+    for command in ("gui", "web", "import", "watch", "fsck"):
+        assert f"  {command} " in usage
+    # Logging is only set up by the commands that need it
+    assert not (tmp_path / "logs").exists()
@@ -0,0 +1,81 @@
+"""Tests for database configuration and migrations."""
+
+import asyncio
+import sqlite3
+
+import pytest
+from tortoise import connections
+from tortoise.exceptions import IntegrityError
+
+from fotacos.database import close_db, init_db
+from fotacos.env import get_settings
+from fotacos.migrations import latest_version
+from fotacos.models import Job, Photo, PhotoEvent, PhotoStatus, UploadSession
+from fotacos.services import derivatives_signature
+
+LEGACY_SCHEMA = """
+CREATE TABLE "photo" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "filename" VARCHAR(255) NOT NULL UNIQUE,
+    "original_url" VARCHAR(512) NOT NULL,
+    "thumbnail_url" VARCHAR(512) NOT NULL,
+    "file_size" INT NOT NULL DEFAULT 0,
+    "created_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO "photo" ("filename", "original_url", "thumbnail_url") VALUES ('photo_old.webp', '', '');
+"""
+
+
+def test_init_db_tunes_sqlite_and_migrates_legacy_database(tmp_path, monkeypatch):
+    """Test that a database created before migrations is upgraded once, keeping its rows."""
+    db_path = tmp_path / "legacy.db"
+    with sqlite3.connect(db_path) as legacy:
+        legacy.executescript(LEGACY_SCHEMA)
+    monkeypatch.setattr(get_settings(), "database_url", f"sqlite://{db_path}")
+
+    async def scenario():
+        await init_db()
+        try:
+            connection = connections.get("default")
+            _, journal = await connection.execute_query("PRAGMA journal_mode")
+            _, synchronous = await connection.execute_query("PRAGMA synchronous")
+            _, busy_timeout = await connection.execute_query("PRAGMA busy_timeout")
+            photo = await Photo.get(filename="photo_old.webp")
+            await Photo.create(filename="photo_new.webp", original_url="", thumbnail_url="", content_hash="abc")
+            # Uniqueness of content hashes survives the upgrade
+            with pytest.raises(IntegrityError):
+                await Photo.create(filename="photo_dup.webp", original_url="", thumbnail_url="", content_hash="abc")
+            return journal[0][0], synchronous[0][0], busy_timeout[0][0], photo
+        finally:
+            await close_db()
+
+    journal, synchronous, busy_timeout, photo = asyncio.run(scenario())
+
+    assert journal == "wal"
+    assert synchronous == 1  # NORMAL
+    assert busy_timeout == 5000
+    assert photo.status == PhotoStatus.READY
+    assert photo.content_hash is None
+    # Derivatives of existing photos were built with the current settings, so nothing is regenerated
+    assert photo.derivatives_version == derivatives_signature()
+    with sqlite3.connect(db_path) as migrated:
+        assert migrated.execute("PRAGMA user_version").fetchone()[0] == latest_version()
+
+
+def test_migrations_create_every_model_column():
+    """Test that the migrated schema matches the models, so new fields come with a migration."""
+
+    async def scenario():
+        await init_db()
+        try:
+            connection = connections.get("default")
+            missing = {}
+            for model in (Photo, Job, PhotoEvent, UploadSession):
+                _, rows = await connection.execute_query(f'PRAGMA table_info("{model._meta.db_table}")')
+                columns = {row["name"] for row in rows}
+                missing[model.__name__] = set(model._meta.fields_db_projection.values()) - columns
+            return missing
+        finally:
+            await close_db()
+
+    assert asyncio.run(scenario()) == {"Photo": set(), "Job": set(), "PhotoEvent": set(), "UploadSession": set()}
@@ -0,0 +1,52 @@
+"""Tests for the photo change feed."""
+
+import asyncio
+
+import pytest
+
+from fotacos.database import close_db, init_db
+from fotacos.env import get_settings
+from fotacos.models import PhotoEventKind
+from fotacos.services import ChangesExpiredError, PhotoFeed, latest_sequence, record_photo_events
+
+
+def test_feed_resumes_wakes_subscribers_and_prunes_old_changes(monkeypatch):
+    """Test resuming after a sequence number, waking up on notify, heartbeats and expiry of pruned changes."""
+    monkeypatch.setattr(get_settings(), "event_retention", 3)
+
+    async def scenario():
+        await init_db()
+        feed = PhotoFeed(poll_interval=60)
+        try:
+            start = await latest_sequence()
+            await record_photo_events(PhotoEventKind.ADDED, [1, 2])
+
+            subscription = feed.subscribe(start)
+            first = await subscription.__anext__()
+            assert [(change.kind, change.photo_id) for change in first] == [("added", 1), ("added", 2)]
+            assert first[-1].sequence == start + 2
+            assert feed.subscribers == 1
+
+            waiting = asyncio.create_task(subscription.__anext__())
+            await asyncio.sleep(0)
+            await record_photo_events(PhotoEventKind.REMOVED, [1])
+            feed.notify()
+            second = await asyncio.wait_for(waiting, 1)
+            assert [(change.kind, change.photo_id) for change in second] == [("removed", 1)]
+            await subscription.aclose()
+            assert feed.subscribers == 0
+
+            # Only the latest three changes are kept
+            await record_photo_events(PhotoEventKind.UPDATED, [2, 3])
+            with pytest.raises(ChangesExpiredError) as expired:
+                await feed.subscribe(start).__anext__()
+            assert expired.value.latest == start + 5
+            resumed = feed.subscribe(start + 2, heartbeat=0.01)
+            assert [change.sequence for change in await resumed.__anext__()] == [start + 3, start + 4, start + 5]
+            assert await resumed.__anext__() == []
+            await resumed.aclose()
+        finally:
+            await feed.stop()
+            await close_db()
+
+    asyncio.run(scenario())
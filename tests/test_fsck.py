@@ -0,0 +1,143 @@
+"""Tests for units of work and the storage check."""
+
+import asyncio
+import os
+import time
+import uuid
+
+import pytest
+
+from fotacos.database import close_db, init_db
+from fotacos.env import get_settings
+from fotacos.models import Job, Photo, PhotoStatus
+from fotacos.services import (
+    check_storage,
+    full_image_key,
+    get_storage,
+    get_variant_cache,
+    photo_keys,
+    photo_urls,
+    thumbnail_key,
+    unit_of_work,
+)
+
+
+class WorkFailedError(Exception):
+    """Failure raised inside a unit of work."""
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """Point photo storage at an empty directory."""
+    settings = get_settings()
+    monkeypatch.setattr(settings, "upload_dir", tmp_path / "picts")
+    monkeypatch.setattr(settings, "staging_dir", tmp_path / "staging")
+    monkeypatch.setattr(settings, "variant_cache_dir", tmp_path / "variants")
+    (tmp_path / "picts").mkdir()
+    get_storage.cache_clear()
+    get_variant_cache.cache_clear()
+    yield tmp_path
+    get_storage.cache_clear()
+    get_variant_cache.cache_clear()
+
+
+def _photo_paths(filename: str) -> list:
+    """Paths of the full image and thumbnail of a photo in local storage."""
+    return [get_storage().local_path(key) for key in (full_image_key(filename), thumbnail_key(filename))]
+
+
+def _write_photo_files(filename: str, age: float = 0) -> list:
+    """Write a full image and thumbnail for a photo, backdated by `age` seconds."""
+    paths = _photo_paths(filename)
+    for path in paths:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * 100)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+    return paths
+
+
+def _filename() -> str:
+    """Generate a stored photo filename."""
+    return f"photo_{uuid.uuid4()}.webp"
+
+
+def test_unit_of_work_keeps_files_and_rows_consistent(storage):
+    """Test that files of a failed insert are removed and files of a delete outlive a failed transaction."""
+
+    async def scenario():
+        await init_db()
+        try:
+            failed = _filename()
+            with pytest.raises(WorkFailedError):
+                async with unit_of_work() as files:
+                    _write_photo_files(failed)
+                    files.adopt(*photo_keys(failed))
+                    await Photo.create(**photo_urls(failed))
+                    raise WorkFailedError
+            assert not await Photo.exists(filename=failed)
+            assert not any(path.exists() for path in _photo_paths(failed))
+
+            kept = _filename()
+            paths = _write_photo_files(kept)
+            async with unit_of_work() as files:
+                files.adopt(*photo_keys(kept))
+                photo = await Photo.create(**photo_urls(kept))
+
+            with pytest.raises(WorkFailedError):
+                async with unit_of_work() as files:
+                    await photo.delete()
+                    files.delete(*photo_keys(kept))
+                    raise WorkFailedError
+            assert await Photo.exists(filename=kept)
+            assert all(path.exists() for path in paths)
+
+            async with unit_of_work() as files:
+                await photo.delete()
+                files.delete(*photo_keys(kept))
+            assert not any(path.exists() for path in paths)
+        finally:
+            await close_db()
+
+    asyncio.run(scenario())
+
+
+def test_check_storage_reclaims_orphans_and_reports_missing_files(storage):
+    """Test that old unreferenced files are reclaimed, recent ones kept and missing derivatives requeued."""
+    (storage / "picts" / "holiday.jpg").write_bytes(b"waiting to be imported")
+
+    async def scenario():
+        await init_db()
+        try:
+            intact, no_thumbnail, no_image = _filename(), _filename(), _filename()
+            _write_photo_files(intact, age=7200)
+            _write_photo_files(no_thumbnail, age=7200)[1].unlink()
+            photos = [
+                Photo(**photo_urls(filename), status=PhotoStatus.READY) for filename in (intact, no_thumbnail, no_image)
+            ]
+            await Photo.bulk_create(photos)
+            orphan = _write_photo_files(_filename(), age=7200)
+            in_flight = _write_photo_files(_filename())
+            (storage / "variants" / orphan[0].stem).mkdir(parents=True)
+            (storage / "variants" / orphan[0].stem / "100x100.webp").write_bytes(b"x" * 50)
+
+            dry_run = await check_storage(dry_run=True)
+            assert all(path.exists() for path in orphan)
+            assert dry_run.reclaimed_bytes == 250
+
+            report = await check_storage()
+            ids = dict(await Photo.all().values_list("filename", "id"))
+            queued = await Job.all().values_list("photo_id", flat=True)
+        finally:
+            await close_db()
+
+        assert (report.orphaned_files, report.reclaimed_bytes) == (3, 250)
+        assert not any(path.exists() for path in orphan)
+        assert not (storage / "variants" / orphan[0].stem).exists()
+        assert all(path.exists() for path in in_flight)
+        assert (storage / "picts" / "holiday.jpg").exists()
+        assert report.missing == [ids[no_image]]
+        assert report.requeued == 1
+        assert queued == [ids[no_thumbnail]]
+
+    asyncio.run(scenario())
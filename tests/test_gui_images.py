@@ -0,0 +1,53 @@
+"""Tests for the GUI image decoder."""
+
+import threading
+
+from PIL import Image
+from PySide6.QtCore import QSize
+
+from fotacos.gui.images import ImageDecoder, decode_image
+from fotacos.services import LocalStorage
+
+
+def _write_photo(path, size=(1600, 1200)):
+    """Write a WebP photo to disk."""
+    Image.new("RGB", size, "orange").save(path, "WEBP")
+    return path
+
+
+def test_decode_image_scales_to_fit_without_upscaling(tmp_path):
+    """Test that images are decoded at the requested size at most."""
+    path = _write_photo(tmp_path / "photo.webp")
+
+    assert decode_image(path, QSize(800, 800)).size() == QSize(800, 600)
+    assert decode_image(path, QSize(4000, 4000)).size() == QSize(1600, 1200)
+    assert decode_image(path.read_bytes(), QSize(800, 800)).size() == QSize(800, 600)
+    assert decode_image(tmp_path / "missing.webp", QSize(800, 800)).isNull()
+
+
+def test_decoder_shares_pending_decodes_and_caps_memory(tmp_path):
+    """Test single decodes for concurrent requests and eviction past the memory cap."""
+    storage = LocalStorage(tmp_path)
+    for name in ("a.webp", "b.webp"):
+        storage.path(name).parent.mkdir(parents=True, exist_ok=True)
+        _write_photo(storage.path(name))
+    size = QSize(400, 400)
+    one_image = 400 * 300 * 4
+    decoder = ImageDecoder(storage, max_bytes=one_image + 1)
+    delivered = []
+    lock = threading.Lock()
+
+    def deliver(image):
+        with lock:
+            delivered.append(image.size())
+
+    decoder.request("a.webp", size, deliver)
+    decoder.request("a.webp", size, deliver)
+    decoder.wait()
+    assert delivered == [QSize(400, 300)] * 2
+    assert decoder.stats.misses == 1
+
+    decoder.request("b.webp", size)
+    decoder.wait()
+    assert decoder.cached_count == 1
+    assert decoder.cached_bytes <= decoder.max_bytes
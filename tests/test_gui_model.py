@@ -0,0 +1,125 @@
+"""Tests for the Qt photo gallery model."""
+
+import asyncio
+from datetime import timedelta
+
+from tortoise import timezone
+
+from fotacos.database import close_db, init_db
+from fotacos.gui.runner import PhotoGalleryModel
+from fotacos.models import Photo, PhotoEventKind, PhotoStatus
+from fotacos.services import PhotoFeed, latest_sequence, record_photo_events
+
+
+async def _create_photos(count: int) -> list[Photo]:
+    """Create ready photos, the first one being the oldest."""
+    start = timezone.now()
+    photos = []
+    for number in range(count):
+        photo = await Photo.create(filename=f"photo_gui_{number}.webp", original_url="", thumbnail_url="")
+        # created_at is set automatically, so space the photos out afterwards
+        photo.created_at = start + timedelta(seconds=number)
+        await Photo.filter(id=photo.id).update(created_at=photo.created_at)
+        photos.append(photo)
+    return photos
+
+
+def _filenames(model: PhotoGalleryModel) -> list[str]:
+    """Read the filename role of every fetched row."""
+    return [model.data(model.index(row), model.FilenameRole) for row in range(model.rowCount())]
+
+
+def test_model_fetches_pages_and_applies_refresh_diffs():
+    """Test paged fetching and that a refresh only signals the rows that changed."""
+
+    async def scenario():
+        await init_db()
+        try:
+            photos = await _create_photos(5)
+            model = PhotoGalleryModel(page_size=2)
+            events = []
+            model.rowsInserted.connect(lambda _, first, last: events.append(("insert", first, last)))
+            model.rowsRemoved.connect(lambda _, first, last: events.append(("remove", first, last)))
+            model.modelReset.connect(lambda: events.append(("reset",)))
+
+            await model.fetch_page()
+            assert _filenames(model) == ["photo_gui_4.webp", "photo_gui_3.webp"]
+            assert model.totalCount == 5
+            assert model.canFetchMore(model.index(-1))
+
+            await model.fetch_page()
+            assert model.rowCount() == 4
+            assert model.data(model.index(0), model.PathRole).startswith("file://")
+
+            await photos[3].delete()
+            newest = await Photo.create(filename="photo_gui_new.webp", original_url="", thumbnail_url="")
+            await Photo.filter(id=newest.id).update(created_at=photos[-1].created_at + timedelta(minutes=1))
+            await Photo.create(
+                filename="photo_gui_pending.webp", original_url="", thumbnail_url="", status=PhotoStatus.PENDING
+            )
+            events.clear()
+            await model.load_photos()
+
+            assert _filenames(model) == [newest.filename, "photo_gui_4.webp", "photo_gui_2.webp", "photo_gui_1.webp"]
+            assert events == [("remove", 1, 1), ("insert", 0, 0)]
+            assert model.totalCount == 5
+
+            await model.fetch_page()
+            assert _filenames(model)[-1] == "photo_gui_0.webp"
+            assert not model.canFetchMore(model.index(-1))
+        finally:
+            await close_db()
+
+    asyncio.run(scenario())
+
+
+async def _wait_for(condition, timeout: float = 2) -> None:
+    """Let the event loop run until a condition holds."""
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+def test_model_follows_the_change_feed_row_by_row():
+    """Test that changes from the feed insert and remove single rows within the fetched window."""
+
+    async def scenario():
+        await init_db()
+        feed = PhotoFeed(poll_interval=60)
+        model = PhotoGalleryModel(page_size=2, feed=feed)
+        try:
+            photos = await _create_photos(4)
+            await model.fetch_page()
+            events = []
+            model.rowsInserted.connect(lambda _, first, last: events.append(("insert", first, last)))
+            model.rowsRemoved.connect(lambda _, first, last: events.append(("remove", first, last)))
+            model.modelReset.connect(lambda: events.append(("reset",)))
+            model.start_following(await latest_sequence())
+
+            newest = await Photo.create(filename="photo_gui_new.webp", original_url="", thumbnail_url="")
+            await Photo.filter(id=newest.id).update(created_at=photos[-1].created_at + timedelta(minutes=1))
+            # Sorts after the fetched window, so it is left to paging
+            older = await Photo.create(filename="photo_gui_older.webp", original_url="", thumbnail_url="")
+            await Photo.filter(id=older.id).update(created_at=photos[0].created_at - timedelta(minutes=1))
+            pending = await Photo.create(
+                filename="photo_gui_pending.webp", original_url="", thumbnail_url="", status=PhotoStatus.PENDING
+            )
+            await photos[2].delete()
+            await record_photo_events(PhotoEventKind.ADDED, [newest.id, older.id, pending.id])
+            await record_photo_events(PhotoEventKind.REMOVED, [photos[2].id])
+            feed.notify()
+
+            await _wait_for(lambda: model.totalCount == 5)
+            assert _filenames(model) == [newest.filename, "photo_gui_3.webp"]
+            assert events == [("remove", 1, 1), ("insert", 0, 0)]
+
+            await Photo.filter(id=newest.id).update(status=PhotoStatus.FAILED)
+            await record_photo_events(PhotoEventKind.UPDATED, [newest.id])
+            feed.notify()
+            await _wait_for(lambda: model.totalCount == 4)
+            assert _filenames(model) == ["photo_gui_3.webp"]
+        finally:
+            await model.stop_following()
+            await close_db()
+
+    asyncio.run(scenario())
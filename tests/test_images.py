@@ -0,0 +1,163 @@
+"""Tests for the image processing service."""
+
+from datetime import datetime, timezone
+from io import BytesIO
+
+import pytest
+from PIL import ExifTags, Image
+
+from fotacos.services.encoding import ENCODING_PROFILES
+from fotacos.services.images import PhotoMetadata, generate_thumbnail, process_image, read_metadata, save_image
+from fotacos.services.placeholders import blurhash
+
+
+def _make_image(size: tuple[int, int], mode: str = "RGB", fmt: str = "JPEG", orientation: int | None = None) -> BytesIO:
+    """Create an in-memory image, optionally tagged with an EXIF orientation."""
+    img = Image.new(mode, size, (255, 0, 0, 128) if mode == "RGBA" else "red")
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    buffer = BytesIO()
+    img.save(buffer, fmt, exif=exif)
+    buffer.seek(0)
+    return buffer
+
+
+def test_process_image_produces_full_image_and_thumbnails():
+    """Test that a single pass yields the full image and every requested thumbnail size."""
+    processed = process_image(_make_image((1200, 800)), thumbnail_sizes=[300, 100])
+
+    with Image.open(processed.full) as full:
+        assert full.format == "WEBP"
+        assert full.size == (1200, 800)
+    with Image.open(processed.thumbnails[300]) as thumbnail:
+        assert thumbnail.size == (300, 200)
+    with Image.open(processed.thumbnails[100]) as thumbnail:
+        assert thumbnail.size == (100, 67)
+
+
+def test_process_image_applies_exif_orientation():
+    """Test that rotated photos are stored upright."""
+    processed = process_image(_make_image((400, 200), orientation=6), thumbnail_sizes=[100])
+
+    assert (processed.width, processed.height) == (200, 400)
+    with Image.open(processed.thumbnails[100]) as thumbnail:
+        assert thumbnail.size == (50, 100)
+
+
+def test_process_image_limits_max_dimension():
+    """Test that the full image is downscaled to the configured bound."""
+    processed = process_image(_make_image((3000, 1500)), thumbnail_sizes=[], max_dimension=1000)
+
+    assert (processed.width, processed.height) == (1000, 500)
+
+
+def test_process_image_keeps_transparency_only_in_full_image():
+    """Test that the full image keeps alpha while thumbnails are flattened."""
+    processed = process_image(_make_image((200, 200), mode="RGBA", fmt="PNG"), thumbnail_sizes=[50])
+
+    with Image.open(processed.full) as full:
+        assert full.mode == "RGBA"
+    with Image.open(processed.thumbnails[50]) as thumbnail:
+        assert thumbnail.mode == "RGB"
+
+
+def test_generate_thumbnail_fits_requested_size():
+    """Test that standalone thumbnails keep the aspect ratio within the bounding box."""
+    with Image.open(generate_thumbnail(_make_image((2000, 1000)), size=(300, 300))) as thumbnail:
+        assert thumbnail.size == (300, 150)
+
+
+def test_read_metadata_looks_up_capture_details():
+    """Test that capture time, camera, GPS position and orientation are read from EXIF."""
+    exif = Image.Exif()
+    exif[ExifTags.Base.Make] = "Canon"
+    exif[ExifTags.Base.Model] = "Canon EOS R6\x00"
+    exif[ExifTags.Base.Orientation] = 6
+    exif.get_ifd(ExifTags.IFD.Exif).update({
+        ExifTags.Base.DateTimeOriginal: "2024:05:01 14:30:00",
+        ExifTags.Base.OffsetTimeOriginal: "+02:00",
+    })
+    exif.get_ifd(ExifTags.IFD.GPSInfo).update({
+        ExifTags.GPS.GPSLatitudeRef: "N",
+        ExifTags.GPS.GPSLatitude: (40.0, 25.0, 12.0),
+        ExifTags.GPS.GPSLongitudeRef: "W",
+        ExifTags.GPS.GPSLongitude: (3.0, 42.0, 0.0),
+    })
+    buffer = BytesIO()
+    Image.new("RGB", (400, 200), "red").save(buffer, "JPEG", exif=exif)
+
+    processed = process_image(buffer, thumbnail_sizes=[])
+    metadata = processed.metadata
+
+    assert metadata.taken_at == datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    assert metadata.camera == "Canon EOS R6"
+    assert metadata.latitude == pytest.approx(40.42)
+    assert metadata.longitude == pytest.approx(-3.7)
+    assert metadata.orientation == 6
+    assert (processed.width, processed.height) == (200, 400)
+
+
+def test_read_metadata_without_exif_is_empty():
+    """Test that images without EXIF data report no capture details."""
+    with Image.open(_make_image((10, 10), fmt="PNG")) as img:
+        assert read_metadata(img) == PhotoMetadata()
+
+
+def test_encoding_profiles_control_lossless_graphics_size_and_metadata():
+    """Test that profiles encode graphics losslessly, cap the size and keep or strip EXIF data."""
+    graphic = Image.new("RGB", (200, 100), "white")
+    graphic.paste((0, 0, 255), (50, 25, 150, 75))
+    buffer = BytesIO()
+    graphic.save(buffer, "PNG")
+    lossless = process_image(buffer, thumbnail_sizes=[], profile=ENCODING_PROFILES["balanced"]).full.read()
+    lossy = process_image(buffer, thumbnail_sizes=[], profile=ENCODING_PROFILES["fast"]).full.read()
+    # The first chunk of a WebP file names its bitstream: VP8L is lossless, "VP8 " lossy
+    assert lossless[12:16] == b"VP8L"
+    assert lossy[12:16] == b"VP8 "
+
+    photo = _make_image((5000, 2500), orientation=6)
+    fast = process_image(photo, thumbnail_sizes=[], profile=ENCODING_PROFILES["fast"])
+    assert (fast.width, fast.height) == (2048, 4096)
+    with Image.open(fast.full) as full:
+        assert not full.getexif()
+
+    archival = process_image(
+        _make_image((400, 200), orientation=6), thumbnail_sizes=[], profile=ENCODING_PROFILES["archival"]
+    )
+    with Image.open(archival.full) as full:
+        assert full.size == (200, 400)
+        assert full.getexif()[ExifTags.Base.Orientation] == 1
+
+
+def test_save_image_writes_sibling_formats(tmp_path):
+    """Test that every output is also encoded in the requested sibling formats."""
+    source = tmp_path / "source.jpg"
+    source.write_bytes(_make_image((800, 600)).getvalue())
+    full_path, thumbnail_path = tmp_path / "photo.webp", tmp_path / "thumbnails" / "photo.webp"
+
+    save_image(source, full_path, {100: thumbnail_path}, None, None, ENCODING_PROFILES["fast"], ["avif"])
+
+    for path in (full_path.with_suffix(".avif"), thumbnail_path.with_suffix(".avif")):
+        with Image.open(path) as sibling:
+            assert sibling.format == "AVIF"
+    with Image.open(thumbnail_path.with_suffix(".avif")) as thumbnail:
+        assert max(thumbnail.size) == 100
+
+
+def test_save_image_computes_placeholder_from_smallest_rendition(tmp_path):
+    """Test that the BlurHash and dominant colour describe the image, mostly blue with a red stripe."""
+    image = Image.new("RGB", (900, 600), "blue")
+    image.paste((255, 0, 0), (0, 0, 900, 150))
+    source = tmp_path / "source.png"
+    image.save(source)
+
+    saved = save_image(source, tmp_path / "photo.webp", {200: tmp_path / "thumbnails" / "photo.webp"})
+
+    assert saved.placeholder is not None
+    assert saved.placeholder.dominant_color == "#0000ff"
+    hash_ = saved.placeholder.blurhash
+    # Size flag of 4x3 components, then the maximum AC value, the average colour and 11 AC components
+    assert hash_[0] == "L"
+    assert len(hash_) == 6 + 2 * 11
+    assert blurhash(Image.new("RGB", (8, 8), (255, 0, 0)))[2:6] == "TI:j"  # DC of pure red, 0xff0000
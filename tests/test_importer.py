@@ -0,0 +1,52 @@
+"""Tests for the bulk photo importer."""
+
+import asyncio
+from io import BytesIO
+
+from PIL import Image
+
+from fotacos.database import close_db, init_db
+from fotacos.models import Photo
+from fotacos.services.importer import ImportState, PhotoImporter
+
+
+def _jpeg(color: str) -> bytes:
+    """Create an in-memory JPEG image."""
+    buffer = BytesIO()
+    Image.new("RGB", (320, 240), color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def test_import_is_batched_deduplicated_and_resumable(tmp_path):
+    """Test importing a directory, then rerunning it without redoing any work."""
+    source_dir = tmp_path / "usb"
+    (source_dir / "nested").mkdir(parents=True)
+    (source_dir / "a.jpg").write_bytes(_jpeg("red"))
+    (source_dir / "nested" / "b.jpg").write_bytes(_jpeg("blue"))
+    (source_dir / "copy-of-a.jpg").write_bytes(_jpeg("red"))
+    (source_dir / "broken.jpg").write_bytes(b"not an image")
+    (source_dir / "notes.txt").write_text("ignored")
+    progress = []
+
+    async def scenario():
+        await init_db()
+        try:
+            importer = PhotoImporter(
+                ImportState(tmp_path / "state.json"), batch_size=1, concurrency=2, on_progress=progress.append
+            )
+            first = await importer.run([source_dir])
+            photos = await Photo.all()
+
+            rerun = PhotoImporter(ImportState(tmp_path / "state.json"), batch_size=1, concurrency=2)
+            second = await rerun.run([source_dir])
+            return first, second, photos
+        finally:
+            await close_db()
+
+    first, second, photos = asyncio.run(scenario())
+
+    assert (first.found, first.imported, first.duplicates, first.failed) == (4, 2, 1, 1)
+    assert len(photos) == 2
+    assert all(photo.derivatives_version for photo in photos)
+    assert len(progress) >= 2
+    assert (second.skipped, second.imported) == (4, 0)
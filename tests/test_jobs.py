@@ -0,0 +1,132 @@
+"""Tests for the background job queue."""
+
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from tortoise import timezone
+from tortoise.exceptions import OperationalError
+
+from fotacos.api import app
+from fotacos.database import close_db, init_db
+from fotacos.env import get_settings
+from fotacos.models import Job, JobKind, JobStatus, Photo
+from fotacos.services import (
+    JobRunner,
+    full_image_key,
+    get_encoding_profile,
+    get_storage,
+    store_derivatives,
+    thumbnail_key,
+)
+
+
+@pytest.fixture
+def client():
+    """Provide a test client with the application lifespan running."""
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_rebuild_regenerates_stale_thumbnails(client):
+    """Test that photos built with other thumbnail settings are queued and regenerated."""
+    settings = get_settings()
+    full_image = get_storage().local_path(full_image_key("photo_stale.webp"))
+    full_image.parent.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", (800, 600), "purple").save(full_image, "WEBP")
+    photo = Photo(
+        filename="photo_stale.webp",
+        original_url="",
+        thumbnail_url="/public/picts/thumbnails/photo_stale.webp",
+        derivatives_version="thumb:1:q1",
+    )
+    client.portal.call(photo.save)
+
+    assert client.post("/api/jobs/derivatives").json() == {"queued": 1}
+    assert client.post("/api/jobs/derivatives").json() == {"queued": 0}
+
+    job = client.portal.call(Job.filter(photo_id=photo.id).first)
+    deadline = time.monotonic() + 20
+    while client.get(f"/api/jobs/{job.id}").json()["status"] != "done":
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+    with Image.open(get_storage().local_path(thumbnail_key("photo_stale.webp"))) as thumbnail:
+        assert max(thumbnail.size) == settings.thumbnail_size
+    assert client.post("/api/jobs/derivatives").json() == {"queued": 0}
+    thumbnail_url = client.get(f"/api/photos/{photo.id}").json()["thumbnail_url"]
+    assert thumbnail_url.startswith("/public/picts/thumbnails/photo_stale.webp?v=")
+
+
+def test_regenerating_thumbnails_keeps_the_full_image_size(client):
+    """Test that thumbnails regenerated from the full image report its size, not the profile's limit."""
+    full_image = get_storage().local_path(full_image_key("photo_wide.webp"))
+    full_image.parent.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", (5000, 40), "teal").save(full_image, "WEBP")
+    profile = get_encoding_profile("fast")
+    assert profile.max_dimension < 5000
+
+    saved = client.portal.call(
+        lambda: store_derivatives(full_image, "photo_wide.webp", include_full=False, profile=profile, formats=[])
+    )
+
+    assert (saved.width, saved.height) == (5000, 40)
+    with Image.open(full_image) as stored:
+        assert stored.size == (5000, 40)
+
+
+def test_running_jobs_are_taken_over_once_their_lease_expires():
+    """Test that a job left running by a crashed worker is claimed again, but not one still renewing its lease."""
+
+    async def scenario():
+        await init_db()
+        try:
+            now = timezone.now()
+            abandoned, active = [
+                await Job.create(
+                    kind=JobKind.DERIVATIVES,
+                    photo=await Photo.create(filename=filename, original_url="", thumbnail_url=""),
+                    status=JobStatus.RUNNING,
+                    attempts=1,
+                    run_after=now,
+                )
+                for filename in ("photo_abandoned.webp", "photo_active.webp")
+            ]
+            await Job.filter(id=abandoned.id).update(updated_at=now - timedelta(seconds=60))
+            runner = JobRunner(concurrency=1, max_attempts=5, retry_delay=0, poll_interval=1, lease_timeout=30)
+
+            job = await runner._claim_next()
+            assert (job.id, job.attempts) == (abandoned.id, 2)
+            assert await runner._claim_next() is None
+            await active.refresh_from_db()
+            assert active.attempts == 1
+        finally:
+            await close_db()
+
+    asyncio.run(scenario())
+
+
+def test_runner_keeps_claiming_after_a_database_error(monkeypatch):
+    """Test that an error while claiming a job is retried instead of stopping the runner."""
+
+    async def scenario():
+        runner = JobRunner(concurrency=1, max_attempts=5, retry_delay=0, poll_interval=0.01, lease_timeout=30)
+        calls = []
+
+        async def claim_next():
+            calls.append(None)
+            if len(calls) == 1:
+                raise OperationalError
+            return None
+
+        monkeypatch.setattr(runner, "_claim_next", claim_next)
+        runner.start(recover=False)
+        while len(calls) < 3:
+            await asyncio.sleep(0.01)
+        assert not runner._task.done()
+        await runner.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,80 @@
+"""Tests for static photo serving."""
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+from fotacos.api import app
+from fotacos.api.media import MediaFiles
+from fotacos.services import S3Storage, get_storage
+
+
+@pytest.fixture
+def client():
+    """Provide a test client with the application lifespan running."""
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def stored_image():
+    """Write a WebP file and an AVIF sibling into storage."""
+    webp, avif = (get_storage().local_path(f"photo_media.{suffix}") for suffix in ("webp", "avif"))
+    webp.parent.mkdir(parents=True, exist_ok=True)
+    webp.write_bytes(b"webp-bytes" * 10)
+    avif.write_bytes(b"avif-bytes")
+    yield "/public/picts/photo_media.webp"
+    webp.unlink()
+    avif.unlink()
+
+
+def test_media_is_served_immutable_with_strong_etag(client, stored_image):
+    """Test caching headers and conditional requests on stored photos."""
+    response = client.get(stored_image, headers={"Accept": "image/webp"})
+    assert response.status_code == 200
+    assert response.content == b"webp-bytes" * 10
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert response.headers["vary"] == "Accept"
+    etag = response.headers["etag"]
+    assert not etag.startswith("W/")
+
+    revalidated = client.get(stored_image, headers={"Accept": "image/webp", "If-None-Match": etag})
+    assert revalidated.status_code == 304
+
+
+def test_media_supports_range_requests(client, stored_image):
+    """Test that a byte range of a stored photo can be fetched."""
+    response = client.get(stored_image, headers={"Accept": "image/webp", "Range": "bytes=0-3"})
+    assert response.status_code == 206
+    assert response.content == b"webp"
+    assert response.headers["content-range"] == "bytes 0-3/100"
+
+
+def test_media_negotiates_preferred_format(client, stored_image):
+    """Test that clients accepting AVIF get the AVIF sibling and others the requested file."""
+    avif = client.get(stored_image, headers={"Accept": "image/avif,image/webp,*/*;q=0.8"})
+    assert avif.content == b"avif-bytes"
+    assert avif.headers["content-type"] == "image/avif"
+
+    refused = client.get(stored_image, headers={"Accept": "image/avif;q=0,image/webp"})
+    assert refused.content == b"webp-bytes" * 10
+
+    fallback = client.get(stored_image, headers={"Accept": "*/*"})
+    assert fallback.content == b"webp-bytes" * 10
+    assert fallback.headers["etag"] != avif.headers["etag"]
+
+
+def test_media_redirects_to_remote_storage():
+    """Test that files in a remote storage backend are served by redirecting to a presigned URL."""
+    storage = S3Storage("http://objects.test", "photos", "test", "secret")
+    media_app = Starlette(routes=[Mount("/picts", MediaFiles(storage=storage, redirect_max_age=300))])
+
+    with TestClient(media_app) as test_client:
+        response = test_client.get("/picts/thumbnails/photo_remote.webp", follow_redirects=False)
+        escaping = test_client.get("/picts/..%2Fsecret.webp", follow_redirects=False)
+
+    assert response.status_code == 307
+    assert response.headers["location"].startswith("http://objects.test/photos/thumbnails/photo_remote.webp?")
+    assert response.headers["cache-control"] == "private, max-age=300"
+    assert escaping.status_code == 404
@@ -0,0 +1,122 @@
+"""Tests for the metrics endpoint and request IDs."""
+
+import json
+import multiprocessing
+import os
+import time
+from io import BytesIO
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from fotacos.api import app
+from fotacos.metrics import (
+    REGISTRY,
+    STORAGE_BYTES_WRITTEN,
+    Counter,
+    Gauge,
+    Histogram,
+    MetricsRegistry,
+    UnknownLabelsError,
+    render_shared,
+)
+
+
+def _samples(text: str) -> dict[str, float]:
+    """Parse the sample lines of a text exposition into values keyed by name and labels."""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            series, _, value = line.rpartition(" ")
+            samples[series] = float(value)
+    return samples
+
+
+def test_metric_rendering_follows_the_exposition_format():
+    """Test cumulative histogram buckets, label escaping and label validation."""
+    histogram = Histogram("test_seconds", "Test durations", ("stage",), buckets=(0.1, 1.0))
+    counter = Counter("test_total", "Test events", ("name",))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, stage="decode")
+    counter.inc(2, name='say "hi"\n')
+
+    assert histogram.render().splitlines() == [
+        "# HELP test_seconds Test durations",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{stage="decode",le="0.1"} 1',
+        'test_seconds_bucket{stage="decode",le="1.0"} 2',
+        'test_seconds_bucket{stage="decode",le="+Inf"} 3',
+        'test_seconds_sum{stage="decode"} 5.55',
+        'test_seconds_count{stage="decode"} 3',
+    ]
+    assert counter.render().splitlines()[-1] == 'test_total{name="say \\"hi\\"\\n"} 2.0'
+    with pytest.raises(UnknownLabelsError):
+        counter.inc(route="/")
+
+
+def test_metrics_report_requests_image_stages_queries_and_storage():
+    """Test that an upload shows up in every group of metrics, labelled by route template."""
+    buffer = BytesIO()
+    Image.new("RGB", (320, 240), "green").save(buffer, "JPEG")
+
+    with TestClient(app) as client:
+        response = client.post("/api/photos", files={"file": ("metrics.jpg", buffer.getvalue(), "image/jpeg")})
+        photo_id = response.json()["id"]
+        deadline = time.monotonic() + 20
+        while client.get(f"/api/photos/{photo_id}").json()["status"] == "pending" and time.monotonic() < deadline:
+            time.sleep(0.05)
+        response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = _samples(response.text)
+    assert samples['fotacos_http_requests_total{method="POST",route="/api/photos",status="202"}'] >= 1
+    assert samples['fotacos_http_request_duration_seconds_count{method="GET",route="/api/photos/{photo_id}"}'] >= 1
+    # The metrics request itself is in flight while it renders
+    assert samples["fotacos_http_requests_in_flight"] >= 1
+    for stage in ("decode", "orient", "resize", "encode_webp"):
+        assert samples[f'fotacos_image_stage_duration_seconds_count{{stage="{stage}"}}'] >= 1
+    assert samples['fotacos_db_query_duration_seconds_count{operation="select"}'] >= 1
+    assert samples['fotacos_db_query_duration_seconds_count{operation="insert"}'] >= 1
+    assert samples['fotacos_storage_bytes_written_total{backend="local"}'] > 0
+
+
+def test_requests_carry_an_id():
+    """Test that a safe client request ID is echoed and a new one replaces a missing or unsafe one."""
+    with TestClient(app) as client:
+        echoed = client.get("/api/jobs", headers={"X-Request-ID": "client-42"})
+        generated = client.get("/api/jobs")
+        replaced = client.get("/api/jobs", headers={"X-Request-ID": "bad id\twith spaces"})
+
+    assert echoed.headers["x-request-id"] == "client-42"
+    assert len(generated.headers["x-request-id"]) == 32
+    assert replaced.headers["x-request-id"] not in {"bad id\twith spaces", generated.headers["x-request-id"]}
+
+
+def test_metrics_of_web_workers_are_summed(tmp_path):
+    """Test that a scrape sums the snapshots of every worker, leaving out the gauges of workers that exited."""
+    registry = MetricsRegistry()
+    requests = registry.register(Counter("test_requests_total", "Test requests", ("route",)))
+    in_flight = registry.register(Gauge("test_in_flight", "Test requests in flight"))
+    durations = registry.register(Histogram("test_seconds", "Test durations", buckets=(0.1, 1.0)))
+    requests.inc(route="/a")
+    in_flight.inc()
+    durations.observe(0.05)
+    snapshot = json.loads(json.dumps(registry.snapshot()))
+
+    samples = _samples(registry.render_merged([(snapshot, True), (snapshot, False)]))
+    assert samples['test_requests_total{route="/a"}'] == 2
+    assert samples["test_in_flight"] == 1
+    assert samples['test_seconds_bucket{le="0.1"}'] == 2
+    assert samples["test_seconds_sum"] == 0.1
+
+    # The scraped worker writes its own snapshot next to the one of a worker that exited
+    STORAGE_BYTES_WRITTEN.inc(100, backend="shared")
+    exited = multiprocessing.Process(target=int)
+    exited.start()
+    exited.join()
+    (tmp_path / f"{exited.pid}.json").write_text(json.dumps(REGISTRY.snapshot()))
+    samples = _samples(render_shared(tmp_path))
+    assert (tmp_path / f"{os.getpid()}.json").exists()
+    assert samples['fotacos_storage_bytes_written_total{backend="shared"}'] == 200
@@ -0,0 +1,417 @@
+"""Tests for the photo API routes."""
+
+import json
+import time
+from datetime import datetime, timezone
+from io import BytesIO
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import ExifTags, Image
+
+from fotacos.api import app
+from fotacos.api.cache import ResponseCache, photo_list_cache
+from fotacos.api.routes.photos import photo_events
+from fotacos.env import get_settings
+from fotacos.models import Photo
+from fotacos.services import available_sibling_formats, get_storage, latest_sequence, sibling_key, thumbnail_key
+
+
+def _make_jpeg(size: tuple[int, int] = (640, 480), color: str = "red") -> bytes:
+    """Create an in-memory JPEG image."""
+    buffer = BytesIO()
+    Image.new("RGB", size, color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def _wait_until_ready(client: TestClient, photo_id: int, timeout: float = 20) -> dict:
+    """Poll a photo until its derivatives have been generated."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        photo = client.get(f"/api/photos/{photo_id}").json()
+        if photo["status"] != "pending":
+            return photo
+        time.sleep(0.05)
+    pytest.fail(f"Photo {photo_id} still pending after {timeout}s")
+
+
+@pytest.fixture
+def client():
+    """Provide a test client with the application lifespan running."""
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_upload_list_and_delete_photo(client):
+    """Test the full upload, listing and deletion flow."""
+    response = client.post("/api/photos", files={"file": ("holiday.jpg", _make_jpeg(), "image/jpeg")})
+    assert response.status_code == 202
+    assert response.json()["status"] == "pending"
+
+    photo = _wait_until_ready(client, response.json()["id"])
+    assert photo["status"] == "ready"
+    assert photo["filename"].endswith(".webp")
+    assert photo["file_size"] > 0
+    assert photo["dominant_color"].startswith("#f")
+    assert len(photo["blurhash"]) == 28
+    assert client.get(photo["thumbnail_url"]).status_code == 200
+
+    listing = client.get("/api/photos").json()
+    assert listing["total"] == 1
+    assert listing["photos"][0]["id"] == photo["id"]
+
+    response = client.delete(f"/api/photos/{photo['id']}")
+    assert response.status_code == 200
+    assert client.get("/api/photos").json()["total"] == 0
+
+
+def test_photo_image_renders_resized_variant(client):
+    """Test that the image endpoint serves a resized variant in the requested format."""
+    response = client.post("/api/photos", files={"file": ("wide.jpg", _make_jpeg((800, 400)), "image/jpeg")})
+    photo_id = _wait_until_ready(client, response.json()["id"])["id"]
+
+    response = client.get(f"/api/photos/{photo_id}/image", params={"w": 200, "fmt": "jpeg"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    with Image.open(BytesIO(response.content)) as variant:
+        assert variant.size == (200, 100)
+
+    assert client.get(f"/api/photos/{photo_id}/image", params={"w": 0}).status_code == 422
+    assert client.get("/api/photos/9999/image").status_code == 404
+
+
+def test_photo_sprites_pack_the_thumbnails_of_a_page(client):
+    """Test that the sprite sheet of a listing page holds its ready photos in listing order."""
+    ids = []
+    for color in ("red", "blue", "green"):
+        response = client.post("/api/photos", files={"file": (f"{color}.jpg", _make_jpeg(color=color), "image/jpeg")})
+        ids.append(_wait_until_ready(client, response.json()["id"])["id"])
+
+    sprites = client.get("/api/photos/sprites", params={"limit": 2}).json()
+    listing = client.get("/api/photos", params={"limit": 2}).json()
+    assert [tile["id"] for tile in sprites["tiles"]] == [photo["id"] for photo in listing["photos"]]
+    assert sprites["next_cursor"] == listing["next_cursor"]
+    tile_size = sprites["tile_size"]
+    assert [(tile["x"], tile["y"], tile["width"]) for tile in sprites["tiles"]] == [
+        (0, 0, tile_size),
+        (tile_size, 0, tile_size),
+    ]
+
+    response = client.get(sprites["sheet_url"])
+    assert response.status_code == 200
+    assert "immutable" in response.headers["cache-control"]
+    with Image.open(BytesIO(response.content)) as sheet:
+        assert sheet.size == (sprites["width"], sprites["height"]) == (2 * tile_size, tile_size)
+
+    last_page = client.get("/api/photos/sprites", params={"limit": 2, "cursor": sprites["next_cursor"]}).json()
+    assert [tile["id"] for tile in last_page["tiles"]] == [ids[0]]
+    assert client.get("/api/photos/sprites/not-a-sheet.webp").status_code == 404
+
+
+def test_upload_of_duplicate_returns_existing_photo(client):
+    """Test that re-uploading identical bytes reuses the stored photo."""
+    content = _make_jpeg(color="blue")
+    first = client.post("/api/photos", files={"file": ("a.jpg", content, "image/jpeg")})
+    second = client.post("/api/photos", files={"file": ("b.jpg", content, "image/jpeg")})
+
+    assert first.status_code == 202
+    assert second.status_code == 200
+    assert second.json()["id"] == first.json()["id"]
+    assert client.get("/api/photos").json()["total"] == 1
+
+
+def test_upload_rejects_oversized_file(client, monkeypatch):
+    """Test that uploads beyond the configured limit are refused."""
+    monkeypatch.setattr(get_settings(), "max_upload_size", 100)
+    response = client.post("/api/photos", files={"file": ("big.jpg", _make_jpeg(), "image/jpeg")})
+    assert response.status_code == 413
+
+
+def test_upload_rejects_content_that_is_not_an_image(client):
+    """Test that the file signature is checked, not just the extension and MIME type."""
+    response = client.post("/api/photos", files={"file": ("fake.jpg", b"<html>not a photo</html>", "image/jpeg")})
+    assert response.status_code == 400
+
+
+def test_upload_rejects_disallowed_extension(client):
+    """Test that files with unsupported extensions are rejected."""
+    response = client.post("/api/photos", files={"file": ("notes.txt", b"hello", "text/plain")})
+    assert response.status_code == 400
+
+
+def test_list_photos_paginates_with_cursor(client):
+    """Test that pages follow each other without gaps or duplicates."""
+    photos = [
+        Photo(filename=f"photo_{i}.webp", original_url=f"/public/picts/photo_{i}.webp", thumbnail_url="", file_size=i)
+        for i in range(5)
+    ]
+    client.portal.call(Photo.bulk_create, photos)
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2} | ({"cursor": cursor} if cursor else {})
+        page = client.get("/api/photos", params=params).json()
+        assert page["total"] == 5
+        seen.extend(photo["filename"] for photo in page["photos"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == [f"photo_{i}.webp" for i in reversed(range(5))]
+
+
+def test_upload_records_capture_metadata(client):
+    """Test that the capture time and camera of an upload are stored with its dimensions."""
+    exif = Image.Exif()
+    exif[ExifTags.Base.Model] = "Pixel 8"
+    exif.get_ifd(ExifTags.IFD.Exif)[ExifTags.Base.DateTimeOriginal] = "2023:07:14 09:15:00"
+    buffer = BytesIO()
+    Image.new("RGB", (300, 600), "green").save(buffer, "JPEG", exif=exif)
+
+    response = client.post("/api/photos", files={"file": ("pixel.jpg", buffer.getvalue(), "image/jpeg")})
+    photo = _wait_until_ready(client, response.json()["id"])
+
+    assert photo["taken_at"] == "2023-07-14T09:15:00+00:00"
+    assert photo["camera"] == "Pixel 8"
+    assert (photo["width"], photo["height"], photo["orientation"]) == (300, 600, "portrait")
+
+
+def test_list_photos_filters_and_sorts_by_capture_time(client):
+    """Test the date range, camera and orientation filters of the capture time ordered listing."""
+    rows = [
+        ("beach", datetime(2022, 8, 1, tzinfo=timezone.utc), "Canon EOS R6", "landscape"),
+        ("city", datetime(2023, 3, 1, tzinfo=timezone.utc), "Pixel 8", "portrait"),
+        ("forest", datetime(2021, 5, 1, tzinfo=timezone.utc), "Canon EOS R6", "portrait"),
+        ("lake", datetime(2023, 9, 1, tzinfo=timezone.utc), "Canon EOS R6", "landscape"),
+    ]
+    photos = [
+        Photo(
+            filename=f"{name}.webp",
+            original_url="",
+            thumbnail_url="",
+            taken_at=taken_at,
+            camera=camera,
+            orientation=orientation,
+        )
+        for name, taken_at, camera, orientation in rows
+    ]
+    client.portal.call(Photo.bulk_create, photos)
+
+    def names(**params) -> list[str]:
+        return [
+            photo["filename"].removesuffix(".webp")
+            for photo in client.get("/api/photos", params=params).json()["photos"]
+        ]
+
+    assert names() == ["lake", "city", "beach", "forest"]
+    assert names(sort="created_at") == ["lake", "forest", "city", "beach"]
+    assert names(taken_after="2022-01-01", taken_before="2023-06-01") == ["city", "beach"]
+    assert names(camera="Canon EOS R6", orientation="landscape") == ["lake", "beach"]
+
+    page = client.get("/api/photos", params={"camera": "Canon EOS R6", "limit": 2}).json()
+    assert page["total"] == 3
+    rest = client.get("/api/photos", params={"camera": "Canon EOS R6", "cursor": page["next_cursor"]}).json()
+    assert [photo["filename"] for photo in rest["photos"]] == ["forest.webp"]
+    assert client.get("/api/photos", params={"sort": "created_at", "cursor": page["next_cursor"]}).status_code == 400
+    assert client.get("/api/photos", params={"orientation": "diagonal"}).status_code == 422
+
+
+def test_list_photos_rejects_invalid_cursor(client):
+    """Test that a malformed cursor is reported as a client error."""
+    assert client.get("/api/photos", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_list_photos_answers_conditional_requests(client):
+    """Test that unchanged listings return 304 until a photo is deleted."""
+    photo = Photo(filename="photo_a.webp", original_url="/public/picts/photo_a.webp", thumbnail_url="")
+    client.portal.call(photo.save)
+
+    response = client.get("/api/photos")
+    etag = response.headers["ETag"]
+    assert response.status_code == 200
+
+    response = client.get("/api/photos", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    client.delete(f"/api/photos/{photo.id}")
+    response = client.get("/api/photos", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["total"] == 0
+
+
+def test_list_photos_drops_cached_pages_after_writes_by_other_processes(client, monkeypatch):
+    """Test that a changed database data version invalidates listings cached by this process."""
+    version = iter(range(1, 100))
+    current = next(version)
+
+    async def data_version() -> int:
+        return current
+
+    monkeypatch.setattr("fotacos.api.routes.photos.data_version", data_version)
+    monkeypatch.setattr(photo_list_cache, "sync_interval", 0)
+    assert client.get("/api/photos").json()["total"] == 0
+
+    # Saved behind the API's back, as another web worker or the import command would
+    photo = Photo(filename="photo_b.webp", original_url="/public/picts/photo_b.webp", thumbnail_url="")
+    client.portal.call(photo.save)
+    assert client.get("/api/photos").json()["total"] == 0
+
+    current = next(version)
+    assert client.get("/api/photos").json()["total"] == 1
+
+
+def test_list_cache_checks_the_data_version_at_most_once_per_interval():
+    """Test that cached pages are served without reading the data version again within the sync interval."""
+    cache = ResponseCache(max_entries=4, sync_interval=60)
+    assert cache.sync_due()
+    assert not cache.sync_due()
+    assert ResponseCache(max_entries=4, sync_interval=0).sync_due()
+
+
+def _read_events(client: TestClient, last_event_id: int, count: int) -> list[tuple[str, str, dict]]:
+    """Read change feed events from the events route until `count` were received."""
+
+    async def read():
+        response = await photo_events(last_event_id=last_event_id)
+        events, buffer = [], ""
+        try:
+            async for chunk in response.body_iterator:
+                buffer += chunk.decode() if isinstance(chunk, bytes) else chunk
+                *blocks, buffer = buffer.split("\n\n")
+                for block in blocks:
+                    fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+                    if "event" in fields:
+                        events.append((fields["id"], fields["event"], json.loads(fields["data"])))
+                if len(events) >= count:
+                    return events
+        finally:
+            await response.body_iterator.aclose()
+
+    return client.portal.call(read)
+
+
+def test_photo_events_stream_changes_and_resume(client):
+    """Test that uploads, processing and deletion are streamed as events from a resumed position."""
+    start = client.portal.call(latest_sequence)
+    photo_id = client.post("/api/photos", files={"file": ("live.jpg", _make_jpeg(), "image/jpeg")}).json()["id"]
+    _wait_until_ready(client, photo_id)
+
+    events = _read_events(client, start, 2)
+    assert [(event, data["id"], data["status"]) for _, event, data in events] == [
+        ("added", photo_id, "ready"),
+        ("updated", photo_id, "ready"),
+    ]
+    assert [int(sequence) for sequence, _, _ in events] == [start + 1, start + 2]
+
+    client.delete(f"/api/photos/{photo_id}")
+    assert _read_events(client, start + 2, 1) == [(str(start + 3), "removed", {"id": photo_id})]
+
+    # Clients resuming from a change the feed does not know about are told to reload
+    assert _read_events(client, start + 10, 1) == [(str(start + 3), "reset", {"sequence": start + 3})]
+
+
+def test_resumable_upload_survives_interrupted_chunks(client):
+    """Test creating a resumable upload, resuming after a rejected chunk and finishing it."""
+    content = _make_jpeg((900, 600), "purple")
+    response = client.post(
+        "/api/photos/uploads", params={"filename": "large.jpg"}, headers={"Upload-Length": str(len(content))}
+    )
+    assert response.status_code == 201
+    location = response.headers["location"]
+    assert response.headers["upload-offset"] == "0"
+    assert response.headers["upload-expires"].endswith("GMT")
+
+    def patch(offset, chunk):
+        headers = {"Upload-Offset": str(offset), "Content-Type": "application/offset+octet-stream"}
+        return client.patch(location, content=chunk, headers=headers)
+
+    half = len(content) // 2
+    assert patch(0, content[:half]).headers["upload-offset"] == str(half)
+    # A chunk resent from the start, as after a connection dropped before the response arrived
+    conflict = patch(0, content[:half])
+    assert conflict.status_code == 409
+    assert conflict.headers["upload-offset"] == str(half)
+    assert client.head(location).headers["upload-offset"] == str(half)
+    assert client.post(f"{location}/finish").status_code == 409
+
+    assert patch(half, content[half:]).status_code == 204
+    response = client.post(f"{location}/finish")
+    assert response.status_code == 202
+    photo = _wait_until_ready(client, response.json()["id"])
+    assert (photo["status"], photo["width"], photo["height"]) == ("ready", 900, 600)
+    assert client.head(location).status_code == 404
+
+
+def test_resumable_upload_rejects_invalid_uploads(client):
+    """Test the size limit, the content type of chunks and content that is not an image."""
+    too_large = str(get_settings().max_upload_size + 1)
+    response = client.post("/api/photos/uploads", params={"filename": "a.jpg"}, headers={"Upload-Length": too_large})
+    assert response.status_code == 413
+    response = client.post("/api/photos/uploads", params={"filename": "a.txt"}, headers={"Upload-Length": "10"})
+    assert response.status_code == 400
+
+    location = client.post(
+        "/api/photos/uploads", params={"filename": "a.png"}, headers={"Upload-Length": "64"}
+    ).headers["location"]
+    response = client.patch(location, content=b"x" * 64, headers={"Upload-Offset": "0"})
+    assert response.status_code == 415
+    headers = {"Upload-Offset": "0", "Content-Type": "application/offset+octet-stream"}
+    assert client.patch(location, content=b"x" * 65, headers=headers).status_code == 413
+    assert client.patch(location, content=b"x" * 64, headers=headers).status_code == 400
+    assert client.head(location).status_code == 404
+
+
+def test_batch_upload_streams_per_file_results(client):
+    """Test that a batch reports each file and inserts the converted ones."""
+    red, green = _make_jpeg(color="red"), _make_jpeg(color="green")
+    files = [
+        ("files", ("red.jpg", red, "image/jpeg")),
+        ("files", ("green.jpg", green, "image/jpeg")),
+        ("files", ("red-again.jpg", red, "image/jpeg")),
+        ("files", ("broken.jpg", b"not an image", "image/jpeg")),
+    ]
+    response = client.post("/api/photos/batch", files=files)
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    statuses = {line["filename"]: line["status"] for line in lines if "index" in line}
+    assert statuses == {
+        "red.jpg": "created",
+        "green.jpg": "created",
+        "red-again.jpg": "duplicate",
+        "broken.jpg": "error",
+    }
+    assert lines[-1] == {"status": "done", "created": 2, "duplicates": 1, "failed": 1}
+    assert client.get("/api/photos").json()["total"] == 2
+
+
+def test_upload_stores_requested_sibling_formats(client):
+    """Test that an upload can ask for AVIF siblings, which clients accepting AVIF are served."""
+    response = client.post(
+        "/api/photos",
+        params={"profile": "fast", "formats": ["avif"]},
+        files={"file": ("garden.jpg", _make_jpeg(), "image/jpeg")},
+    )
+    photo = _wait_until_ready(client, response.json()["id"])
+    assert photo["status"] == "ready"
+    assert get_storage().local_path(sibling_key(thumbnail_key(photo["filename"]), "avif")).exists()
+
+    negotiated = client.get(photo["thumbnail_url"], headers={"Accept": "image/avif,image/webp"})
+    assert negotiated.headers["content-type"] == "image/avif"
+    assert client.get(photo["thumbnail_url"], headers={"Accept": "image/webp"}).headers["content-type"] == "image/webp"
+
+    client.delete(f"/api/photos/{photo['id']}")
+    assert not get_storage().local_path(sibling_key(thumbnail_key(photo["filename"]), "avif")).exists()
+
+
+@pytest.mark.skipif("jxl" in available_sibling_formats(), reason="JPEG XL encoder is installed")
+def test_upload_rejects_unavailable_sibling_format(client):
+    """Test that asking for a format Pillow cannot encode is refused before anything is stored."""
+    response = client.post(
+        "/api/photos", params={"formats": ["jxl"]}, files={"file": ("garden.jpg", _make_jpeg(), "image/jpeg")}
+    )
+    assert response.status_code == 400
+    assert client.get("/api/photos").json()["total"] == 0
@@ -0,0 +1,90 @@
+"""Tests for the sprite sheet cache."""
+
+import asyncio
+
+from PIL import Image
+
+from fotacos.services import LocalStorage, SpriteCache, SpritePhoto, thumbnail_key
+
+COLORS = {1: (255, 0, 0), 2: (0, 255, 0), 3: (0, 0, 255), 4: (255, 255, 0)}
+
+
+def _write_thumbnails(storage, photo_ids):
+    """Write a thumbnail of a distinct colour for each photo into storage."""
+    photos = []
+    for photo_id in photo_ids:
+        filename = f"photo_{photo_id}.webp"
+        path = storage.path(thumbnail_key(filename))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        Image.new("RGB", (300, 200), COLORS[photo_id]).save(path, "WEBP")
+        photos.append(SpritePhoto(photo_id, filename, "v1"))
+    return photos
+
+
+def _cell_colors(path, sheet):
+    """Colour at the centre of each cell of a sheet."""
+    with Image.open(path) as image:
+        image = image.convert("RGB")
+        return [image.getpixel((tile.x + tile.size // 2, tile.y + tile.size // 2)) for tile in sheet.tiles()]
+
+
+def _assert_close(actual, expected):
+    """Compare colours allowing for lossy encoding."""
+    for got, want in zip(actual, expected, strict=True):
+        assert all(abs(a - b) < 24 for a, b in zip(got, want, strict=True)), (got, want)
+
+
+def test_sheets_are_rebuilt_incrementally_when_a_page_changes(tmp_path):
+    """Test that a changed page copies the cells of remaining photos from its previous sheet."""
+    storage = LocalStorage(tmp_path / "picts")
+    first, second, third, fourth = _write_thumbnails(storage, [1, 2, 3, 4])
+    cache = SpriteCache(
+        storage, tmp_path / "sprites", max_bytes=10 * 1024 * 1024, tile_size=32, quality=90, max_pages=4
+    )
+
+    sheet = asyncio.run(cache.get("page", [first, second, third]))
+    assert (sheet.columns, sheet.width, sheet.height) == (2, 64, 64)
+    assert [(tile.photo_id, tile.x, tile.y) for tile in sheet.tiles()] == [(1, 0, 0), (2, 32, 0), (3, 0, 32)]
+    path = cache.path(sheet.name)
+    with Image.open(path) as image:
+        assert image.size == (64, 64)
+    _assert_close(_cell_colors(path, sheet), [COLORS[1], COLORS[2], COLORS[3]])
+    assert (cache.stats.tiles_rendered, cache.stats.tiles_copied) == (3, 0)
+
+    # A new photo at the top, one dropped off the end
+    changed = asyncio.run(cache.get("page", [fourth, first, second]))
+    assert changed.name != sheet.name
+    _assert_close(_cell_colors(cache.path(changed.name), changed), [COLORS[4], COLORS[1], COLORS[2]])
+    assert (cache.stats.tiles_rendered, cache.stats.tiles_copied) == (4, 2)
+    # Copied cells come from the lossless cells, so they are not encoded again with every rebuild
+    with Image.open(cache.cells_path(sheet.name)) as before, Image.open(cache.cells_path(changed.name)) as after:
+        assert after.crop(changed.box(1)).tobytes() == before.crop(sheet.box(0)).tobytes()
+
+    assert asyncio.run(cache.get("page", [fourth, first, second])) == changed
+    assert cache.stats.builds == 2
+    assert cache.stats.hits == 1
+    assert asyncio.run(cache.get("page", [])) is None
+
+    cache.discard(first.filename)
+    assert cache.path(changed.name) is None
+    assert cache.path("../picts/thumbnails/photo_1.webp") is None
+
+    reloaded = SpriteCache(storage, tmp_path / "sprites", max_bytes=1, tile_size=32, quality=90, max_pages=4)
+    reloaded.load()
+    assert reloaded.total_bytes == path.stat().st_size + cache.cells_path(sheet.name).stat().st_size
+
+
+def test_sheets_are_rendered_in_full_when_the_previous_sheet_is_gone(tmp_path):
+    """Test that a previous sheet evicted while a rebuild starts makes it render every cell instead of failing."""
+    storage = LocalStorage(tmp_path / "picts")
+    first, second, third, _ = _write_thumbnails(storage, [1, 2, 3, 4])
+    cache = SpriteCache(
+        storage, tmp_path / "sprites", max_bytes=10 * 1024 * 1024, tile_size=32, quality=90, max_pages=4
+    )
+
+    sheet = asyncio.run(cache.get("page", [first, second]))
+    # Evicted by another web worker after the sheet was found
+    cache.cells_path(sheet.name).unlink()
+    rebuilt = asyncio.run(cache.get("page", [third, first]))
+    _assert_close(_cell_colors(cache.path(rebuilt.name), rebuilt), [COLORS[3], COLORS[1]])
+    assert (cache.stats.tiles_rendered, cache.stats.tiles_copied) == (4, 0)
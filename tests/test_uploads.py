@@ -0,0 +1,79 @@
+"""Tests for resumable uploads."""
+
+import asyncio
+from datetime import timedelta
+
+import pytest
+from tortoise import timezone
+
+from fotacos.database import close_db, init_db
+from fotacos.models import UploadSession
+from fotacos.services import FileLock, UploadBusyError, append_chunk, collect_expired_uploads, create_upload
+from fotacos.services.uploads import upload_path, uploads_dir
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+async def _chunks(*parts):
+    """Yield chunks as a request body would."""
+    for part in parts:
+        yield part
+
+
+def test_expired_and_orphaned_uploads_are_collected():
+    """Test that sessions past their expiry are removed with their bytes, and bytes without a session too."""
+
+    async def scenario():
+        await init_db()
+        try:
+            active = await create_upload("active.png", 32)
+            expired = await create_upload("expired.png", 32)
+            # The signature is only checked once enough bytes arrived, whatever the chunk sizes
+            assert await append_chunk(active, 0, _chunks(PNG_SIGNATURE[:3], PNG_SIGNATURE[3:] + b"\0" * 4)) == 12
+            await UploadSession.filter(id=expired.id).update(expires_at=timezone.now() - timedelta(seconds=1))
+            orphan = uploads_dir() / "0123456789abcdef0123456789abcdef.part"
+            orphan.write_bytes(b"left behind")
+            # Lock files of removed sessions go once no request holds them
+            released = uploads_dir() / "0123456789abcdef0123456789abcdef.lock"
+            held = FileLock(uploads_dir() / "fedcba9876543210fedcba9876543210.lock")
+            released.touch()
+            assert held.acquire(blocking=False)
+
+            assert await collect_expired_uploads() == 1
+            assert await UploadSession.filter(id=expired.id).exists() is False
+            assert not upload_path(expired.id).exists()
+            assert not orphan.exists()
+            assert not released.exists()
+            assert held.path.exists()
+            held.release()
+            assert upload_path(active.id).read_bytes() == PNG_SIGNATURE + b"\0" * 4
+        finally:
+            await close_db()
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_chunks_of_an_upload_are_refused():
+    """Test that a chunk arriving while another is being written is refused rather than interleaved."""
+
+    async def scenario():
+        await init_db()
+        try:
+            session = await create_upload("busy.png", 64)
+            release = asyncio.Event()
+
+            async def slow_chunk():
+                yield PNG_SIGNATURE * 2
+                await release.wait()
+                yield b"\0" * 8
+
+            first = asyncio.create_task(append_chunk(session, 0, slow_chunk()))
+            await asyncio.sleep(0.01)
+            with pytest.raises(UploadBusyError):
+                await append_chunk(session, 0, _chunks(PNG_SIGNATURE))
+            release.set()
+            assert await first == 24
+        finally:
+            await close_db()
+
+    asyncio.run(scenario())
@@ -0,0 +1,85 @@
+"""Tests for the on-demand variant cache."""
+
+import asyncio
+
+from PIL import Image
+
+from fotacos.services import LocalStorage, VariantCache, VariantSpec
+
+
+def _write_source(storage, filename, size=(800, 600)):
+    """Write a WebP source image into storage."""
+    path = storage.path(filename)
+    path.parent.mkdir(parents=True)
+    Image.new("RGB", size, "green").save(path, "WEBP")
+    return filename
+
+
+def test_concurrent_requests_render_a_variant_once(tmp_path):
+    """Test that concurrent requests for the same variant share one render."""
+    storage = LocalStorage(tmp_path / "picts")
+    source = _write_source(storage, "photo_a.webp")
+    cache = VariantCache(storage, tmp_path / "variants", max_bytes=10 * 1024 * 1024, quality=80)
+    spec = VariantSpec(width=200, height=200, fmt="webp")
+
+    async def fetch_concurrently():
+        return await asyncio.gather(*(cache.get(source, spec) for _ in range(3)))
+
+    paths = asyncio.run(fetch_concurrently())
+
+    assert len(set(paths)) == 1
+    assert cache.stats.misses == 1
+    assert cache.stats.coalesced == 2
+    with Image.open(paths[0]) as variant:
+        assert variant.size == (200, 150)
+
+    asyncio.run(cache.get(source, spec))
+    assert cache.stats.hits == 1
+
+
+def test_cache_evicts_least_recently_used_variants(tmp_path):
+    """Test that the cache stays within its size limit by evicting old variants."""
+    storage = LocalStorage(tmp_path / "picts")
+    source = _write_source(storage, "photo_b.webp")
+    cache = VariantCache(storage, tmp_path / "variants", max_bytes=1, quality=80)
+    small = VariantSpec(width=50, height=50, fmt="jpeg")
+    large = VariantSpec(width=100, height=100, fmt="jpeg")
+
+    first = asyncio.run(cache.get(source, small))
+    second = asyncio.run(cache.get(source, large))
+
+    assert not first.exists()
+    assert second.exists()
+    assert cache.stats.evictions == 1
+    assert cache.total_bytes == second.stat().st_size
+
+    reloaded = VariantCache(storage, tmp_path / "variants", max_bytes=1024 * 1024, quality=80)
+    reloaded.load()
+    assert reloaded.total_bytes == second.stat().st_size
+    asyncio.run(reloaded.discard(source))
+    assert reloaded.total_bytes == 0
+    assert not second.exists()
+
+
+def test_variant_evicted_before_it_is_opened_is_rendered_again(tmp_path):
+    """Test that a variant deleted by another web worker between lookup and opening is rendered again."""
+    storage = LocalStorage(tmp_path / "picts")
+    source = _write_source(storage, "photo_c.webp")
+    cache = VariantCache(storage, tmp_path / "variants", max_bytes=10 * 1024 * 1024, quality=80)
+    spec = VariantSpec(width=100, height=100, fmt="png")
+
+    lookup = cache.get
+    evicted = []
+
+    async def get_then_evict(photo_filename, spec):
+        path = await lookup(photo_filename, spec)
+        if not evicted:
+            # Another web worker evicts the variant right after it was found
+            path.unlink()
+            evicted.append(path)
+        return path
+
+    cache.get = get_then_evict
+    with asyncio.run(cache.open(source, spec)) as variant:
+        assert variant.read(8) == b"\x89PNG\r\n\x1a\n"
+    assert cache.stats.misses == 2
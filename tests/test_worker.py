@@ -0,0 +1,60 @@
+"""Tests for the image worker process pool."""
+
+import asyncio
+import time
+
+import pytest
+
+from fotacos.services.worker import ImageWorker, WorkerBusyError
+
+
+def test_run_returns_result_and_records_timings():
+    """Test that jobs run in the pool and their timings are recorded."""
+    worker = ImageWorker(max_workers=1, queue_depth=2)
+    try:
+        result = asyncio.run(worker.run(pow, 2, 10))
+    finally:
+        worker.shutdown()
+
+    assert result == 1024
+    assert worker.stats.submitted == 1
+    assert worker.stats.completed == 1
+    assert worker.stats.run_seconds >= 0
+    assert worker.pending == 0
+
+
+def test_run_rejects_when_queue_is_full():
+    """Test that jobs beyond the queue depth are rejected instead of queued."""
+    worker = ImageWorker(max_workers=1, queue_depth=1)
+
+    async def submit_two() -> None:
+        first = asyncio.create_task(worker.run(time.sleep, 0.2))
+        await asyncio.sleep(0)
+        with pytest.raises(WorkerBusyError):
+            await worker.run(time.sleep, 0)
+        await first
+
+    try:
+        asyncio.run(submit_two())
+    finally:
+        worker.shutdown()
+
+    assert worker.stats.rejected == 1
+    assert worker.stats.completed == 1
+
+
+def test_run_waits_for_capacity_when_requested():
+    """Test that waiting jobs are queued behind running ones instead of rejected."""
+    worker = ImageWorker(max_workers=1, queue_depth=1)
+
+    async def submit_three() -> list[int]:
+        return await asyncio.gather(*(worker.run(pow, 2, exponent, wait=True) for exponent in range(3)))
+
+    try:
+        results = asyncio.run(submit_three())
+    finally:
+        worker.shutdown()
+
+    assert results == [1, 2, 4]
+    assert worker.stats.rejected == 0
+    assert worker.stats.completed == 3